@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.executor import Timing
+
+
+class TokenBucket:
+    """``rate`` permits per second with up to ``burst`` saved up; ``rate <= 0`` means unlimited.
+
+    Waiters are served in arrival order (they queue on one lock).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = max(burst if burst is not None else rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Dispatcher:
+    """Collects upstream calls over a short window and releases them through a scheduler.
+
+    Calls submitted within ``window`` seconds (or until ``max_batch`` are
+    pending) form one batch. Each call of a batch then waits for one of
+    ``concurrency`` upstream slots and a token from the rate limiter, so bursts
+    are smoothed into what the upstream accepts instead of tripping its rate
+    limit (429 → retry with backoff). Results and exceptions fan back out to
+    the awaiting callers.
+    """
+
+    def __init__(self, call: Callable[..., Awaitable[Any]], window: float = 0.005,
+                 max_batch: int = 64, concurrency: int = 32, rate: float = 0.0,
+                 burst: Optional[float] = None):
+        self._call = call
+        self.window = window
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._pending: List[Tuple[tuple, "asyncio.Future[Any]", float, contextvars.Context]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._started = time.monotonic()
+        self.submitted = 0
+        self.batches = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.wait = Timing()
+        self.upstream = Timing()
+
+    async def submit(self, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((args, future, time.perf_counter(), contextvars.copy_context()))
+        self.submitted += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        for args, future, enqueued, context in batch:
+            # each call runs in its submitter's context (the flush may run from a timer)
+            task = context.run(asyncio.ensure_future, self._send(args, future, enqueued))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, args: tuple, future: "asyncio.Future[Any]", enqueued: float) -> None:
+        try:
+            async with self._slots:
+                await self._bucket.acquire()
+                if future.done():  # caller went away while queued
+                    return
+                started = time.perf_counter()
+                self.wait.observe(started - enqueued)
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    result = await self._call(*args)
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.completed += 1
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+                    self.upstream.observe(time.perf_counter() - started)
+        finally:
+            # cancelled by close(): release the caller instead of leaving it waiting
+            if not future.done():
+                future.cancel()
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future, _, _ in self._pending:
+            future.cancel()
+        self._pending = []
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        return {"window_ms": self.window * 1000, "max_batch": self.max_batch,
+                "concurrency": self.concurrency, "rate": self._bucket.rate,
+                "submitted": self.submitted, "batches": self.batches,
+                "avg_batch": round(self.submitted / self.batches, 2) if self.batches else 0.0,
+                "completed": self.completed, "failed": self.failed,
+                "pending": len(self._pending), "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "throughput_rps": round(self.completed / elapsed, 2) if elapsed else 0.0,
+                "wait": self.wait.as_dict(), "upstream": self.upstream.as_dict()}
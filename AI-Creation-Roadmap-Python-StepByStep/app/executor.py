@@ -0,0 +1,85 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class Saturated(Exception):
+    """Raised when the executor already holds ``workers + queue_depth`` jobs."""
+
+
+class Timing:
+    """Count / total / max of a duration, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"count": self.count, "total_s": round(self.total, 6), "max_s": round(self.max, 6),
+                "avg_s": round(self.total / self.count, 6) if self.count else 0.0}
+
+
+class BoundedExecutor:
+    """Thread pool with a hard cap on queued work, for blocking calls from async handlers.
+
+    ``run`` rejects with ``Saturated`` instead of queueing without bound, so an
+    overloaded worker sheds load (503) rather than letting latency grow. Time
+    spent waiting for a thread and time spent running are tracked separately.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, name: str = "executor"):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.wait = Timing()
+        self.run_time = Timing()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise Saturated(f"{self.workers} running and {self.queue_depth} queued")
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.wait.observe(started - submitted)
+                    self.run_time.observe(time.perf_counter() - started)
+
+        with self._lock:
+            self.in_flight += 1
+        # run in the caller's context (like asyncio.to_thread), so trace spans nest
+        future = self._pool.submit(contextvars.copy_context().run, job)
+
+        def release(_):
+            # also runs when a queued job is cancelled (client went away)
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "queue_depth": self.queue_depth,
+                "in_flight": self.in_flight, "rejected": self.rejected,
+                "wait": self.wait.as_dict(), "run": self.run_time.as_dict()}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
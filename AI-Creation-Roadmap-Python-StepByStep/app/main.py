@@ -1,9 +1,14 @@
 import os
 import sys
-from fastapi import FastAPI
-from pydantic import BaseModel
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Literal
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from tenacity import retry, stop_after_attempt, wait_exponential
 import httpx
 
 load_dotenv()
@@ -12,27 +17,277 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
 OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 TOP_K = int(os.getenv("TOP_K", "4"))
+# /retrieve/batch limits: every hit's text is read and returned, every query scored
+RETRIEVE_MAX_K = int(os.getenv("RETRIEVE_MAX_K", "50"))
+RETRIEVE_MAX_QUERIES = int(os.getenv("RETRIEVE_MAX_QUERIES", "64"))
+# "bm25", "dense" or "hybrid" (both need `scripts/ingest.py --dense`) for the chat context
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bm25")
+RETRIEVAL_MODES = ("bm25", "dense", "hybrid")
+RetrievalMode = Literal["bm25", "dense", "hybrid"]
+# upstream connection pool, shared by all requests of this worker
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "1") == "1"
+# retrieval runs on its own bounded thread pool; beyond workers + queue → 503
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+RETRIEVAL_QUEUE = int(os.getenv("RETRIEVAL_QUEUE", "64"))
+# near-duplicate questions reuse a recent answer (0 entries = off)
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "600")) or None
+# optional upstream dispatcher: collect calls for a few ms, then release them
+# through bounded concurrency and a token bucket (rate 0 = unlimited)
+UPSTREAM_DISPATCH = os.getenv("UPSTREAM_DISPATCH", "0") == "1"
+UPSTREAM_WINDOW_MS = float(os.getenv("UPSTREAM_WINDOW_MS", "5"))
+UPSTREAM_MAX_BATCH = int(os.getenv("UPSTREAM_MAX_BATCH", "64"))
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "32"))
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "0"))
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", "0")) or None
+# outbound completion calls: AIMD concurrency limit, circuit breaker (fails fast
+# to a retrieval-only answer) and a retry budget (fraction of calls retried)
+UPSTREAM_LIMIT_INITIAL = int(os.getenv("UPSTREAM_LIMIT_INITIAL", "20"))
+UPSTREAM_LIMIT_MIN = int(os.getenv("UPSTREAM_LIMIT_MIN", "1"))
+UPSTREAM_LIMIT_MAX = int(os.getenv("UPSTREAM_LIMIT_MAX", "200"))
+UPSTREAM_LIMIT_BACKOFF = float(os.getenv("UPSTREAM_LIMIT_BACKOFF", "0.9"))
+UPSTREAM_LATENCY_TARGET = float(os.getenv("UPSTREAM_LATENCY_TARGET", "0")) or None
+UPSTREAM_LIMIT_WAIT_S = float(os.getenv("UPSTREAM_LIMIT_WAIT_S", "1"))
+UPSTREAM_BREAKER_THRESHOLD = float(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "0.5"))
+UPSTREAM_BREAKER_WINDOW = int(os.getenv("UPSTREAM_BREAKER_WINDOW", "50"))
+UPSTREAM_BREAKER_MIN_CALLS = int(os.getenv("UPSTREAM_BREAKER_MIN_CALLS", "10"))
+UPSTREAM_BREAKER_OPEN_S = float(os.getenv("UPSTREAM_BREAKER_OPEN_S", "10"))
+UPSTREAM_RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "2"))
+UPSTREAM_RETRY_BUDGET = float(os.getenv("UPSTREAM_RETRY_BUDGET", "0.1"))
+UPSTREAM_RETRY_RESERVE = float(os.getenv("UPSTREAM_RETRY_RESERVE", "10"))
+# optional OpenTelemetry traces (needs opentelemetry-sdk): none | otlp | file | console,
+# with head-based sampling of TRACE_SAMPLE_RATIO of the requests
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.1"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ai-baseline-api")
+# startup warm-up: WARM_DEEP=1 also re-hashes the whole index against its version
+WARM_DEEP = os.getenv("WARM_DEEP", "0") == "1"
+# a failed warm-up (corrupt or unreadable index) is retried after WARM_RETRY_S
+# seconds, doubling up to WARM_RETRY_MAX_S, so a re-ingest makes the worker ready
+WARM_RETRY_S = float(os.getenv("WARM_RETRY_S", "1"))
+WARM_RETRY_MAX_S = float(os.getenv("WARM_RETRY_MAX_S", "60"))
 
 # ensure project root on sys.path for `rag` import
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 
+from app.dispatcher import Dispatcher  # noqa: E402
+from app.executor import BoundedExecutor, Saturated  # noqa: E402
+from app.metrics import (Callback, Counter, Gauge, Histogram, MetricsMiddleware,  # noqa: E402
+                         Registry)
+from app.resilience import (AIMDLimiter, CircuitBreaker, RetryBudget, UpstreamGuard,  # noqa: E402
+                            UpstreamUnavailable)
+from app.semantic_cache import SemanticCache, embed  # noqa: E402
+from app.singleflight import SingleFlight  # noqa: E402
+from app.tracing import Tracer, setup_tracing  # noqa: E402
+
 try:
     from rag.retrieve import top_k as rag_top_k  # type: ignore
+    from rag.retrieve import top_k_many as rag_top_k_many  # type: ignore
+    from rag.retrieve import cache_stats as rag_cache_stats  # type: ignore
+    from rag.retrieve import branch_stats as rag_branch_stats  # type: ignore
+    from rag.retrieve import shard_stats as rag_shard_stats  # type: ignore
+    from rag.retrieve import close as rag_close  # type: ignore
+    from rag.retrieve import index_version as rag_index_version  # type: ignore
+    from rag.retrieve import index_stats as rag_index_stats  # type: ignore
+    from rag.retrieve import set_stage_observer as rag_set_stage_observer  # type: ignore
+    from rag.retrieve import warm as rag_warm  # type: ignore
 except Exception:
     rag_top_k = None
+    rag_top_k_many = None
+    rag_cache_stats = None
+    rag_branch_stats = None
+    rag_shard_stats = None
+    rag_close = None
+    rag_index_version = None
+    rag_index_stats = None
+    rag_set_stage_observer = None
+    rag_warm = None
+
+def make_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=OPENAI_HTTP2,
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+
+tracer = Tracer(__name__)
+
+async def warm_up(app: FastAPI) -> None:
+    """Load, validate and exercise the index off the event loop, then mark the worker ready."""
+    started = time.perf_counter()
+    startup = app.state.startup
+    delay = WARM_RETRY_S
+    while True:
+        try:
+            if rag_warm is not None:
+                startup["index"] = await app.state.retrieval.run(rag_warm, TOP_K, WARM_DEEP)
+        except FileNotFoundError:
+            startup["index"] = None  # no ingest yet: answers come without context, as before
+        except Exception as e:
+            # a corrupt or unreadable index: stay unready instead of serving bad
+            # results, and try again (the file is reloaded once ingest replaces it)
+            startup["error"] = f"{type(e).__name__}: {e}"
+            startup["retries"] = startup.get("retries", 0) + 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_RETRY_MAX_S)
+            continue
+        break
+    startup.pop("error", None)
+    embed("warm up the answer cache vectors")
+    startup["warm_s"] = round(time.perf_counter() - started, 6)
+    app.state.ready = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+        raise ValueError(f"RETRIEVAL_MODE must be one of {RETRIEVAL_MODES}, got {RETRIEVAL_MODE!r}")
+    tracing = setup_tracing(TRACE_EXPORTER, TRACE_SAMPLE_RATIO, TRACE_SERVICE_NAME,
+                            TRACE_FILE, TRACE_OTLP_ENDPOINT)
+    # one pooled client per worker: connections (and TLS sessions) are reused across requests
+    app.state.http = make_http_client()
+    # BM25 scoring and index I/O block; keep them off the event loop
+    app.state.retrieval = BoundedExecutor(RETRIEVAL_WORKERS, RETRIEVAL_QUEUE, "retrieval")
+    # identical concurrent questions share one retrieval / one upstream call
+    app.state.retrieval_flight = SingleFlight()
+    app.state.chat_flight = SingleFlight()
+    app.state.answers = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL)
+    app.state.guard = UpstreamGuard(
+        AIMDLimiter(UPSTREAM_LIMIT_INITIAL, UPSTREAM_LIMIT_MIN, UPSTREAM_LIMIT_MAX,
+                    UPSTREAM_LIMIT_BACKOFF, UPSTREAM_LATENCY_TARGET, UPSTREAM_LIMIT_WAIT_S),
+        CircuitBreaker(UPSTREAM_BREAKER_THRESHOLD, UPSTREAM_BREAKER_WINDOW,
+                       UPSTREAM_BREAKER_MIN_CALLS, UPSTREAM_BREAKER_OPEN_S),
+        RetryBudget(UPSTREAM_RETRY_BUDGET, UPSTREAM_RETRY_RESERVE),
+        attempts=UPSTREAM_RETRY_ATTEMPTS)
+    app.state.upstream = None
+    if UPSTREAM_DISPATCH:
+        app.state.upstream = Dispatcher(guarded_chat, UPSTREAM_WINDOW_MS / 1000, UPSTREAM_MAX_BATCH,
+                                        UPSTREAM_CONCURRENCY, UPSTREAM_RATE, UPSTREAM_BURST)
+    # /health answers right away (liveness); /ready waits for the warm-up (readiness)
+    app.state.ready = False
+    app.state.startup = {}
+    warming = asyncio.ensure_future(warm_up(app))
+    try:
+        yield
+    finally:
+        warming.cancel()
+        if app.state.upstream is not None:
+            await app.state.upstream.close()
+        app.state.retrieval.shutdown()
+        if rag_close is not None:
+            rag_close()  # shard worker processes, if the index is sharded
+        await app.state.http.aclose()
+        if tracing is not None:
+            tracing.shutdown()  # flushes spans still queued for export
+
+app = FastAPI(title="AI Baseline API", lifespan=lifespan)
 
-app = FastAPI(title="AI Baseline API")
+# Prometheus metrics, served by /metrics. Stage histograms are observed on the
+# hot path; everything else is read from the components' stats() at scrape time.
+METRICS = Registry()
+STAGES = METRICS.register(Histogram(
+    "rag_stage_seconds", "Time per stage: index_load, tokenize, score, select, batch_score "
+    "(retriever), retrieval (incl. queueing), llm (one upstream attempt), answer "
+    "(upstream incl. dispatch and retries)", ["stage"]))
+REQUESTS = METRICS.register(Histogram(
+    "http_request_duration_seconds", "Total request time by route, including serialization",
+    ["path"]))
+IN_FLIGHT = METRICS.register(Gauge("http_requests_in_flight", "Requests being served"))
+HTTP_ERRORS = METRICS.register(Counter("http_errors", "Responses with a 5xx status",
+                                       ["path", "status"]))
+UPSTREAM_ERRORS = METRICS.register(Counter("upstream_errors", "Failed upstream attempts",
+                                           ["reason"]))
+DEGRADED = METRICS.register(Counter("chat_degraded", "Retrieval-only answers served"))
+
+def _state_stats(name: str):
+    component = getattr(app.state, name, None)
+    return component.stats() if component is not None else None
+
+def _cache_samples(field: str):
+    samples = {}
+    answers = _state_stats("answers")
+    if answers is not None:
+        samples[("answer",)] = answers[field]
+    if rag_cache_stats is not None:
+        for tier, stats in rag_cache_stats().items():
+            samples[(f"query_{tier}",)] = stats[field]
+    return samples
+
+def _guard_samples(fn):
+    stats = _state_stats("guard")
+    return fn(stats) if stats is not None else None
+
+def _index_samples(field: str):
+    stats = rag_index_stats() if rag_index_stats is not None else None
+    return stats[field] if stats is not None else None
+
+METRICS.register(Callback("counter", "cache_hits", "Cache hits", lambda: _cache_samples("hits"),
+                          ["cache"]))
+METRICS.register(Callback("counter", "cache_misses", "Cache misses",
+                          lambda: _cache_samples("misses"), ["cache"]))
+METRICS.register(Callback("counter", "upstream_retries", "Upstream attempts retried",
+                          lambda: _guard_samples(lambda s: s["retry_budget"]["retries"])))
+METRICS.register(Callback("counter", "upstream_rejected", "Upstream calls not made",
+                          lambda: _guard_samples(lambda s: {
+                              ("limit",): s["limiter"]["rejected"],
+                              ("circuit",): s["breaker"]["short_circuited"],
+                              ("retry_budget",): s["retry_budget"]["denied"]}), ["reason"]))
+METRICS.register(Callback("gauge", "upstream_concurrency_limit", "Current adaptive limit",
+                          lambda: _guard_samples(lambda s: s["limiter"]["limit"])))
+METRICS.register(Callback("gauge", "upstream_in_flight", "Upstream calls in flight",
+                          lambda: _guard_samples(lambda s: s["limiter"]["in_flight"])))
+METRICS.register(Callback("gauge", "retrieval_executor_in_flight", "Retrieval jobs queued or running",
+                          lambda: (_state_stats("retrieval") or {}).get("in_flight")))
+METRICS.register(Callback("gauge", "rag_index_documents", "Passages in the loaded index",
+                          lambda: _index_samples("documents")))
+METRICS.register(Callback("gauge", "rag_index_bytes", "Size of the loaded index file",
+                          lambda: _index_samples("bytes")))
+METRICS.register(Callback("gauge", "rag_index_info", "Loaded index version (value is always 1)",
+                          lambda: {(v,): 1 for v in [_index_samples("version")] if v}, ["version"]))
+if rag_set_stage_observer is not None:
+    rag_set_stage_observer(lambda stage, seconds: STAGES.labels(stage).observe(seconds))
+
+app.add_middleware(MetricsMiddleware, routes=("/chat", "/chat/stream", "/retrieve/batch",
+                                               "/health", "/ready", "/stats", "/metrics"),
+                   latency=REQUESTS, in_flight=IN_FLIGHT, errors=HTTP_ERRORS)
 
 class ChatRequest(BaseModel):
     message: str
+    # per-request retrieval overrides (default: RETRIEVAL_MODE / HYBRID_CANDIDATES);
+    # more hybrid candidates per branch raise recall at some latency
+    mode: RetrievalMode | None = None
+    candidates: int | None = Field(None, ge=1)
 
 class ChatResponse(BaseModel):
     answer: str
     sources: list[str] = []
+    # true when the LLM was unavailable and the answer is just the retrieved context
+    degraded: bool = False
+
+class RetrieveBatchRequest(BaseModel):
+    queries: list[str] = Field(..., max_length=RETRIEVE_MAX_QUERIES)
+    k: int = Field(TOP_K, ge=1, le=RETRIEVE_MAX_K)
+    mode: RetrievalMode = "bm25"
+    candidates: int | None = Field(None, ge=1)
+
+class Passage(BaseModel):
+    id: str
+    text: str
+
+class RetrieveBatchResponse(BaseModel):
+    results: list[list[Passage]]
 
-@retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=0.5, min=0.5, max=2))
 async def openai_chat(system: str, user: str) -> str:
     if not OPENAI_API_KEY:
         return f"[echo] {user}"
@@ -44,33 +299,257 @@ async def openai_chat(system: str, user: str) -> str:
             {"role": "user", "content": user},
         ],
     }
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(f"{OPENAI_API_BASE}/chat/completions", headers=headers, json=payload)
+    started = time.perf_counter()
+    try:
+        r = await app.state.http.post(f"{OPENAI_API_BASE}/chat/completions", headers=headers,
+                                      json=payload)
         r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"]
+    except httpx.HTTPStatusError as e:
+        UPSTREAM_ERRORS.inc(str(e.response.status_code))
+        raise
+    except httpx.HTTPError as e:
+        UPSTREAM_ERRORS.inc(type(e).__name__)
+        raise
+    finally:
+        STAGES.labels("llm").observe(time.perf_counter() - started)
+    data = r.json()
+    return data["choices"][0]["message"]["content"]
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    system = "You are a concise assistant. Include sources if context is provided."
+async def guarded_chat(system: str, user: str) -> str:
+    """``openai_chat`` under the concurrency limit, circuit breaker and retry budget."""
+    with tracer.span("openai_chat") as span:
+        attempts = 0
+
+        async def attempt() -> str:
+            nonlocal attempts
+            attempts += 1
+            return await openai_chat(system, user)
+
+        try:
+            return await app.state.guard.call(attempt)
+        finally:
+            if span is not None and span.is_recording():
+                span.set_attributes({"llm.model": OPENAI_CHAT_MODEL,
+                                     "llm.prompt_chars": len(system) + len(user),
+                                     "llm.retry_count": max(0, attempts - 1)})
+
+async def upstream_chat(system: str, user: str) -> str:
+    """``guarded_chat`` through the dispatcher when it is enabled, directly otherwise."""
+    if app.state.upstream is not None:
+        return await app.state.upstream.submit(system, user)
+    return await guarded_chat(system, user)
+
+async def openai_chat_stream(system: str, user: str) -> AsyncIterator[str]:
+    """Content deltas of a ``stream: true`` completion, as they arrive."""
+    if not OPENAI_API_KEY:
+        yield f"[echo] {user}"
+        return
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    payload = {
+        "model": OPENAI_CHAT_MODEL,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+        "stream": True,
+    }
+    # leaving the block (done, error or cancelled by a client disconnect) closes the upstream stream
+    async with app.state.http.stream("POST", f"{OPENAI_API_BASE}/chat/completions",
+                                     headers=headers, json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+def overloaded() -> HTTPException:
+    return HTTPException(status_code=503, detail="retrieval queue is full, retry shortly",
+                         headers={"Retry-After": "1"})
+
+SYSTEM_PROMPT = "You are a concise assistant. Include sources if context is provided."
+
+def normalize(message: str) -> str:
+    # coalescing key: case and whitespace only, stricter than the index analyzer
+    # (punctuation, plurals and stopwords still tell two messages apart), since
+    # the raw message is what reaches the retriever and the LLM prompt
+    return " ".join(message.lower().split())
+
+async def build_prompt(message: str, mode: str | None = None,
+                       candidates: int | None = None) -> tuple[str, list[str], str]:
+    """User prompt, the ids of its sources and the retrieved context (may be empty)."""
     sources: list[str] = []
     context = ""
+    mode = mode or RETRIEVAL_MODE
 
     # Try RAG retrieval if available
     if rag_top_k is not None:
         try:
-            hits = rag_top_k(req.message, TOP_K)
+            hits = await app.state.retrieval_flight.do(
+                (normalize(message), mode, candidates),
+                lambda: app.state.retrieval.run(rag_top_k, message, TOP_K, mode, candidates))
             if hits:
                 sources = [doc_id for doc_id, _ in hits]
                 context = "\n\n".join(text for _, text in hits)
+        except Saturated:
+            raise overloaded()
         except Exception:
             # missing index or other issue → proceed without context
             pass
 
-    user = req.message if not context else f"Context:\n{context}\n\nQuestion: {req.message}"
-    answer = await openai_chat(system, user)
-    return ChatResponse(answer=answer, sources=sources)
+    user = message if not context else f"Context:\n{context}\n\nQuestion: {message}"
+    return user, sources, context
+
+def retrieval_only(context: str) -> str:
+    """Answer served when the LLM is unavailable: the retrieved passages themselves."""
+    if not context:
+        return "The assistant is temporarily unavailable, please retry shortly."
+    return f"The assistant is temporarily unavailable. Most relevant passages:\n\n{context}"
+
+def cached_answer(message: str) -> ChatResponse | None:
+    """A recent answer to a near-identical question, if any (skips retrieval and the LLM)."""
+    if rag_index_version is not None:
+        # answers depend on the retrieved context: a re-ingested index invalidates them,
+        # and so does a rebuilt dense index (part of the version once loaded)
+        app.state.answers.sync_version(rag_index_version())
+    return app.state.answers.get(message)
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    with tracer.span("chat") as span:
+        response = await answer_chat(req.message, req.mode, req.candidates)
+        if span is not None and span.is_recording():
+            span.set_attributes({"chat.message_chars": len(req.message),
+                                 "chat.sources": len(response.sources),
+                                 "chat.degraded": response.degraded})
+        return response
+
+async def answer_chat(message: str, mode: str | None = None,
+                      candidates: int | None = None) -> ChatResponse:
+    # the answer cache holds answers under the default retrieval settings only
+    tuned = mode is not None or candidates is not None
+    cached = None if tuned else cached_answer(message)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    user, sources, context = await build_prompt(message, mode, candidates)
+    retrieved = time.perf_counter()
+    STAGES.labels("retrieval").observe(retrieved - started)
+    try:
+        # same question with the same retrieved context → wait on the in-flight answer
+        answer = await app.state.chat_flight.do((normalize(message), tuple(sources)),
+                                                lambda: upstream_chat(SYSTEM_PROMPT, user))
+    except UpstreamUnavailable:
+        DEGRADED.inc()
+        return ChatResponse(answer=retrieval_only(context), sources=sources, degraded=True)
+    except httpx.HTTPError as e:
+        # rejected by the upstream (bad request, auth): an error, not a degraded answer
+        raise HTTPException(status_code=502, detail=str(e) or type(e).__name__)
+    finally:
+        STAGES.labels("answer").observe(time.perf_counter() - retrieved)
+    response = ChatResponse(answer=answer, sources=sources)
+    if not tuned:
+        app.state.answers.put(message, response)
+    return response
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    # each yielded event is written (and flushed) to the client immediately;
+    # Starlette cancels the generator when the client disconnects
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-sent events: ``sources`` first, then one ``delta`` per upstream chunk, then ``done``."""
+    tuned = req.mode is not None or req.candidates is not None
+    cached = None if tuned else cached_answer(req.message)
+    if cached is not None:
+        async def replay() -> AsyncIterator[str]:
+            yield sse("sources", cached.sources)
+            yield sse("delta", {"content": cached.answer})
+            yield sse("done", {})
+        return sse_response(replay())
+    user, sources, context = await build_prompt(req.message, req.mode, req.candidates)
+
+    async def events() -> AsyncIterator[str]:
+        yield sse("sources", sources)
+        parts: list[str] = []
+        try:
+            # a started stream can't be retried, but it counts against the limit and breaker
+            async with app.state.guard.admit():
+                async for delta in openai_chat_stream(SYSTEM_PROMPT, user):
+                    parts.append(delta)
+                    yield sse("delta", {"content": delta})
+        except UpstreamUnavailable:
+            DEGRADED.inc()
+            yield sse("delta", {"content": retrieval_only(context)})
+            yield sse("done", {"degraded": True})
+            return
+        except httpx.HTTPError as e:
+            UPSTREAM_ERRORS.inc(str(e.response.status_code) if isinstance(e, httpx.HTTPStatusError)
+                                else type(e).__name__)
+            yield sse("error", {"detail": str(e) or type(e).__name__})
+            return
+        # only complete answers are cached
+        if not tuned:
+            app.state.answers.put(req.message, ChatResponse(answer="".join(parts), sources=sources))
+        yield sse("done", {})
+
+    return sse_response(events())
+
+@app.post("/retrieve/batch", response_model=RetrieveBatchResponse)
+async def retrieve_batch(req: RetrieveBatchRequest):
+    if rag_top_k_many is None:
+        raise HTTPException(status_code=503, detail="retrieval is not available")
+    try:
+        hits = await app.state.retrieval.run(rag_top_k_many, req.queries, req.k, req.mode,
+                                             req.candidates)
+    except Saturated:
+        raise overloaded()
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return RetrieveBatchResponse(
+        results=[[Passage(id=doc_id, text=text) for doc_id, text in ranked] for ranked in hits])
 
 @app.get("/health")
 async def health():
     return {"ok": True}
+
+@app.get("/ready")
+async def ready():
+    status = 200 if app.state.ready else 503
+    return JSONResponse({"ready": app.state.ready, "startup": app.state.startup}, status_code=status)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    # executor wait (queueing) and run (scoring) times are reported separately
+    data = {"retrieval_executor": app.state.retrieval.stats(),
+            "coalescing": {"retrieval": app.state.retrieval_flight.stats(),
+                           "chat": app.state.chat_flight.stats()}}
+    data["answer_cache"] = app.state.answers.stats()
+    data["upstream"] = app.state.guard.stats()
+    if app.state.upstream is not None:
+        # queue time (window + waiting for a slot/token), upstream time and concurrency
+        data["upstream_dispatch"] = app.state.upstream.stats()
+    if rag_cache_stats is not None:
+        data["query_cache"] = rag_cache_stats()
+    if rag_branch_stats is not None:
+        # hybrid queries: BM25 and dense branches run in parallel, then fuse
+        data["hybrid_branches"] = rag_branch_stats()
+    shards = rag_shard_stats() if rag_shard_stats is not None else None
+    if shards is not None:
+        # sharded index: per-shard work vs scatter-gather wall time (the slowest shard)
+        data["shards"] = shards
+    return data
@@ -0,0 +1,223 @@
+"""Minimal Prometheus text-format metrics (no client library needed).
+
+Histograms and counters are updated on the hot path (a bisect and two adds
+under a lock, well under a microsecond). Everything that already lives in a
+``stats()`` somewhere (caches, retry budget, index) is read only when
+``/metrics`` is scraped, through callback metrics.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# seconds; covers a cached retrieval (~10 µs) up to a slow completion
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+Samples = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram:
+    """Cumulative-bucket histogram; ``labels(...)`` children are created once and reused."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Labels, _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> Iterable[str]:
+        for values, child in sorted(self._children.items()):
+            counts, total = child.snapshot()
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, values, le)} {running}"
+            yield f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, values)} {running}"
+
+
+class Counter:
+    """Monotonic counter, optionally labelled: ``inc(*label_values)``."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        for values, value in sorted(self._values.items()):
+            yield f"{self.name}_total{_labels(self.labelnames, values)} {_number(value)}"
+
+
+class Gauge:
+    """Value that goes up and down (``inc``/``dec``/``set``), without labels."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> Iterable[str]:
+        yield f"{self.name} {_number(self.value)}"
+
+
+class Callback:
+    """Counter or gauge whose value(s) are read at scrape time.
+
+    ``fn`` returns a number, a ``{label values: number}`` dict, or None when
+    there is nothing to report.
+    """
+
+    def __init__(self, kind: str, name: str, help: str, fn: Callable[[], Optional[Samples]],
+                 labelnames: Sequence[str] = ()):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+        self._suffix = "_total" if kind == "counter" else ""
+
+    def render(self) -> Iterable[str]:
+        samples = self._fn()
+        if samples is None:
+            return
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for values, value in sorted(samples.items()):
+            yield f"{self.name}{self._suffix}{_labels(self.labelnames, values)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Union[Histogram, Counter, Gauge, Callback]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            samples = list(metric.render())
+            if not samples:
+                continue
+            # counter samples carry the _total suffix; HELP/TYPE must name them the same
+            name = metric.name + "_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request latency by route, in-flight gauge and 5xx counter.
+
+    Latency runs until the last body chunk is sent, so it includes response
+    serialization; streaming responses are timed to the end of the stream.
+    Paths outside ``routes`` are reported as "other" to bound cardinality.
+    """
+
+    def __init__(self, app, routes: Iterable[str], latency: Histogram, in_flight: Gauge,
+                 errors: Counter):
+        self.app = app
+        self.routes = frozenset(routes)
+        self.latency = latency
+        self.in_flight = in_flight
+        self.errors = errors
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"] if scope["path"] in self.routes else "other"
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec()
+            self.latency.labels(path).observe(time.perf_counter() - started)
+            if status >= 500:
+                self.errors.inc(path, str(status))
@@ -0,0 +1,242 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream call was not made (circuit open, limit reached) or failed for good."""
+
+
+def is_overload(exc: BaseException) -> bool:
+    """Errors that mean the upstream is overloaded or unhealthy (worth backing off / retrying)."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows by one per round trip of successes and shrinks on overload.
+
+    A call that fails with an overload error (or takes longer than
+    ``latency_target`` seconds, if set) multiplies the limit by ``backoff``.
+    Only calls started after the previous decrease can decrease it again, so
+    a burst of failures from one round trip counts once. Callers over the
+    limit wait up to ``max_wait`` seconds for a slot and are then rejected.
+    """
+
+    def __init__(self, initial: int = 20, minimum: int = 1, maximum: int = 200,
+                 backoff: float = 0.9, latency_target: Optional[float] = None,
+                 max_wait: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.max_wait = max_wait
+        self._free = asyncio.Condition()
+        self.in_flight = 0
+        self.rejected = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+
+    async def acquire(self) -> bool:
+        async with self._free:
+            try:
+                await asyncio.wait_for(
+                    self._free.wait_for(lambda: self.in_flight < int(self.limit)), self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    async def release(self, started: float, overloaded: Optional[bool]) -> None:
+        """``overloaded`` is None when the call was cancelled (no signal either way)."""
+        async with self._free:
+            self.in_flight -= 1
+            if overloaded is not None:
+                self._adjust(started, overloaded)
+            self._free.notify(max(0, int(self.limit) - self.in_flight))
+
+    def _adjust(self, started: float, overloaded: bool) -> None:
+        now = time.monotonic()
+        if not overloaded and self.latency_target and now - started > self.latency_target:
+            overloaded = True
+        if overloaded:
+            if started >= self._last_decrease:
+                self.limit = max(float(self.minimum), self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": int(self.limit), "in_flight": self.in_flight,
+                "rejected": self.rejected, "decreases": self.decreases}
+
+
+class CircuitBreaker:
+    """Opens when the failure rate of the last ``window`` calls reaches ``threshold``.
+
+    While open, calls fail fast for ``open_seconds``; then a single probe is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: float = 0.5, window: int = 50, min_calls: int = 10,
+                 open_seconds: float = 10.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failed
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at >= self.open_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record(self, failed: Optional[bool]) -> None:
+        """``failed`` is None when the call was cancelled (no signal either way)."""
+        if self._opened_at is not None:
+            if not self._probing:
+                return  # a call admitted before the circuit opened
+            self._probing = False
+            if failed is None:
+                return
+            if failed:
+                self._opened_at = time.monotonic()
+            else:
+                self._opened_at = None
+                self._outcomes.clear()
+            return
+        if failed is None:
+            return
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls and self.failure_rate >= self.threshold:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+
+    @property
+    def failure_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failure_rate": round(self.failure_rate, 4),
+                "opened": self.opened, "short_circuited": self.short_circuited}
+
+
+class RetryBudget:
+    """Caps retries at ``ratio`` of calls, plus up to ``reserve`` banked for quiet periods.
+
+    Every call deposits ``ratio`` of a token (up to ``reserve``), every retry
+    withdraws a whole one; with no tokens left, failures are not retried.
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = reserve
+        self.retries = 0
+        self.denied = 0
+
+    def deposit(self) -> None:
+        self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self._balance >= 1:
+            self._balance -= 1
+            self.retries += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ratio": self.ratio, "balance": round(self._balance, 2),
+                "retries": self.retries, "denied": self.denied}
+
+
+class UpstreamGuard:
+    """Limiter, circuit breaker and retry budget around outbound completion calls.
+
+    Overload errors (429, 5xx, transport errors) count as failures for the
+    breaker, shrink the limit and are retried, with exponential backoff
+    between ``backoff_min`` and ``backoff_max`` seconds; other errors (bad
+    request, auth) are not retried and say nothing about upstream health.
+    ``call`` raises ``UpstreamUnavailable`` only for overload errors; the
+    others are the caller's to report and are raised as they are.
+    """
+
+    def __init__(self, limiter: AIMDLimiter, breaker: CircuitBreaker, budget: RetryBudget,
+                 attempts: int = 2, backoff_min: float = 0.5, backoff_max: float = 2.0):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.budget = budget
+        self.attempts = attempts
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """One upstream attempt: rejected with ``UpstreamUnavailable`` or observed to completion."""
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("circuit open")
+        try:
+            acquired = await self.limiter.acquire()
+        except BaseException:
+            self.breaker.record(None)  # cancelled while waiting: hand back a half-open probe
+            raise
+        if not acquired:
+            self.breaker.record(None)  # hand back a half-open probe
+            raise UpstreamUnavailable("concurrency limit reached")
+        started = time.monotonic()
+        overloaded = None
+        try:
+            yield
+            overloaded = False
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            await self.limiter.release(started, overloaded)
+            self.breaker.record(overloaded)
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                async with self.admit():
+                    return await fn(*args)
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                if not is_overload(e):
+                    raise
+                if attempt >= self.attempts or not self.budget.withdraw():
+                    raise UpstreamUnavailable(str(e) or type(e).__name__) from e
+            await asyncio.sleep(min(self.backoff_max, self.backoff_min * 2 ** (attempt - 1)))
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limiter": self.limiter.stats(), "breaker": self.breaker.stats(),
+                "retry_budget": self.budget.stats()}
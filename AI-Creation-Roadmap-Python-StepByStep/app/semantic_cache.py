@@ -0,0 +1,126 @@
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+_CONTRACTIONS = [(re.compile(pattern), repl) for pattern, repl in (
+    (r"n't\b", " not"), (r"'s\b", " is"), (r"'re\b", " are"), (r"'ll\b", " will"),
+    (r"'ve\b", " have"), (r"'m\b", " am"), (r"'d\b", " would"))]
+_NON_WORD = re.compile(r"[^\w\s]")
+# words that never change what is asked; negations and question words are kept
+_FILLER = frozenset("a an the is are was were be been do does did please".split())
+
+
+def _words(text: str) -> List[str]:
+    text = text.lower().replace("’", "'")
+    for pattern, repl in _CONTRACTIONS:
+        text = pattern.sub(repl, text)
+    return _NON_WORD.sub(" ", text).split()
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """Folded words of ``text`` other than articles and auxiliaries."""
+    return frozenset(w for w in _words(text) if w not in _FILLER)
+
+
+def embed(text: str, dim: int = 1024) -> np.ndarray:
+    """Unit vector of hashed word unigrams, word bigrams and character trigrams.
+
+    Local and deterministic (crc32, not ``hash``), so no embedding model is
+    needed. Case, punctuation and common contractions are folded first, which
+    makes "what's this about?" and "What is this about" identical.
+    """
+    words = _words(text)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    vec = np.zeros(dim, dtype=np.float32)
+    np.add.at(vec, [zlib.crc32(g.encode("utf-8")) % dim for g in grams], 1.0)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SemanticCache:
+    """Answer cache looked up by cosine similarity of ``embed`` vectors.
+
+    Entries live in a fixed ``(maxsize, dim)`` matrix, so a lookup is one
+    matrix-vector product (exact nearest neighbour); the least recently used
+    entry is evicted when full. Similarity alone is not enough: one changed
+    word ("api" / "db", "is" / "is not") keeps the cosine above 0.9, so a hit
+    also needs the same ``content_words`` as the cached question. Entries
+    expire after ``ttl`` seconds and are all dropped when the index version
+    changes, since answers depend on the retrieved context.
+    """
+
+    def __init__(self, maxsize: int = 1024, threshold: float = 0.95, ttl: Optional[float] = 600,
+                 dim: int = 1024):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.dim = dim
+        self._vectors = np.zeros((max(maxsize, 0), dim), dtype=np.float32)
+        self._occupied = np.zeros(max(maxsize, 0), dtype=bool)
+        # slot -> (expires_at or None, content words, value); order = least recently used first
+        self._entries: "OrderedDict[int, Tuple[Optional[float], FrozenSet[str], Any]]" = \
+            OrderedDict()
+        self._free: List[int] = list(range(max(maxsize, 0)))[::-1]
+        self._version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def sync_version(self, version: Optional[str]) -> None:
+        if version is not None and version != self._version:
+            if self._version is not None:
+                self.clear()
+            self._version = version
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._occupied[:] = False
+        self._free = list(range(self.maxsize))[::-1]
+
+    def get(self, message: str) -> Optional[Any]:
+        if not self._entries:
+            self.misses += 1
+            return None
+        # product over the whole matrix: indexing the occupied rows would copy them
+        sims = self._vectors @ embed(message, self.dim)
+        sims[~self._occupied] = -np.inf
+        words = content_words(message)
+        # most similar first; usually zero or one entry is above the threshold
+        for slot in sorted(np.flatnonzero(sims >= self.threshold).tolist(), key=lambda i: -sims[i]):
+            expires_at, cached_words, value = self._entries[slot]
+            if cached_words != words:
+                continue
+            if expires_at is None or time.monotonic() < expires_at:
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return value
+            del self._entries[slot]
+            self._occupied[slot] = False
+            self._free.append(slot)
+            break
+        self.misses += 1
+        return None
+
+    def put(self, message: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        if not self._free:
+            slot, _ = self._entries.popitem(last=False)
+            self._free.append(slot)
+            self.evictions += 1
+        slot = self._free.pop()
+        self._vectors[slot] = embed(message, self.dim)
+        self._occupied[slot] = True
+        self._entries[slot] = (time.monotonic() + self.ttl if self.ttl else None,
+                               content_words(message), value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "threshold": self.threshold}
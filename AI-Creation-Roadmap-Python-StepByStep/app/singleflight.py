@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is in flight await the same task and share its result (or
+    exception). The task is shielded, so a caller that goes away (client
+    disconnect) does not cancel the work the others are waiting for.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        coalesced = self.calls - self.executions
+        return {"calls": self.calls, "executions": self.executions, "coalesced": coalesced,
+                "in_flight": len(self._inflight),
+                "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else 0.0}
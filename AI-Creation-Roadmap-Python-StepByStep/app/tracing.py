@@ -0,0 +1,69 @@
+"""Optional OpenTelemetry tracing (``pip install opentelemetry-sdk``).
+
+Without the packages, or with ``TRACE_EXPORTER=none``, ``span`` is a no-op
+context manager yielding None. Sampling is decided once per trace at its root
+(head-based, ``TRACE_SAMPLE_RATIO``); unsampled spans are non-recording, so
+callers should only compute attributes when ``span.is_recording()``.
+"""
+from contextlib import nullcontext
+from typing import Any, ContextManager, Optional
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional dependency
+    trace = None
+
+EXPORTERS = ("none", "otlp", "file", "console")
+
+
+def setup_tracing(exporter: str, sample_ratio: float, service: str,
+                  file_path: Optional[str] = None, otlp_endpoint: Optional[str] = None):
+    """Install a tracer provider for this process; returns it (call ``shutdown()`` on exit) or None."""
+    if exporter not in EXPORTERS:
+        raise ValueError(f"TRACE_EXPORTER must be one of {EXPORTERS}, got {exporter!r}")
+    if exporter == "none":
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        raise RuntimeError(f"TRACE_EXPORTER={exporter} but opentelemetry-sdk is not installed")
+    if exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            raise RuntimeError("TRACE_EXPORTER=otlp but opentelemetry-exporter-otlp-proto-http "
+                               "is not installed")
+        span_exporter = OTLPSpanExporter(endpoint=otlp_endpoint)
+    elif exporter == "file":
+        class FileSpanExporter(ConsoleSpanExporter):
+            def shutdown(self) -> None:
+                # after the processor's final flush: close the file it wrote to
+                super().shutdown()
+                self.out.close()
+
+        # one JSON span per line
+        out = open(file_path or "traces.jsonl", "a", encoding="utf-8")
+        span_exporter = FileSpanExporter(out=out, formatter=lambda s: s.to_json(indent=None) + "\n")
+    else:
+        span_exporter = ConsoleSpanExporter()
+    provider = TracerProvider(resource=Resource.create({"service.name": service}),
+                              sampler=ParentBased(TraceIdRatioBased(sample_ratio)))
+    # spans are exported from a background thread, off the request path
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    return provider
+
+
+class Tracer:
+    """``span(name)`` under this instrumentation scope; resolves the global provider lazily."""
+
+    def __init__(self, name: str):
+        self._tracer = trace.get_tracer(name) if trace is not None else None
+
+    def span(self, name: str) -> ContextManager[Any]:
+        if self._tracer is None:
+            return nullcontext()
+        return self._tracer.start_as_current_span(name)
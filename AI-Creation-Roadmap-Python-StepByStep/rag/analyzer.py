@@ -0,0 +1,137 @@
+"""Text analysis shared by ingest and queries: text → index terms.
+
+``Analyzer`` lowercases, splits text into Unicode word runs (``\\w+``, so
+"project?" and "project" are the same term), optionally drops stopwords and
+optionally applies a light plural stemmer (Harman's S-stemmer: "queries" →
+"query", "documents" → "document"). Its settings are stored in the index
+header, so queries are always analyzed the way the index was built; indexes
+written before this have no setting and split on whitespace.
+
+``Vocabulary`` is the query side: the index's frozen term dictionary plus a
+memo from surface word to term id, so a word seen before costs one dict
+lookup and no stemmed copy. Words missing from the index are dropped.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+SPLITS = {"word": re.compile(r"\w+"), "whitespace": re.compile(r"\S+")}
+STEMMERS = ("none", "light")
+
+# short function words; only dropped with stopwords enabled (BM25's IDF already
+# weights them down, but they make up a large share of the postings)
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how i if in into is it its
+me my no not of on or our so than that the their them then there these they this to was we
+were what when where which who why will with you your
+""".split())
+
+# memoized surface words per vocabulary; cleared when full to bound memory
+MEMO_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def light_stem(word: str) -> str:
+    """Harman's S-stemmer: strips English plural endings only.
+
+    "this" and words ending in "sis" ("analysis") are also kept, which the
+    original rules would cut to "thi" and "analysi".
+    """
+    if len(word) <= 3 or word[-1] != "s":
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if word == "this" or word.endswith(("us", "ss", "sis")):
+        return word
+    return word[:-1]
+
+
+class Analyzer:
+    """Tokenizer pipeline: lowercase → split → stopwords (optional) → stem (optional)."""
+
+    def __init__(self, split: str = "word", stopwords: bool = False, stem: str = "light"):
+        if split not in SPLITS:
+            raise ValueError(f"split must be one of {sorted(SPLITS)}, got {split!r}")
+        if stem not in STEMMERS:
+            raise ValueError(f"stem must be one of {STEMMERS}, got {stem!r}")
+        self.split = split
+        self.stopwords = stopwords
+        self.stem = stem
+        self._findall = SPLITS[split].findall
+        self._stop = STOPWORDS if stopwords else frozenset()
+        self._stem = light_stem if stem == "light" else None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, object]]) -> "Analyzer":
+        """Analyzer recorded in an index header; None is the whitespace split of older indexes."""
+        if config is None:
+            return cls("whitespace", stopwords=False, stem="none")
+        return cls(**config)
+
+    @property
+    def config(self) -> Dict[str, object]:
+        return {"split": self.split, "stopwords": self.stopwords, "stem": self.stem}
+
+    def words(self, text: str) -> List[str]:
+        """Lowercased words of ``text``, before stopwords and stemming."""
+        return self._findall(text.lower())
+
+    def term(self, word: str) -> Optional[str]:
+        """Index term of one lowercased word, or None for a stopword."""
+        if word in self._stop:
+            return None
+        return self._stem(word) if self._stem is not None else word
+
+    def terms(self, text: str) -> List[str]:
+        """Index terms of ``text`` in order, repeats included."""
+        words = self.words(text)
+        if self._stop:
+            stop = self._stop
+            words = [w for w in words if w not in stop]
+        if self._stem is not None:
+            words = list(map(self._stem, words))
+        return words
+
+
+_MISSING = -2
+
+
+class Vocabulary:
+    """An index's frozen term dictionary, compiled for query-time analysis."""
+
+    def __init__(self, terms: Sequence[str], vocab: Dict[str, int], analyzer: Analyzer):
+        self.terms = terms
+        self.vocab = vocab
+        self.analyzer = analyzer
+        # surface word → term id, or -1 for stopwords and words not in the index
+        self._memo: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _resolve(self, word: str) -> int:
+        term = self.analyzer.term(word)
+        tid = -1 if term is None else self.vocab.get(term, -1)
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[word] = tid
+        return tid
+
+    def ids(self, text: str) -> List[int]:
+        """Term ids of ``text`` in order; unknown words and stopwords are dropped."""
+        get, resolve = self._memo.get, self._resolve
+        ids = []
+        for word in self.analyzer.words(text):
+            tid = get(word, _MISSING)
+            if tid == _MISSING:
+                tid = resolve(word)
+            if tid >= 0:
+                ids.append(tid)
+        return ids
+
+    def lookup(self, text: str) -> List[str]:
+        """Index terms of ``text`` (the vocabulary's own strings); unknown words are dropped."""
+        terms = self.terms
+        return [terms[tid] for tid in self.ids(text)]
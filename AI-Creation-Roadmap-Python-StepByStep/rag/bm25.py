@@ -0,0 +1,261 @@
+import heapq
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.postings import PackedPostings
+
+# Okapi BM25 defaults, same as rank_bm25.BM25Okapi
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+
+class InvertedIndex:
+    """BM25 over per-term postings lists.
+
+    The postings are stored column-wise (CSR layout): ``offsets[t]:offsets[t + 1]``
+    is the slice of ``post_docs``/``post_tfs`` that belongs to term id ``t``.
+    The arrays may be plain NumPy arrays or read-only memory maps (see
+    ``rag.store``). Scoring only visits the postings of the query terms, so
+    the cost of a query grows with the postings it touches rather than with
+    the corpus. Scores are computed the same way as ``rank_bm25.BM25Okapi``
+    (including the epsilon floor for negative IDF), so rankings match it exactly.
+
+    With ``packed`` (see ``rag.postings``) the postings stay compressed: each
+    query term's list is decoded on use, and ``post_docs``/``post_tfs`` are
+    only decoded in full when first accessed (vectorized backends, dense build).
+    Quantized tfs above 128 make scores differ slightly from BM25Okapi there.
+
+    ``avgdl`` replaces the average document length of ``doc_len``: a shard
+    scores with that of the whole corpus (see ``rag.shards``).
+    """
+
+    def __init__(self, vocab: Dict[str, int], idf: np.ndarray, offsets: np.ndarray,
+                 post_docs: Optional[np.ndarray], post_tfs: Optional[np.ndarray], doc_len: np.ndarray,
+                 k1: float = K1, b: float = B, epsilon: float = EPSILON,
+                 packed: Optional[PackedPostings] = None, avgdl: Optional[float] = None):
+        self.vocab = vocab
+        self.idf = idf
+        self.offsets = offsets
+        self.packed = packed
+        self._post_docs = post_docs
+        self._post_tfs = post_tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = len(doc_len)
+        if avgdl is None:
+            avgdl = float(doc_len.sum()) / self.corpus_size if self.corpus_size else 0.0
+        self.avgdl = avgdl
+        # k1 * (1 - b + b * |d| / avgdl), the length part of the BM25 denominator
+        if self.avgdl:
+            self.norms = k1 * (1 - b + b * doc_len / self.avgdl)
+        else:
+            self.norms = np.full(self.corpus_size, k1)
+
+    @property
+    def post_docs(self) -> np.ndarray:
+        if self._post_docs is None:
+            self._post_docs, self._post_tfs = self.packed.decode()
+        return self._post_docs
+
+    @property
+    def post_tfs(self) -> np.ndarray:
+        if self._post_tfs is None:
+            self._post_docs, self._post_tfs = self.packed.decode()
+        return self._post_tfs
+
+    def postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, tfs) of one term."""
+        if self._post_docs is None:
+            return self.packed.term(tid)
+        lo, hi = int(self.offsets[tid]), int(self.offsets[tid + 1])
+        return self._post_docs[lo:hi], self._post_tfs[lo:hi]
+
+    @classmethod
+    def from_tokenized(cls, tokenized: Sequence[Sequence[str]], **params) -> "InvertedIndex":
+        return cls.from_term_counts((Counter(tokens).items() for tokens in tokenized), **params)
+
+    @classmethod
+    def from_term_counts(cls, doc_terms: Iterable[Iterable[Tuple[str, int]]],
+                         **params) -> "InvertedIndex":
+        """Build from per-document ``(term, tf)`` pairs in first-occurrence order."""
+        # term ids follow first occurrence, which keeps the IDF average (and
+        # therefore the epsilon floor) bit-identical to BM25Okapi
+        vocab: Dict[str, int] = {}
+        docs: List[List[int]] = []
+        tfs: List[List[int]] = []
+        doc_len: List[int] = []
+        for doc_id, terms in enumerate(doc_terms):
+            n_tokens = 0
+            for term, tf in terms:
+                tid = vocab.setdefault(term, len(vocab))
+                if tid == len(docs):
+                    docs.append([])
+                    tfs.append([])
+                docs[tid].append(doc_id)
+                tfs[tid].append(tf)
+                n_tokens += tf
+            doc_len.append(n_tokens)
+        return cls.from_postings(vocab, docs, tfs, doc_len, **params)
+
+    @classmethod
+    def from_postings(cls, vocab: Dict[str, int], docs: Sequence[Sequence[int]],
+                      tfs: Sequence[Sequence[int]], doc_len: Sequence[int],
+                      k1: float = K1, b: float = B, epsilon: float = EPSILON) -> "InvertedIndex":
+        lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=len(docs))
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        total = int(offsets[-1])
+        post_docs = np.fromiter((d for ds in docs for d in ds), dtype=np.int32, count=total)
+        post_tfs = np.fromiter((t for ts in tfs for t in ts), dtype=np.int32, count=total)
+        idf = compute_idf(lengths.tolist(), len(doc_len), epsilon)
+        return cls(vocab, idf, offsets, post_docs, post_tfs, np.asarray(doc_len, dtype=np.int32),
+                   k1=k1, b=b, epsilon=epsilon)
+
+    def scores(self, tokens: Sequence[str]) -> Dict[int, float]:
+        """Sparse BM25 scores: only documents containing a query term appear."""
+        acc: Dict[int, float] = {}
+        k1p1 = self.k1 + 1
+        get = acc.get
+        for term in tokens:
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            docs, tfs = self.postings(tid)
+            idf = float(self.idf[tid])
+            for doc_id, tf, norm in zip(docs.tolist(), tfs.tolist(), self.norms[docs].tolist()):
+                acc[doc_id] = get(doc_id, 0.0) + idf * (tf * k1p1 / (tf + norm))
+        return acc
+
+    def top_k(self, tokens: Sequence[str], k: int) -> List[Tuple[int, float]]:
+        """Best ``k`` (doc id, score) pairs, ties broken by lower doc id."""
+        return self.select(self.scores(tokens), k)
+
+    def select(self, acc: Dict[int, float], k: int) -> List[Tuple[int, float]]:
+        """Best ``k`` of sparse ``scores()`` output, ties broken by lower doc id."""
+        if k <= 0 or not self.corpus_size:
+            return []
+        key = lambda item: (item[1], -item[0])  # noqa: E731
+        best = heapq.nlargest(k, acc.items(), key=key)
+        if len(best) < k or best[-1][1] <= 0.0:
+            # documents without any query term score 0 and may still belong in the top k
+            # (too few matches, or matches with zero/negative IDF); the lowest ids win ties
+            extra: List[Tuple[int, float]] = []
+            for doc_id in range(self.corpus_size):
+                if doc_id not in acc:
+                    extra.append((doc_id, 0.0))
+                    if len(extra) == k:
+                        break
+            best = heapq.nlargest(k, best + extra, key=key)
+        return best
+
+    def _contributions(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, BM25 term scores) of one term's postings."""
+        docs, tfs = self.postings(tid)
+        # same operation order as scores(), so the floats are bit-identical
+        return docs, self.idf[tid] * (tfs * (self.k1 + 1) / (tfs + self.norms[docs]))
+
+    def top_k_many(self, queries: Sequence[Sequence[str]], k: int) -> List[List[Tuple[int, float]]]:
+        """``top_k`` for a batch of tokenized queries, with identical results.
+
+        Each distinct term is looked up and scored against its postings once
+        per batch; queries then accumulate those vectors into one reused dense
+        score buffer.
+        """
+        if k <= 0 or not self.corpus_size:
+            return [[] for _ in queries]
+        cache: Dict[str, Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+        for tokens in queries:
+            for term in tokens:
+                if term not in cache:
+                    tid = self.vocab.get(term)
+                    cache[term] = None if tid is None else self._contributions(tid)
+        acc = np.zeros(self.corpus_size)
+        all_ids = np.arange(self.corpus_size)
+        results: List[List[Tuple[int, float]]] = []
+        for tokens in queries:
+            hits = [cache[term] for term in tokens if cache[term] is not None]
+            # postings hold each doc once, so fancy-index += never drops an update
+            for docs, contrib in hits:
+                acc[docs] += contrib
+            touched = np.unique(np.concatenate([docs for docs, _ in hits])) if hits else all_ids[:0]
+            best = _select(touched, acc[touched], k)
+            if len(best) < k or best[-1][1] <= 0.0:
+                # untouched documents score 0 and may still belong in the top k
+                best = _select(all_ids, acc, k)
+            results.append(best)
+            acc[touched] = 0.0
+        return results
+
+
+class NumpyScorer:
+    """Vectorized BM25 backend over an ``InvertedIndex``'s CSR postings.
+
+    The BM25 saturation weight ``tf * (k1 + 1) / (tf + norm)`` of every posting
+    is precomputed once, so a query is a gather of its terms' postings slices,
+    one ``np.bincount`` into dense scores and a partition for the top k. Scores
+    equal ``InvertedIndex.scores`` (same operation order per document).
+    """
+
+    def __init__(self, index: InvertedIndex):
+        self.index = index
+        tfs = index.post_tfs
+        self.weights = tfs * (index.k1 + 1) / (tfs + index.norms[index.post_docs])
+
+    def scores(self, tokens: Sequence[str]) -> np.ndarray:
+        """Dense BM25 scores of every document."""
+        index = self.index
+        docs: List[np.ndarray] = []
+        contribs: List[np.ndarray] = []
+        for term in tokens:
+            tid = index.vocab.get(term)
+            if tid is None:
+                continue
+            lo, hi = int(index.offsets[tid]), int(index.offsets[tid + 1])
+            docs.append(index.post_docs[lo:hi])
+            contribs.append(index.idf[tid] * self.weights[lo:hi])
+        if not docs:
+            return np.zeros(index.corpus_size)
+        return np.bincount(np.concatenate(docs), weights=np.concatenate(contribs),
+                           minlength=index.corpus_size)
+
+    def top_k(self, tokens: Sequence[str], k: int) -> List[Tuple[int, float]]:
+        """Best ``k`` (doc id, score) pairs, ties broken by lower doc id."""
+        return self.select(self.scores(tokens), k)
+
+    def select(self, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Best ``k`` of dense ``scores()`` output, ties broken by lower doc id."""
+        if k <= 0 or not self.index.corpus_size:
+            return []
+        return _select(np.arange(self.index.corpus_size), scores, k)
+
+    def top_k_many(self, queries: Sequence[Sequence[str]], k: int) -> List[List[Tuple[int, float]]]:
+        return [self.top_k(tokens, k) for tokens in queries]
+
+
+def _select(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Best ``k`` of ``ids`` by score, ties broken by lower id."""
+    if len(ids) > k:
+        # keep everything tied with the k-th best so the id tie-break stays exact
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= kth
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))[:k]
+    return list(zip(ids[order].tolist(), scores[order].tolist()))
+
+
+def compute_idf(doc_freqs: Sequence[int], corpus_size: int, epsilon: float = EPSILON) -> np.ndarray:
+    """BM25Okapi IDF per term id, with negative values floored to epsilon * mean IDF."""
+    idf = [math.log(corpus_size - df + 0.5) - math.log(df + 0.5) for df in doc_freqs]
+    if idf:
+        idf_sum = 0.0
+        for v in idf:  # plain left-to-right sum, as BM25Okapi does
+            idf_sum += v
+        eps = epsilon * (idf_sum / len(idf))
+        idf = [eps if v < 0 else v for v in idf]
+    return np.asarray(idf, dtype=np.float64)
@@ -0,0 +1,112 @@
+"""Query result caches for the retriever.
+
+``QueryCache`` is a bounded in-process LRU with an optional TTL. ``RedisCache``
+is an optional shared tier (``pip install redis``, imported only when it is
+configured) so workers reuse each other's results. Keys always include the
+index version, so results computed against an older index can never be
+returned.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class QueryCache:
+    """Thread-safe LRU cache with optional per-entry TTL and hit/miss/eviction counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (expires_at or None, value); order = least recently used first
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+class RedisCache:
+    """Shared JSON cache in Redis; failures are treated as misses.
+
+    Entries always get an expiry (``ttl``, or ``default_ttl`` when no TTL is
+    configured) so keys of superseded index versions age out on their own.
+    """
+
+    def __init__(self, url: str, ttl: Optional[float] = None, prefix: str = "rag:topk:",
+                 default_ttl: int = 24 * 3600):
+        try:
+            import redis
+        except ImportError:  # optional dependency
+            raise RuntimeError("QUERY_CACHE_REDIS_URL is set but the redis package "
+                               "is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+        self.ttl = int(ttl) if ttl else default_ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: Hashable) -> str:
+        return self.prefix + hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            raw = self._client.get(self._key(key))
+        except self._errors:
+            self.errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        try:
+            self._client.set(self._key(key), json.dumps(value), ex=self.ttl)
+        except self._errors:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
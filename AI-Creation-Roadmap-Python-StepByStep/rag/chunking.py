@@ -0,0 +1,60 @@
+"""Split documents into bounded-size passages for indexing.
+
+Every chunk is a ``(start, end)`` character span into the document text, so a
+passage can always be traced back to its place in the source file.
+
+Modes:
+- ``heading``   one passage per Markdown section (a line starting with ``#``)
+- ``paragraph`` one passage per blank-line separated paragraph
+- ``window``    sliding windows of ``max_tokens`` tokens, ``overlap`` shared
+
+Sections and paragraphs longer than ``max_tokens`` are split further with the
+window chunker, so no passage exceeds ``max_tokens`` whitespace tokens.
+"""
+import re
+from typing import List, Tuple
+
+MODES = ("heading", "paragraph", "window")
+
+_TOKEN = re.compile(r"\S+")
+_HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+_BLANK_LINES = re.compile(r"\n[ \t]*\n")
+
+
+def _token_spans(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    return [m.span() for m in _TOKEN.finditer(text, start, end)]
+
+
+def _windows(tokens: List[Tuple[int, int]], max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    spans: List[Tuple[int, int]] = []
+    for lo in range(0, len(tokens), max_tokens - overlap):
+        hi = min(lo + max_tokens, len(tokens))
+        spans.append((tokens[lo][0], tokens[hi - 1][1]))
+        if hi == len(tokens):
+            break
+    return spans
+
+
+def chunk_spans(text: str, mode: str = "heading", max_tokens: int = 256,
+                overlap: int = 32) -> List[Tuple[int, int]]:
+    """Passage spans of ``text`` in document order; whitespace-only text has none."""
+    if mode not in MODES:
+        raise ValueError(f"unknown chunk mode {mode!r}, expected one of {MODES}")
+    if max_tokens < 1 or not 0 <= overlap < max_tokens:
+        raise ValueError("need max_tokens >= 1 and 0 <= overlap < max_tokens")
+    if mode == "window":
+        return _windows(_token_spans(text, 0, len(text)), max_tokens, overlap)
+    if mode == "heading":
+        cuts = [m.start() for m in _HEADING.finditer(text)]
+    else:
+        cuts = [m.end() for m in _BLANK_LINES.finditer(text)]
+    bounds = sorted({0, *cuts, len(text)})
+    spans: List[Tuple[int, int]] = []
+    for start, end in zip(bounds, bounds[1:]):
+        tokens = _token_spans(text, start, end)
+        # spans are trimmed to their first/last token; whitespace-only pieces vanish
+        if len(tokens) > max_tokens:
+            spans.extend(_windows(tokens, max_tokens, overlap))
+        elif tokens:
+            spans.append((tokens[0][0], tokens[-1][1]))
+    return spans
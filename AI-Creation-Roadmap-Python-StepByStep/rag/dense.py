@@ -0,0 +1,235 @@
+"""Local dense retrieval: LSA document vectors plus an IVF approximate nearest-neighbour index.
+
+Vectors come from a truncated SVD (randomized, NumPy only) of the
+row-normalized ``(1 + log tf) * idf`` document-term matrix of the BM25 index,
+so no model or network is needed and queries are embedded with the same term
+weights. Documents are clustered with spherical k-means; a search scores the
+query against the centroids, then exactly against the documents of the
+``nprobe`` closest lists only.
+
+The artefact uses the container layout of ``rag.store`` with its own magic::
+
+    b"DENSEIX1" | uint64 header length | JSON header | aligned sections...
+
+Sections: ``components`` float32 ``(n_terms, dim)`` term → vector projection,
+``vectors`` float32 ``(n_docs, dim)`` unit document vectors, ``centroids``
+float32 ``(n_lists, dim)``, ``list_offsets`` int64 ``n_lists + 1`` and
+``list_docs`` int32 doc ids grouped by list. The header records the BM25
+index version it was built from; term and doc ids refer to that index.
+"""
+import json
+import math
+import mmap
+import os
+import uuid
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.bm25 import InvertedIndex, _select
+from rag.store import _LEN, _align, _nbytes, _section_digest
+
+MAGIC = b"DENSEIX1"
+DIM = 128
+SEED = 0
+_LAYOUT = [("components", "<f4"), ("vectors", "<f4"), ("centroids", "<f4"),
+           ("list_offsets", "<i8"), ("list_docs", "<i4")]
+# rows per block when scoring many vectors against centroids
+_BLOCK = 1 << 14
+
+
+def _posting_weights(index: InvertedIndex) -> Tuple[np.ndarray, np.ndarray]:
+    """(term id, weight) per posting: ``(1 + log tf) * idf``, rows scaled to unit length."""
+    terms = np.repeat(np.arange(len(index.idf)), np.diff(index.offsets))
+    weights = (1.0 + np.log(index.post_tfs.astype(np.float64))) * index.idf[terms]
+    norms = np.sqrt(np.bincount(index.post_docs, weights=weights * weights,
+                                minlength=index.corpus_size))
+    weights /= np.where(norms > 0, norms, 1.0)[index.post_docs]
+    return terms, weights
+
+
+def _lsa(index: InvertedIndex, dim: int, oversample: int = 10, power_iters: int = 2,
+         seed: int = SEED) -> np.ndarray:
+    """Term → ``dim`` projection (right singular vectors) of the weighted doc-term matrix A.
+
+    Randomized range finder (Halko et al.) with power iterations; A is never
+    materialized, products go through the CSR postings one column at a time.
+    """
+    terms, weights = _posting_weights(index)
+    docs, starts = index.post_docs, index.offsets[:-1]
+    n_docs, n_terms = index.corpus_size, len(index.idf)
+
+    def a_times(x: np.ndarray) -> np.ndarray:  # (n_terms, l) → (n_docs, l)
+        return np.stack([np.bincount(docs, weights=weights * x[terms, j], minlength=n_docs)
+                         for j in range(x.shape[1])], axis=1)
+
+    def at_times(y: np.ndarray) -> np.ndarray:  # (n_docs, l) → (n_terms, l)
+        # postings are grouped by term and every term has at least one
+        return np.stack([np.add.reduceat(weights * y[docs, j], starts)
+                         for j in range(y.shape[1])], axis=1)
+
+    width = min(dim + oversample, n_docs, n_terms)
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(a_times(rng.standard_normal((n_terms, width))))
+    for _ in range(power_iters):
+        z, _ = np.linalg.qr(at_times(q))
+        q, _ = np.linalg.qr(a_times(z))
+    # A ≈ Q B with B = Qᵀ A small; its right singular vectors are A's
+    _, _, vt = np.linalg.svd(at_times(q).T, full_matrices=False)
+    return vt[:min(dim, width)].T
+
+
+def _unit(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.where(norms > 0, norms, 1.0)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate([np.argmax(vectors[lo:lo + _BLOCK] @ centroids.T, axis=1)
+                           for lo in range(0, len(vectors), _BLOCK)])
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iters: int = 20,
+            seed: int = SEED) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means: unit centroids and each vector's list."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    assign = _assign(vectors, centroids)
+    for _ in range(iters):
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = np.flatnonzero(np.bincount(assign, minlength=n_lists) == 0)
+        if len(empty):
+            # re-seed empty lists with the vectors farthest from their centroid
+            fit = np.einsum("ij,ij->i", vectors, centroids[assign])
+            sums[empty] = vectors[np.argsort(fit, kind="stable")[:len(empty)]]
+        centroids = _unit(sums)
+        updated = _assign(vectors, centroids)
+        if np.array_equal(updated, assign):
+            break
+        assign = updated
+    return centroids, assign
+
+
+def build_dense(index: InvertedIndex, bm25_version: str, path: str, dim: int = DIM,
+                n_lists: int = 0) -> str:
+    """Compute vectors and the IVF lists for ``index`` and write them to ``path``; returns the version.
+
+    ``n_lists=0`` picks about ``sqrt(n_docs)`` lists.
+    """
+    requested = {"dim": dim, "n_lists": n_lists}  # lets ingest tell whether settings changed
+    components = _lsa(index, dim).astype(np.float32)
+    terms, weights = _posting_weights(index)
+    vectors = np.stack([np.bincount(index.post_docs, weights=weights * components[terms, j],
+                                    minlength=index.corpus_size)
+                        for j in range(components.shape[1])], axis=1)
+    vectors = _unit(vectors).astype(np.float32)
+    n_lists = min(n_lists or max(1, round(math.sqrt(index.corpus_size))), index.corpus_size)
+    centroids, assign = _kmeans(vectors, n_lists)
+    order = np.argsort(assign, kind="stable")
+    arrays = {"components": components, "vectors": vectors,
+              "centroids": centroids.astype(np.float32),
+              "list_offsets": np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]),
+              "list_docs": order}
+    header = {"version": "0" * 64, "bm25_version": bm25_version, "dim": components.shape[1],
+              "n_lists": len(centroids), "n_docs": index.corpus_size,
+              "requested": requested, "sections": {}}
+    for name, dtype in _LAYOUT:
+        header["sections"][name] = [10 ** 15, dtype, int(arrays[name].size)]
+    start = _align(len(MAGIC) + _LEN.size + len(json.dumps(header).encode()))
+    pos = start
+    for name, dtype in _LAYOUT:
+        header["sections"][name] = [pos, dtype, int(arrays[name].size)]
+        pos = _align(pos + _nbytes(dtype, arrays[name].size))
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w+b") as out:
+            out.write(_header_bytes(header, start))
+            for name, dtype in _LAYOUT:
+                out.seek(header["sections"][name][0])
+                out.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+            out.truncate(pos)
+        header["version"] = _section_digest(tmp_path, header)
+        with open(tmp_path, "r+b") as out:
+            out.write(_header_bytes(header, start))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return header["version"]
+
+
+def _header_bytes(header: dict, start: int) -> bytes:
+    head = json.dumps(header).encode()
+    head += b" " * (start - len(MAGIC) - _LEN.size - len(head))
+    return MAGIC + _LEN.pack(len(head)) + head
+
+
+def read_dense_header(path: str) -> dict:
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a dense index (re-run scripts/ingest.py --dense)")
+        (size,) = _LEN.unpack(fh.read(_LEN.size))
+        return json.loads(fh.read(size))
+
+
+class DenseIndex:
+    """Read-only, memory-mapped dense index over the documents of one BM25 index."""
+
+    def __init__(self, path: str, index: InvertedIndex):
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(fh.fileno())
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a dense index (re-run scripts/ingest.py --dense)")
+        (size,) = _LEN.unpack_from(self._mm, len(MAGIC))
+        start = len(MAGIC) + _LEN.size
+        self.header = json.loads(self._mm[start:start + size])
+        self.version: str = self.header["version"]
+        self.bm25_version: str = self.header["bm25_version"]
+        dim = self.header["dim"]
+        self.index = index
+        self.components = self._array("components").reshape(-1, dim)
+        self.vectors = self._array("vectors").reshape(-1, dim)
+        self.centroids = self._array("centroids").reshape(-1, dim)
+        self.list_offsets = self._array("list_offsets")
+        self.list_docs = self._array("list_docs")
+
+    def _array(self, name: str) -> np.ndarray:
+        offset, dtype, count = self.header["sections"][name]
+        return np.frombuffer(self._mm, dtype=np.dtype(dtype), count=count, offset=offset)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def encode(self, tokens: Sequence[str]) -> Optional[np.ndarray]:
+        """Unit query vector (same term weighting as the documents), or None if no term is known."""
+        counts = Counter(tid for tid in map(self.index.vocab.get, tokens) if tid is not None)
+        if not counts:
+            return None
+        tids = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        tfs = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights = (1.0 + np.log(tfs)) * self.index.idf[tids]
+        vec = weights.astype(np.float32) @ self.components[tids]
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else None
+
+    def exact(self, vec: Optional[np.ndarray], k: int) -> List[Tuple[int, float]]:
+        """Brute-force top ``k`` by cosine similarity, ties broken by lower doc id."""
+        if k <= 0 or not len(self):
+            return []
+        scores = np.zeros(len(self)) if vec is None else (self.vectors @ vec).astype(np.float64)
+        return _select(np.arange(len(self)), scores, k)
+
+    def search(self, vec: Optional[np.ndarray], k: int, nprobe: int) -> List[Tuple[int, float]]:
+        """Approximate top ``k``: exact scores within the ``nprobe`` lists closest to the query."""
+        if vec is None or nprobe >= len(self.centroids):
+            return self.exact(vec, k)
+        if k <= 0:
+            return []
+        near = np.argpartition(-(self.centroids @ vec), nprobe - 1)[:nprobe]
+        ids = np.concatenate([self.list_docs[self.list_offsets[c]:self.list_offsets[c + 1]]
+                              for c in near.tolist()]).astype(np.int64)
+        return _select(ids, (self.vectors[ids] @ vec).astype(np.float64), k)
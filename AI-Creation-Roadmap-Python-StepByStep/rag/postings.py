@@ -0,0 +1,97 @@
+"""Compressed postings: delta + varint doc ids and 1-byte quantized term frequencies.
+
+Each term's doc ids are stored as gaps (the first one absolute), every gap
+as a little-endian base-128 varint: 7 bits per byte, high bit set on all but
+the last byte. Gaps between neighbouring documents of common terms fit in
+one byte, so doc ids take little more than a byte per posting instead of 4.
+
+Term frequencies are 1-byte codes: 0–128 exactly, then log-spaced up to
+about 31 000 (within 2.3 %). BM25's tf saturation makes the rounding of
+large counts invisible in rankings.
+
+Decoding is vectorized with NumPy: terminator bytes mark value boundaries,
+``np.add.reduceat`` assembles the 7-bit groups and ``np.cumsum`` turns gaps
+back into doc ids.
+"""
+from typing import Tuple
+
+import numpy as np
+
+# tf code → tf
+TF_TABLE = np.concatenate([np.arange(129), np.round(128 * 2 ** (np.arange(1, 128) / 16))]).astype(np.int32)
+_TF_BOUNDS = (TF_TABLE[:-1] + TF_TABLE[1:]) / 2
+
+
+def encode_tfs(tfs: np.ndarray) -> np.ndarray:
+    """Nearest 1-byte code of each term frequency."""
+    return np.searchsorted(_TF_BOUNDS, tfs).astype(np.uint8)
+
+
+def encode_docs(docs: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Varint gaps of CSR doc ids (ascending per term) → (bytes, byte offsets per term).
+
+    ``offsets`` are the postings offsets of each term, starting at 0.
+    """
+    docs = np.asarray(docs, dtype=np.int64)
+    gaps = np.diff(docs, prepend=0)
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    gaps[starts] = docs[starts]
+    nbytes = np.ones(len(gaps), dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        nbytes += gaps >= 1 << bits
+    ends = np.cumsum(nbytes)
+    value = np.repeat(np.arange(len(gaps)), nbytes)
+    pos = np.arange(int(ends[-1]) if len(ends) else 0) - np.repeat(ends - nbytes, nbytes)
+    out = ((gaps[value] >> (7 * pos)) & 0x7F).astype(np.uint8)
+    out[pos < nbytes[value] - 1] |= 0x80
+    return out, np.concatenate([[0], ends])[offsets]
+
+
+def decode_varints(buf: np.ndarray) -> np.ndarray:
+    """All varints in ``buf`` as int64."""
+    last = buf < 0x80
+    if last.all():  # every gap under 128, the common case for frequent terms
+        return buf.astype(np.int64)
+    if not last[-1]:
+        raise ValueError("truncated varint in postings")
+    ends = np.flatnonzero(last)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shift = 7 * (np.arange(len(buf)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((buf & 0x7F).astype(np.int64) << shift, starts)
+
+
+class PackedPostings:
+    """Read side of the compressed postings of a CSR index (arrays may be memory maps)."""
+
+    def __init__(self, offsets: np.ndarray, doc_bytes: np.ndarray, byte_offsets: np.ndarray,
+                 tf_codes: np.ndarray):
+        self.offsets = offsets
+        self.doc_bytes = doc_bytes
+        self.byte_offsets = byte_offsets
+        self.tf_codes = tf_codes
+
+    @property
+    def nbytes(self) -> int:
+        return self.doc_bytes.nbytes + self.byte_offsets.nbytes + self.tf_codes.nbytes
+
+    def term(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, tfs) of one term."""
+        lo, hi = int(self.byte_offsets[tid]), int(self.byte_offsets[tid + 1])
+        docs = np.cumsum(decode_varints(self.doc_bytes[lo:hi])) if hi > lo else np.zeros(0, np.int64)
+        return docs, TF_TABLE[self.tf_codes[int(self.offsets[tid]):int(self.offsets[tid + 1])]]
+
+    def decode(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, tfs) of every posting, in CSR order."""
+        gaps = decode_varints(self.doc_bytes) if len(self.doc_bytes) else np.zeros(0, np.int64)
+        if len(gaps) != len(self.tf_codes):
+            raise ValueError("postings doc ids and tfs disagree in length")
+        docs = np.cumsum(gaps)
+        counts = np.diff(self.offsets)
+        starts = self.offsets[:-1][counts > 0]
+        # undo the running sum carried over from the previous terms
+        base = np.zeros(len(counts), dtype=np.int64)
+        base[counts > 0] = docs[starts] - gaps[starts]
+        docs -= np.repeat(base, counts)
+        return docs.astype(np.int32), TF_TABLE[self.tf_codes]
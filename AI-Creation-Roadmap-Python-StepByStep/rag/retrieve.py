@@ -1,31 +1,528 @@
 import os
-import pickle
-from typing import List, Tuple
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
-from rank_bm25 import BM25Okapi
+import numpy as np
 
-ARTEFACT = os.path.join(os.path.dirname(__file__), "bm25_index.pkl")
+# ensure project root on sys.path for `rag` import when run as a script
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
 
+try:
+    from opentelemetry import trace
+except ImportError:  # optional dependency
+    trace = None
 
-def load_index():
+from rag.bm25 import InvertedIndex, NumpyScorer, _select
+from rag.cache import QueryCache, RedisCache
+from rag.dense import DenseIndex, read_dense_header
+from rag.shards import ShardedIndex, read_shard_set
+from rag.store import MappedIndex, read_header
+
+ARTEFACT = os.path.join(os.path.dirname(__file__), "bm25_index.bin")
+DENSE_ARTEFACT = os.path.join(os.path.dirname(__file__), "dense_index.bin")
+# written by `ingest.py --shards N` instead of ARTEFACT; when present, queries are
+# scattered to one worker process per shard and their top k merged (bm25 mode only)
+SHARDS_ARTEFACT = os.path.join(os.path.dirname(__file__), "bm25_shards.json")
+# seconds a replaced shard set keeps its workers, for queries already sent to it
+SHARDS_RETIRE_S = 30.0
+
+# "bm25" ranks by lexical BM25; "dense" by LSA vector similarity through the IVF
+# index (built by `ingest.py --dense`), probing DENSE_NPROBE lists per query;
+# "hybrid" takes the best `candidates` of each (the dense branch on a small
+# thread pool while BM25 scores) and fuses the two rankings over their union
+MODES = ("bm25", "dense", "hybrid")
+DENSE_NPROBE = int(os.getenv("DENSE_NPROBE", "8"))
+# "rrf": sum of 1 / (HYBRID_RRF_K + rank) over both rankings; "weighted": min-max
+# normalized scores, HYBRID_DENSE_WEIGHT * dense + (1 - weight) * BM25
+FUSIONS = ("rrf", "weighted")
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.5"))
+_branches = ThreadPoolExecutor(max_workers=int(os.getenv("HYBRID_WORKERS", "4")),
+                               thread_name_prefix="hybrid")
+
+# scoring backend: "postings" walks the query terms' postings in Python (cheap for
+# rare terms), "numpy" gathers them into dense vectors (faster for common terms)
+BACKENDS = {"postings": lambda index: index, "numpy": NumpyScorer}
+BM25_BACKEND = os.getenv("BM25_BACKEND", "postings")
+if BM25_BACKEND not in BACKENDS:
+    raise ValueError(f"BM25_BACKEND must be one of {sorted(BACKENDS)}, got {BM25_BACKEND!r}")
+
+# Results of recent queries, keyed on (index version, mode, tokens, k). QUERY_CACHE_SIZE=0
+# disables it; QUERY_CACHE_REDIS_URL adds a tier shared by all workers.
+_ttl = float(os.getenv("QUERY_CACHE_TTL") or 0) or None
+_cache = QueryCache(int(os.getenv("QUERY_CACHE_SIZE", "1024")), _ttl)
+_shared: Optional[RedisCache] = None
+if os.getenv("QUERY_CACHE_REDIS_URL"):
+    _shared = RedisCache(os.environ["QUERY_CACHE_REDIS_URL"], _ttl)
+
+# Opened once per process and shared by every request. The file is mapped
+# read-only, so workers on the same host share its pages through the OS cache.
+# Swapped as a whole (single assignment) so readers always see one snapshot.
+_lock = threading.Lock()
+_stat: Optional[Tuple[int, int, int]] = None  # (inode, mtime_ns, size) of the mapped file
+_loaded: Optional[Tuple[MappedIndex, Union[InvertedIndex, NumpyScorer]]] = None
+_dense_stat: Optional[Tuple[int, int, int]] = None
+_dense: Optional[DenseIndex] = None
+_shards_stat: Optional[Tuple[int, int, int]] = None
+_sharded: Optional[ShardedIndex] = None
+
+# optional per-stage timing hook: called with (stage, seconds) for index_load,
+# tokenize, score and select (batch_score for top_k_many; encode and ann for dense;
+# bm25_branch, dense_branch and fuse for hybrid; scatter and merge when sharded)
+_observe: Optional[Callable[[str, float], None]] = None
+# [count, total seconds, max seconds] per hybrid branch, for branch_stats()
+_branch_times: Dict[str, List[float]] = {"bm25": [0, 0.0, 0.0], "dense": [0, 0.0, 0.0],
+                                         "fuse": [0, 0.0, 0.0]}
+_branch_lock = threading.Lock()
+
+
+def set_stage_observer(fn: Optional[Callable[[str, float], None]]) -> None:
+    global _observe
+    _observe = fn
+
+
+# spans are only recorded when the app installs a tracer provider (see app/tracing.py)
+_tracer = trace.get_tracer(__name__) if trace is not None else None
+
+
+def _span(name: str):
+    return _tracer.start_as_current_span(name) if _tracer is not None else nullcontext()
+
+
+def _postings(index: InvertedIndex, tokens: Sequence[str]) -> int:
+    """Number of postings a query walks (one per query term occurrence)."""
+    total = 0
+    for term in tokens:
+        tid = index.vocab.get(term)
+        if tid is not None:
+            total += int(index.offsets[tid + 1] - index.offsets[tid])
+    return total
+
+
+def _artefact_stat(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def index_version() -> Optional[str]:
+    """Content hash of the currently loaded index or shard set (None before first load).
+
+    Followed by the dense index version once one is loaded for the index, since
+    dense and hybrid results change when only the dense index is rebuilt.
+    """
+    if _sharded is not None:
+        return _sharded.version
+    if _loaded is None:
+        return None
+    return _results_version(_loaded[0], _dense)
+
+
+def _results_version(store: MappedIndex, dense: Optional[DenseIndex] = None) -> str:
+    """Version in result cache keys: the BM25 index, plus ``dense`` if it ranked them."""
+    if dense is None or dense.bm25_version != store.version:
+        return store.version
+    return f"{store.version}+{dense.version}"
+
+
+def index_stats() -> Optional[Dict[str, Any]]:
+    """Version, passage count and file size of the loaded index (None before first load)."""
+    if _sharded is not None:
+        return {"version": _sharded.version, "documents": len(_sharded), "bytes": _sharded.bytes,
+                "shards": len(_sharded.paths)}
+    if _loaded is None:
+        return None
+    store = _loaded[0]
+    return {"version": store.version, "documents": len(store), "bytes": store.stat.st_size}
+
+
+def _retire(sharded: Optional[ShardedIndex]) -> None:
+    if sharded is not None:
+        timer = threading.Timer(SHARDS_RETIRE_S, sharded.close)
+        timer.daemon = True
+        timer.start()
+
+
+def load_shards() -> Optional[ShardedIndex]:
+    """Router over the shard set written by ``ingest.py --shards``; None for a single-file index."""
+    global _shards_stat, _sharded
+    try:
+        stat = _artefact_stat(SHARDS_ARTEFACT)
+    except FileNotFoundError:
+        if _sharded is not None:
+            with _lock:  # back to a single-file index
+                _retire(_sharded)
+                _sharded = _shards_stat = None
+        return None
+    if _sharded is not None and stat == _shards_stat:
+        return _sharded
+    with _lock:
+        if _sharded is not None and _artefact_stat(SHARDS_ARTEFACT) == _shards_stat:
+            return _sharded
+        if _sharded is None or read_shard_set(SHARDS_ARTEFACT)["version"] != _sharded.version:
+            previous, _sharded = _sharded, ShardedIndex(SHARDS_ARTEFACT, BM25_BACKEND)
+            _cache.clear()
+            _retire(previous)
+        _shards_stat = stat
+        return _sharded
+
+
+def close() -> None:
+    """Stop the shard worker processes, if any (worker shutdown)."""
+    global _sharded, _shards_stat
+    with _lock:
+        if _sharded is not None:
+            _sharded.close()
+        _sharded = _shards_stat = None
+
+
+def load_index() -> Tuple[MappedIndex, Union[InvertedIndex, NumpyScorer]]:
+    """(store, scorer) of the current index; the scorer follows ``BM25_BACKEND``."""
+    global _stat, _loaded
     if not os.path.exists(ARTEFACT):
         raise FileNotFoundError("Index not found. Run scripts/ingest.py first.")
-    with open(ARTEFACT, "rb") as fh:
-        data = pickle.load(fh)
-    return data["corpus"], data["index"]
+    stat = _artefact_stat(ARTEFACT)
+    if _loaded is not None and stat == _stat:
+        return _loaded
+    with _lock:
+        if _loaded is not None and _artefact_stat(ARTEFACT) == _stat:
+            return _loaded
+        # same content (e.g. re-ingest of unchanged docs) → keep the current mapping
+        if _loaded is None or read_header(ARTEFACT)["version"] != _loaded[0].version:
+            store = MappedIndex(ARTEFACT)
+            _loaded = (store, BACKENDS[BM25_BACKEND](store.index))
+            # results of the previous index can no longer be hit (the version is
+            # part of the key); free them now instead of waiting for eviction
+            _cache.clear()
+            st = store.stat
+            _stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        else:
+            _stat = _artefact_stat(ARTEFACT)
+        return _loaded
+
+
+def load_dense(store: MappedIndex) -> DenseIndex:
+    """Dense index over the documents of ``store``; reloaded when its file changes."""
+    global _dense_stat, _dense
+    if not os.path.exists(DENSE_ARTEFACT):
+        raise FileNotFoundError("Dense index not found. Run scripts/ingest.py --dense first.")
+    dense = _dense
+    if dense is not None and dense.index is store.index and _artefact_stat(DENSE_ARTEFACT) == _dense_stat:
+        return dense
+    with _lock:
+        if read_dense_header(DENSE_ARTEFACT)["bm25_version"] != store.version:
+            raise ValueError("Dense index was built from another BM25 index. "
+                             "Run scripts/ingest.py --dense again.")
+        dense = DenseIndex(DENSE_ARTEFACT, store.index)
+        st = dense.stat
+        _dense, _dense_stat = dense, (st.st_ino, st.st_mtime_ns, st.st_size)
+        return dense
+
+
+def warm(k: int = 4, deep: bool = False) -> Dict[str, Any]:
+    """Load and validate the index, pre-fault its pages and run a synthetic query.
+
+    Meant for worker startup, so the first real query doesn't pay for the
+    mapping, page faults or first-call overheads. The synthetic query uses the
+    most frequent terms (the longest postings) and bypasses the query cache.
+    A shard set is warmed in every shard's worker process.
+    """
+    sharded = load_shards()
+    if sharded is not None:
+        return sharded.warm(k, deep)
+    started = time.perf_counter()
+    store, scorer = load_index()
+    loaded = time.perf_counter()
+    store.validate(deep)
+    store.prefetch()
+    validated = time.perf_counter()
+    if store.terms:
+        doc_freqs = np.diff(store.index.offsets)
+        tokens = [store.terms[i] for i in np.argsort(doc_freqs, kind="stable")[-8:].tolist()]
+        hits = scorer.select(scorer.scores(tokens), k)
+        scorer.top_k_many([tokens, tokens[:1]], k)
+        for i, _ in hits:
+            store.doc(i)
+    info = {"version": store.version, "documents": len(store), "bytes": store.stat.st_size,
+            "load_s": round(loaded - started, 6), "validate_s": round(validated - loaded, 6),
+            "query_s": round(time.perf_counter() - validated, 6)}
+    if os.path.exists(DENSE_ARTEFACT):
+        try:
+            dense = load_dense(store)
+        except ValueError as e:
+            info["dense"] = str(e)  # stale: dense mode fails until ingest --dense re-runs
+        else:
+            if store.terms:
+                # on the branch pool, so hybrid queries find a thread started
+                _branches.submit(_dense_branch, dense, tokens, k).result()
+            info["dense"] = dense.version
+    return info
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Hit/miss/eviction counters of the query cache (and the shared tier, if any)."""
+    stats = {"local": _cache.stats()}
+    if _shared is not None:
+        stats["shared"] = _shared.stats()
+    return stats
+
+
+def _cached(version: str, mode: str, tokens: List[str], k: int) -> Optional[List[Tuple[str, str]]]:
+    key = (version, mode, tuple(tokens), k)
+    hits = _cache.get(key)
+    if hits is None and _shared is not None:
+        shared = _shared.get(key)
+        if shared is not None:
+            hits = [(doc_id, text) for doc_id, text in shared]
+            _cache.put(key, hits)
+    return hits
+
+
+def _remember(version: str, mode: str, tokens: List[str], k: int,
+              hits: List[Tuple[str, str]]) -> None:
+    key = (version, mode, tuple(tokens), k)
+    _cache.put(key, hits)
+    if _shared is not None:
+        _shared.put(key, hits)
+
+
+def shard_stats() -> Optional[Dict[str, Any]]:
+    """Time spent by each shard and by whole scatter-gathers (None without a shard set)."""
+    sharded = _sharded
+    return sharded.stats() if sharded is not None else None
+
+
+def branch_stats() -> Dict[str, Dict[str, float]]:
+    """Time spent in each branch of hybrid queries (and in fusing them)."""
+    with _branch_lock:
+        return {name: {"count": count, "total_s": round(total, 6), "max_s": round(peak, 6),
+                       "avg_s": round(total / count, 6) if count else 0.0}
+                for name, (count, total, peak) in _branch_times.items()}
+
+
+def _record_branches(**seconds: float) -> None:
+    with _branch_lock:
+        for name, value in seconds.items():
+            times = _branch_times[name]
+            times[0] += 1
+            times[1] += value
+            times[2] = max(times[2], value)
+    if _observe is not None:
+        for name, value in seconds.items():
+            _observe(name if name == "fuse" else f"{name}_branch", value)
+
+
+def _dense_branch(dense: DenseIndex, tokens: List[str], n: int):
+    started = time.perf_counter()
+    vec = dense.encode(tokens)
+    ranked = dense.search(vec, n, DENSE_NPROBE) if vec is not None else []
+    return vec, ranked, time.perf_counter() - started
+
+
+def _lexical(scores, ids: np.ndarray) -> np.ndarray:
+    """BM25 scores of ``ids`` from ``scores()`` output (sparse dict or dense array)."""
+    if isinstance(scores, dict):
+        return np.array([scores.get(i, 0.0) for i in ids.tolist()], dtype=np.float64)
+    return scores[ids]
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min()
+    return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+
+def _hybrid(store: MappedIndex, scorer: Union[InvertedIndex, NumpyScorer], tokens: List[str],
+            k: int, candidates: int) -> List[Tuple[int, float]]:
+    """Best ``k`` by fusing the top ``candidates`` of BM25 and of the dense index."""
+    dense = load_dense(store)
+    n = max(k, candidates)
+    future = _branches.submit(_dense_branch, dense, tokens, n)
+    started = time.perf_counter()
+    scores = scorer.scores(tokens)
+    # documents without a query term are padding, not lexical candidates
+    lexical = [(i, score) for i, score in scorer.select(scores, n) if score > 0.0]
+    lexical_s = time.perf_counter() - started
+    vec, semantic, dense_s = future.result()
+    fusing = time.perf_counter()
+    ids = np.array(sorted({i for i, _ in lexical} | {i for i, _ in semantic}), dtype=np.int64)
+    if not len(ids):
+        ranked = scorer.select(scores, k)
+    elif HYBRID_FUSION == "rrf":
+        position = {i: pos for pos, i in enumerate(ids.tolist())}
+        fused = np.zeros(len(ids))
+        for ranking in (lexical, semantic):
+            for rank, (i, _) in enumerate(ranking, 1):
+                fused[position[i]] += 1.0 / (HYBRID_RRF_K + rank)
+        ranked = _select(ids, fused, k)
+    else:
+        # only the union is scored on the side(s) that did not return it
+        cosine = (dense.vectors[ids] @ vec).astype(np.float64) if vec is not None else np.zeros(len(ids))
+        fused = (HYBRID_DENSE_WEIGHT * _minmax(cosine)
+                 + (1.0 - HYBRID_DENSE_WEIGHT) * _minmax(_lexical(scores, ids)))
+        ranked = _select(ids, fused, k)
+    _record_branches(bm25=lexical_s, dense=dense_s, fuse=time.perf_counter() - fusing)
+    return ranked
+
+
+def _rank(store: MappedIndex, scorer: Union[InvertedIndex, NumpyScorer], tokens: List[str],
+          k: int, mode: str, candidates: int = HYBRID_CANDIDATES) -> List[Tuple[int, float]]:
+    """Best ``k`` (doc id, score) pairs of one tokenized query under ``mode``."""
+    if mode == "hybrid":
+        return _hybrid(store, scorer, tokens, k, candidates)
+    started = time.perf_counter()
+    if mode == "dense":
+        dense = load_dense(store)
+        vec = dense.encode(tokens)
+        middle = time.perf_counter()
+        ranked = dense.search(vec, k, DENSE_NPROBE)
+        stages = ("encode", "ann")
+    else:
+        scores = scorer.scores(tokens)
+        middle = time.perf_counter()
+        ranked = scorer.select(scores, k)
+        stages = ("score", "select")
+    if _observe is not None:
+        _observe(stages[0], middle - started)
+        _observe(stages[1], time.perf_counter() - middle)
+    return ranked
+
+
+def _ordered(hits: List[Tuple[Tuple[str, str], float]]) -> List[Tuple[str, str]]:
+    """Passages best first, equal scores by passage name (like ``ShardedIndex.merge``)."""
+    return [doc for doc, _ in sorted(hits, key=lambda hit: (-hit[1], hit[0][0]))]
+
+
+def _variant(mode: str, candidates: Optional[int]) -> str:
+    """Validated ``mode`` as it appears in cache keys (hybrid settings change results)."""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if mode != "hybrid":
+        return mode
+    if HYBRID_FUSION not in FUSIONS:
+        raise ValueError(f"HYBRID_FUSION must be one of {FUSIONS}, got {HYBRID_FUSION!r}")
+    if candidates is not None and candidates < 1:
+        raise ValueError(f"candidates must be at least 1, got {candidates}")
+    return f"hybrid:{HYBRID_FUSION}:{candidates or HYBRID_CANDIDATES}"
+
+
+def _top_k_sharded(sharded: ShardedIndex, queries: Sequence[str], k: int, mode: str,
+                   span, started: float) -> List[List[Tuple[str, str]]]:
+    """``top_k_many`` over a shard set: cache misses are scattered to every shard at once."""
+    if mode != "bm25":
+        raise ValueError(f"mode {mode!r} needs the single-file index; "
+                         "sharded indexes answer mode 'bm25' only")
+    loaded = time.perf_counter()
+    # only terms of some shard's vocabulary are sent; each shard drops the rest
+    tokenized = [sharded.vocabulary.lookup(q) for q in queries]
+    done = time.perf_counter()
+    results = [_cached(sharded.version, mode, tokens, k) for tokens in tokenized]
+    todo = [n for n, hits in enumerate(results) if hits is None]
+    if span is not None and span.is_recording():
+        span.set_attributes({"rag.k": k, "rag.mode": mode, "rag.queries": len(queries),
+                             "rag.tokens": sum(len(tokens) for tokens in tokenized),
+                             "rag.shards": len(sharded.paths), "rag.index_version": sharded.version,
+                             "rag.cache_misses": len(todo)})
+    if todo:
+        scattering = time.perf_counter()
+        replies = sharded.scatter([tokenized[n] for n in todo], k)
+        merging = time.perf_counter()
+        for j, n in enumerate(todo):
+            results[n] = [doc for doc, _ in sharded.merge([shard[j] for shard in replies], k)]
+            _remember(sharded.version, mode, tokenized[n], k, results[n])
+        if _observe is not None:
+            _observe("scatter", merging - scattering)
+            _observe("merge", time.perf_counter() - merging)
+    if _observe is not None:
+        _observe("index_load", loaded - started)
+        _observe("tokenize", done - loaded)
+    return [list(hits) for hits in results]
+
+
+def top_k(query: str, k: int = 4, mode: str = "bm25",
+          candidates: Optional[int] = None) -> List[Tuple[str, str]]:
+    """Best ``k`` (doc id, text) passages; ``candidates`` per branch in hybrid mode."""
+    variant = _variant(mode, candidates)
+    candidates = candidates or HYBRID_CANDIDATES
+    with _span("rag_top_k") as span:
+        started = time.perf_counter()
+        sharded = load_shards()
+        if sharded is not None:
+            return _top_k_sharded(sharded, [query], k, mode, span, started)[0]
+        store, scorer = load_index()
+        loaded = time.perf_counter()
+        # analyzed like the index; only terms of its vocabulary are kept
+        tokens = store.vocabulary.lookup(query)
+        tokenized = time.perf_counter()
+        # dense and hybrid hits also go stale when only the dense index is rebuilt
+        version = _results_version(store, load_dense(store) if mode != "bm25" else None)
+        hits = _cached(version, variant, tokens, k)
+        if span is not None and span.is_recording():
+            span.set_attributes({"rag.k": k, "rag.mode": variant, "rag.tokens": len(tokens),
+                                 "rag.postings": _postings(store.index, tokens),
+                                 "rag.index_version": version,
+                                 "rag.cache_hit": hits is not None})
+        if hits is None:
+            # only the k hits are read from the text store
+            hits = _ordered([(store.doc(i), score)
+                             for i, score in _rank(store, scorer, tokens, k, mode, candidates)])
+            _remember(version, variant, tokens, k, hits)
+        if _observe is not None:
+            _observe("index_load", loaded - started)
+            _observe("tokenize", tokenized - loaded)
+        return list(hits)
 
 
-def top_k(query: str, k: int = 4) -> List[Tuple[str, str]]:
-    corpus, index: Tuple[List[Tuple[str, str]], BM25Okapi] = load_index()
-    # tokenization mirrors ingest
-    tokens = [t.lower() for t in query.split() if t.strip()]
-    scores = index.get_scores(tokens)
-    ranked = sorted(zip(corpus, scores), key=lambda x: x[1], reverse=True)[:k]
-    return [(doc_id, text) for (doc_id, text), _ in ranked]
+def top_k_many(queries: Sequence[str], k: int = 4, mode: str = "bm25",
+               candidates: Optional[int] = None) -> List[List[Tuple[str, str]]]:
+    """``top_k`` for each query; BM25 cache misses are scored together in one pass."""
+    variant = _variant(mode, candidates)
+    candidates = candidates or HYBRID_CANDIDATES
+    with _span("rag_top_k_many") as span:
+        started = time.perf_counter()
+        sharded = load_shards()
+        if sharded is not None:
+            return _top_k_sharded(sharded, queries, k, mode, span, started)
+        store, scorer = load_index()
+        loaded = time.perf_counter()
+        tokenized = [store.vocabulary.lookup(q) for q in queries]
+        done = time.perf_counter()
+        version = _results_version(store, load_dense(store) if mode != "bm25" else None)
+        results = [_cached(version, variant, tokens, k) for tokens in tokenized]
+        todo = [n for n, hits in enumerate(results) if hits is None]
+        if span is not None and span.is_recording():
+            span.set_attributes({"rag.k": k, "rag.mode": variant, "rag.queries": len(queries),
+                                 "rag.tokens": sum(len(tokens) for tokens in tokenized),
+                                 "rag.postings": sum(_postings(store.index, tokenized[n]) for n in todo),
+                                 "rag.index_version": version,
+                                 "rag.cache_misses": len(todo)})
+        if mode != "bm25":
+            ranked = [_rank(store, scorer, tokenized[n], k, mode, candidates) for n in todo]
+        else:
+            scoring = time.perf_counter()
+            ranked = scorer.top_k_many([tokenized[n] for n in todo], k)
+            if _observe is not None and todo:
+                _observe("batch_score", time.perf_counter() - scoring)
+        if _observe is not None:
+            _observe("index_load", loaded - started)
+            _observe("tokenize", done - loaded)
+        docs: Dict[int, Tuple[str, str]] = {}  # passages shared between queries are read once
+        for n, hits in zip(todo, ranked):
+            for i, _ in hits:
+                if i not in docs:
+                    docs[i] = store.doc(i)
+            results[n] = _ordered([(docs[i], score) for i, score in hits])
+            _remember(version, variant, tokenized[n], k, results[n])
+        return [list(hits) for hits in results]
 
 
 if __name__ == "__main__":
-    import sys
     q = " ".join(sys.argv[1:]) or "what is this project about?"
     hits = top_k(q, 4)
     for i, (doc_id, text) in enumerate(hits, 1):
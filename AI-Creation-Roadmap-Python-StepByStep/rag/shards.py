@@ -0,0 +1,347 @@
+"""Sharded BM25: one index file per shard, queried in parallel worker processes.
+
+``ingest.py --shards N`` puts every source file in shard ``shard_of(path, N)``,
+a stable hash of its path relative to DOCS_DIR, so all passages of a file
+live together and every run places a file the same way. Each shard is an
+ordinary index file (``rag.store``); a small shard set file,
+``bm25_shards.json``, lists the shard files of one build and their versions.
+
+BM25 needs corpus-wide statistics, so ``commit_shards`` sums the shards'
+document frequencies before writing them: every shard stores the global IDF
+of its terms and the global average document length (header ``avgdl``), and
+scores a document exactly as the single index over the whole corpus would.
+
+``ShardedIndex`` is the query side. Each shard gets its own worker process
+(started with ``spawn``), which maps the shard file and scores queries
+against it. A query is sent to every shard at once (scatter) and the best k
+of their top-k lists are kept (gather), so latency follows the largest shard
+rather than the whole corpus. Equal scores are ordered by passage name, as
+in ``rag.retrieve`` for a single file, so results don't depend on which
+shard a passage landed in; only when ties straddle the k-th place may a
+shard set keep other tied passages than the single index (each index cuts
+its own ties by document id). The worker returns the text
+of its hits along with them; the router never maps the shard files. It
+only reads their term lists once, into one ``Vocabulary`` over all shards,
+so queries are analyzed the way the single index does it and words no
+shard knows are dropped before they are sent.
+"""
+import glob
+import hashlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.analyzer import Analyzer, Vocabulary
+from rag.bm25 import NumpyScorer, compute_idf
+from rag.store import IndexWriter, MappedIndex, read_terms
+
+# shard files of a build, next to the shard set file: bm25_shard<i>.<build>.bin
+SHARD_GLOB = "bm25_shard*.bin"
+
+# (passage id within its shard, score, (name, text)), best first
+Hit = Tuple[int, float, Tuple[str, str]]
+
+
+def shard_of(key: str, n: int) -> int:
+    """Shard of a source file; ``key`` is its path relative to DOCS_DIR."""
+    if n == 1:
+        return 0
+    # not hash(): that is salted per process
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n
+
+
+def shard_path(set_path: str, shard: int, build: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(set_path)), f"bm25_shard{shard}.{build}.bin")
+
+
+def new_build() -> str:
+    """Id that keeps the shard files of a new build apart from those being served."""
+    return uuid.uuid4().hex[:8]
+
+
+def commit_shards(writers: Sequence[IndexWriter], set_path: str) -> str:
+    """Commit ``writers`` as the shards of one corpus and point ``set_path`` at them.
+
+    Returns the version of the shard set. Shard files of earlier builds are
+    removed once the new set is in place.
+    """
+    df: Dict[str, int] = {}
+    for writer in writers:
+        for term, n in writer.doc_freqs().items():
+            df[term] = df.get(term, 0) + n
+    n_docs = sum(writer.n_docs for writer in writers)
+    avgdl = sum(writer.n_tokens for writer in writers) / n_docs if n_docs else 0.0
+    idf = dict(zip(df, compute_idf(list(df.values()), n_docs, writers[0].epsilon).tolist()))
+    shards = []
+    for i, writer in enumerate(writers):
+        version = writer.commit(np.array([idf[term] for term in writer.vocab], dtype=np.float64),
+                                avgdl, (i, len(writers)))
+        shards.append({"path": os.path.basename(writer.path), "version": version,
+                       "n_docs": writer.n_docs, "bytes": os.path.getsize(writer.path)})
+    header = {"version": hashlib.sha256("\n".join(s["version"] for s in shards).encode()).hexdigest(),
+              "n_docs": n_docs, "avgdl": avgdl, "analyzer": writers[0].analyzer.config,
+              "shards": shards}
+    tmp_path = f"{set_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(header, fh, indent=1)
+    os.replace(tmp_path, set_path)
+    _remove_shard_files(set_path, keep={s["path"] for s in shards})
+    return header["version"]
+
+
+def remove_shards(set_path: str) -> None:
+    """Remove the shard set and its shard files (the index went back to a single file)."""
+    if os.path.exists(set_path):
+        os.remove(set_path)
+        _remove_shard_files(set_path, keep=set())
+
+
+def _remove_shard_files(set_path: str, keep: set) -> None:
+    for path in glob.glob(os.path.join(os.path.dirname(os.path.abspath(set_path)), SHARD_GLOB)):
+        if os.path.basename(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still mapped by a running worker (Windows); removed next time
+
+
+def read_shard_set(set_path: str) -> Dict[str, Any]:
+    try:
+        with open(set_path, "r", encoding="utf-8") as fh:
+            header = json.load(fh)
+        if not header["shards"] or not all(s["path"] and s["version"] for s in header["shards"]):
+            raise ValueError("no shards")
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{set_path} is not a shard set (re-run scripts/ingest.py): {e}") from None
+    return header
+
+
+def shard_files(set_path: str, header: Dict[str, Any]) -> List[str]:
+    directory = os.path.dirname(os.path.abspath(set_path))
+    return [os.path.join(directory, s["path"]) for s in header["shards"]]
+
+
+# --- worker process side: each process serves the one shard it was started for
+
+def _open(path: str, version: str, backend: str) -> Tuple[MappedIndex, Any]:
+    store = MappedIndex(path)
+    if store.version != version:
+        raise ValueError(f"{os.path.basename(path)} was replaced after the shard set was "
+                         "written. Re-run scripts/ingest.py.")
+    return store, NumpyScorer(store.index) if backend == "numpy" else store.index
+
+
+def _search(store: MappedIndex, scorer, queries: List[List[str]], k: int) -> List[List[Hit]]:
+    ranked = [scorer.top_k(queries[0], k)] if len(queries) == 1 else scorer.top_k_many(queries, k)
+    docs: Dict[int, Tuple[str, str]] = {}  # passages shared between queries are read once
+    results = []
+    for hits in ranked:
+        for i, _ in hits:
+            if i not in docs:
+                docs[i] = store.doc(i)
+        results.append([(i, score, docs[i]) for i, score in hits])
+    return results
+
+
+def _warm(store: MappedIndex, scorer, k: int, deep: bool) -> Dict[str, Any]:
+    """Validate and pre-fault the shard, then run a query on its most frequent terms."""
+    started = time.perf_counter()
+    store.validate(deep)
+    store.prefetch()
+    validated = time.perf_counter()
+    if store.terms:
+        doc_freqs = np.diff(store.index.offsets)
+        tokens = [store.terms[i] for i in np.argsort(doc_freqs, kind="stable")[-8:].tolist()]
+        _search(store, scorer, [tokens], k)
+        scorer.top_k_many([tokens, tokens[:1]], k)
+    return {"version": store.version, "documents": len(store), "bytes": store.stat.st_size,
+            "validate_s": round(validated - started, 6),
+            "query_s": round(time.perf_counter() - validated, 6)}
+
+
+_OPS = {"search": _search, "warm": _warm}
+
+
+def _serve(conn, path: str, version: str, backend: str) -> None:
+    """Worker main loop: answer ``(op, args)`` requests until the router closes the pipe.
+
+    Each reply is ``(ok, value, seconds)``; errors are sent back, not raised.
+    """
+    shard = None
+    while True:
+        try:
+            op, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        started = time.perf_counter()
+        try:
+            if shard is None:  # mapped on the first request, so open errors reach the caller
+                shard = _open(path, version, backend)
+            reply = (True, _OPS[op](*shard, *args))
+        except Exception as e:
+            reply = (False, e)
+        conn.send(reply + (time.perf_counter() - started,))
+
+
+# --- router side
+
+class ShardWorkerError(RuntimeError):
+    """A shard worker process exited mid-request (it is restarted for the next one)."""
+
+
+class _Worker:
+    """One shard's worker process and the pipe to it; ``lock`` is held per request."""
+
+    def __init__(self, context, path: str, version: str, backend: str):
+        self._context = context
+        self._args = (path, version, backend)
+        self.lock = threading.Lock()
+        self._start()
+
+    def _start(self) -> None:
+        self.conn, child = self._context.Pipe()
+        self.process = self._context.Process(target=_serve, args=(child,) + self._args, daemon=True,
+                                             name=f"rag-{os.path.basename(self._args[0])}")
+        self.process.start()
+        child.close()
+
+    def _restart(self) -> None:
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+        self._start()
+
+    def send(self, message) -> None:
+        try:
+            self.conn.send(message)
+        except OSError:
+            self._restart()
+            raise ShardWorkerError(f"worker for {os.path.basename(self._args[0])} exited") from None
+
+    def recv(self):
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self._restart()
+            raise ShardWorkerError(f"worker for {os.path.basename(self._args[0])} exited") from None
+
+    def close(self) -> None:
+        with self.lock:  # after the request in flight, if any
+            self.conn.close()  # the worker sees EOF and returns
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class ShardedIndex:
+    """Scatter-gather over the shards of a shard set, one worker process per shard."""
+
+    def __init__(self, set_path: str, backend: str = "postings"):
+        self.header = read_shard_set(set_path)
+        self.version: str = self.header["version"]
+        self.analyzer = Analyzer.from_config(self.header.get("analyzer"))
+        self.paths = shard_files(set_path, self.header)
+        terms = list(dict.fromkeys(itertools.chain.from_iterable(map(read_terms, self.paths))))
+        self.vocabulary = Vocabulary(terms, {t: i for i, t in enumerate(terms)}, self.analyzer)
+        context = multiprocessing.get_context("spawn")  # workers don't inherit our threads
+        self._workers = [_Worker(context, path, s["version"], backend)
+                         for path, s in zip(self.paths, self.header["shards"])]
+        self._lock = threading.Lock()
+        # [count, total seconds, max seconds] of each shard's work, and of whole gathers
+        self._times = [[0, 0.0, 0.0] for _ in self.paths]
+        self._gather = [0, 0.0, 0.0]
+
+    def __len__(self) -> int:
+        return self.header["n_docs"]
+
+    @property
+    def bytes(self) -> int:
+        return sum(s["bytes"] for s in self.header["shards"])
+
+    def _call(self, op: str, *args) -> Tuple[List[Any], List[float]]:
+        """Run ``op`` on every shard at once: (replies, seconds in each worker), in shard order.
+
+        Shards are locked in order and each is released as soon as it replied,
+        so a concurrent call starts on the first shards while this one waits
+        for the last.
+        """
+        sent: List[_Worker] = []
+        replies = []
+        error: Optional[BaseException] = None
+        for worker in self._workers:
+            worker.lock.acquire()
+            try:
+                worker.send((op, args))
+            except ShardWorkerError as e:
+                worker.lock.release()
+                error = e
+                break
+            sent.append(worker)
+        for worker in sent:
+            try:
+                replies.append(worker.recv())
+            except ShardWorkerError as e:
+                error = error or e
+            finally:
+                worker.lock.release()
+        if error is not None:
+            raise error
+        for ok, value, _ in replies:
+            if not ok:
+                raise value
+        return [value for _, value, _ in replies], [seconds for _, _, seconds in replies]
+
+    def scatter(self, queries: List[List[str]], k: int) -> List[List[List[Hit]]]:
+        """Each shard's top ``k`` for every query (indexed [shard][query])."""
+        started = time.perf_counter()
+        replies, seconds = self._call("search", queries, k)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            for times, value in zip(self._times + [self._gather], seconds + [elapsed]):
+                times[0] += 1
+                times[1] += value
+                times[2] = max(times[2], value)
+        return replies
+
+    @staticmethod
+    def merge(ranked: Sequence[List[Hit]], k: int) -> List[Tuple[Tuple[str, str], float]]:
+        """Best ``k`` (passage, score) over the shards' lists, equal scores by passage name."""
+        best = heapq.nsmallest(k, itertools.chain.from_iterable(ranked),
+                               key=lambda hit: (-hit[1], hit[2][0]))
+        return [(doc, score) for _, score, doc in best]
+
+    def top_k_many(self, queries: List[List[str]], k: int) -> List[List[Tuple[Tuple[str, str], float]]]:
+        replies = self.scatter(queries, k)
+        return [self.merge([shard[n] for shard in replies], k) for n in range(len(queries))]
+
+    def warm(self, k: int = 4, deep: bool = False) -> Dict[str, Any]:
+        """Open, validate and exercise every shard in its worker (all shards at once)."""
+        replies, seconds = self._call("warm", k, deep)
+        for info, total in zip(replies, seconds):
+            info["load_s"] = round(total - info["validate_s"] - info["query_s"], 6)
+        return {"version": self.version, "documents": len(self), "bytes": self.bytes,
+                "shards": replies}
+
+    def stats(self) -> Dict[str, Any]:
+        """Time each shard spent on queries, and the wall time of whole scatter-gathers."""
+        def summary(count, total, peak):
+            return {"count": count, "total_s": round(total, 6), "max_s": round(peak, 6),
+                    "avg_s": round(total / count, 6) if count else 0.0}
+        with self._lock:
+            return {"shards": [dict(summary(*times), documents=s["n_docs"])
+                               for times, s in zip(self._times, self.header["shards"])],
+                    "gather": summary(*self._gather)}
+
+    def close(self) -> None:
+        """Stop the worker processes once their requests in flight are answered."""
+        for worker in self._workers:
+            worker.close()
@@ -0,0 +1,492 @@
+"""Columnar on-disk index format, opened with mmap.
+
+One file holds every section of the index so ``ingest.py`` can still swap it
+in with a single ``os.replace``::
+
+    b"BM25IDX1" | uint64 header length | JSON header | aligned sections...
+
+The JSON header lists each section as ``[offset, dtype, count]`` plus the BM25
+parameters, the analyzer settings (``rag.analyzer``) and a content hash. Shards
+of a sharded index (``rag.shards``) also record ``shard`` (``[i, n]``) and
+``avgdl``, the corpus-wide average document length; their ``idf`` section
+holds corpus-wide IDF. Sections:
+
+- ``terms``        newline-joined term dictionary (term id = line number), frozen:
+  queries are mapped onto it and never extend it
+- ``idf``          float64 IDF per term id
+- ``offsets``      int64 CSR offsets into the postings, ``len(terms) + 1``
+- ``post_offsets`` int64 byte offset of each term's doc ids in ``post_docs``
+- ``post_docs``    uint8 doc id gaps per posting, varint-encoded (``rag.postings``)
+- ``post_tfs``     uint8 quantized term frequency code per posting
+- ``doc_len``      int32 token count per document
+- ``name_offsets`` int64 offsets of each document name in ``names``
+- ``names``        UTF-8 document names (source paths)
+- ``text_offsets`` int64 offsets of each document body in ``text``
+- ``text``         UTF-8 document bodies
+- ``span_starts``, ``span_ends``  int64 character span of each document
+  (passage) within its source file's text
+- ``fwd_offsets``, ``fwd_terms``, ``fwd_tfs``  forward index: each
+  document's ``(term id, tf)`` pairs in first-occurrence order, which lets
+  ``ingest.py`` merge unchanged documents without re-tokenizing them
+
+Numeric sections are zero-copy views over the mapping, so every worker that
+opens the same file shares its pages through the OS cache. Document text is
+only decoded for the hits that are returned. Files written before postings
+were compressed (int32 ``post_docs``/``post_tfs``, no ``post_offsets``) are
+still read; ``ingest.py --compact`` rewrites them in the current layout.
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import uuid
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.analyzer import Analyzer, Vocabulary
+from rag.bm25 import B, EPSILON, K1, InvertedIndex, compute_idf
+from rag.postings import PackedPostings, encode_docs, encode_tfs
+
+MAGIC = b"BM25IDX1"
+_ALIGN = 64
+_LEN = struct.Struct("<Q")
+
+
+# postings buffered in memory before a sorted run is spilled to disk
+RUN_SIZE = 1_000_000
+# postings encoded per step when compressing the merged runs
+ENCODE_SIZE = 4_000_000
+_CHUNK = 1 << 20
+
+# (section, dtype) in file order; "bytes" sections are raw UTF-8
+_LAYOUT = [
+    ("terms", "bytes"),
+    ("idf", "<f8"),
+    ("offsets", "<i8"),
+    ("post_offsets", "<i8"),
+    ("post_docs", "u1"),
+    ("post_tfs", "u1"),
+    ("doc_len", "<i4"),
+    ("name_offsets", "<i8"),
+    ("names", "bytes"),
+    ("text_offsets", "<i8"),
+    ("text", "bytes"),
+    ("span_starts", "<i8"),
+    ("span_ends", "<i8"),
+    ("fwd_offsets", "<i8"),
+    ("fwd_terms", "<i4"),
+    ("fwd_tfs", "<i4"),
+]
+# sections appended to temp files while documents stream in
+_STREAMED = ("doc_len", "name_offsets", "names", "text_offsets", "text",
+             "span_starts", "span_ends", "fwd_offsets", "fwd_terms", "fwd_tfs")
+
+
+class IndexWriter:
+    """Builds an index file from a stream of documents in bounded memory.
+
+    Names, text, lengths and the forward index are appended to temp files as
+    documents arrive. Postings are buffered as (term id, doc id, tf) and
+    spilled as term-sorted runs every ``run_size`` postings; ``commit`` merges
+    the runs into temp postings arrays and compresses those, a slice of terms
+    at a time, into the postings sections. Only the vocabulary and per-term
+    document frequencies are kept in memory.
+
+    Use as a context manager: leaving the block without ``commit`` discards
+    everything, and the target file is only replaced (atomically) by ``commit``.
+    """
+
+    def __init__(self, path: str, k1: float = K1, b: float = B, epsilon: float = EPSILON,
+                 run_size: int = RUN_SIZE, analyzer: Optional[Analyzer] = None):
+        self.path = path
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        # how the added terms were produced; queries are analyzed the same way
+        self.analyzer = analyzer or Analyzer()
+        self.run_size = run_size
+        self.vocab: Dict[str, int] = {}
+        self.n_docs = 0
+        self.n_tokens = 0
+        self._df: List[int] = []
+        self._tmpdir = tempfile.mkdtemp(prefix=".ingest-",
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        self._files = {name: open(os.path.join(self._tmpdir, name), "w+b")
+                       for name in _STREAMED + ("post_docs", "post_tfs")}
+        self._runs: List[Tuple[str, int]] = []
+        self._terms, self._docs, self._tfs = array("i"), array("i"), array("i")
+        # per-document values, flushed to their temp files with each run
+        self._nums = {name: array("q") for name in
+                      ("doc_len", "name_offsets", "text_offsets", "span_starts", "span_ends",
+                       "fwd_offsets")}
+        for name in ("name_offsets", "text_offsets", "fwd_offsets"):
+            self._nums[name].append(0)
+        self._ends = {"names": 0, "text": 0, "fwd": 0}
+
+    def __enter__(self) -> "IndexWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for fh in self._files.values():
+            fh.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def add(self, name: str, text: str, terms: Sequence[Tuple[str, int]],
+            span: Optional[Tuple[int, int]] = None) -> int:
+        """Append a document given its ``(term, tf)`` pairs in first-occurrence order.
+
+        ``span`` locates the passage in its source text (default: the whole text).
+        """
+        doc_id = self.n_docs
+        self.n_docs += 1
+        vocab, df = self.vocab, self._df
+        n_tokens = 0
+        for term, tf in terms:
+            tid = vocab.setdefault(term, len(vocab))
+            if tid == len(df):
+                df.append(0)
+            df[tid] += 1
+            self._terms.append(tid)
+            self._docs.append(doc_id)
+            self._tfs.append(tf)
+            n_tokens += tf
+        self._nums["doc_len"].append(n_tokens)
+        self.n_tokens += n_tokens
+        start, end = span if span is not None else (0, len(text))
+        self._nums["span_starts"].append(start)
+        self._nums["span_ends"].append(end)
+        self._ends["fwd"] += len(terms)
+        self._nums["fwd_offsets"].append(self._ends["fwd"])
+        for section, value in (("names", name), ("text", text)):
+            raw = value.encode("utf-8")
+            self._files[section].write(raw)
+            self._ends[section] += len(raw)
+        self._nums["name_offsets"].append(self._ends["names"])
+        self._nums["text_offsets"].append(self._ends["text"])
+        if len(self._terms) >= self.run_size:
+            self._spill()
+        return doc_id
+
+    def doc_freqs(self) -> Dict[str, int]:
+        """Number of added documents containing each term."""
+        return dict(zip(self.vocab, self._df))
+
+    def _spill(self) -> None:
+        for name, values in self._nums.items():
+            np.asarray(values, dtype=np.int64).astype(dict(_LAYOUT)[name]).tofile(self._files[name])
+            del values[:]
+        if not self._terms:
+            return
+        terms = np.asarray(self._terms, dtype="<i4")
+        docs = np.asarray(self._docs, dtype="<i4")
+        tfs = np.asarray(self._tfs, dtype="<i4")
+        # unsorted, the buffer is exactly the forward index of these documents
+        terms.tofile(self._files["fwd_terms"])
+        tfs.tofile(self._files["fwd_tfs"])
+        # stable sort keeps doc ids ascending within each term
+        order = np.argsort(terms, kind="stable")
+        run_path = os.path.join(self._tmpdir, f"run{len(self._runs)}")
+        with open(run_path, "wb") as fh:
+            for column in (terms, docs, tfs):
+                column[order].tofile(fh)
+        self._runs.append((run_path, len(terms)))
+        self._terms, self._docs, self._tfs = array("i"), array("i"), array("i")
+
+    def commit(self, idf: Optional[np.ndarray] = None, avgdl: Optional[float] = None,
+               shard: Optional[Tuple[int, int]] = None) -> str:
+        """Write the index file, replace ``path`` with it and return its content hash.
+
+        ``idf`` (per term id) and ``avgdl`` replace the statistics of the added
+        documents when they are shard ``shard`` of a larger corpus.
+        """
+        self._spill()
+        n_terms = len(self.vocab)
+        df = np.asarray(self._df, dtype=np.int64)
+        offsets = np.zeros(n_terms + 1, dtype="<i8")
+        np.cumsum(df, out=offsets[1:])
+        total = int(offsets[-1])
+        post_offsets = self._merge_runs(offsets)
+        for fh in self._files.values():
+            fh.flush()
+        in_memory = {
+            # analyzer splits on whitespace at least, so a newline never appears inside a term
+            "terms": "\n".join(self.vocab).encode("utf-8"),
+            "idf": (compute_idf(df.tolist(), self.n_docs, self.epsilon) if idf is None
+                    else np.asarray(idf, dtype=np.float64)).astype("<f8"),
+            "offsets": offsets,
+            "post_offsets": post_offsets,
+        }
+        counts = {"post_docs": int(post_offsets[-1]), "post_tfs": total, "doc_len": self.n_docs,
+                  "name_offsets": self.n_docs + 1, "names": self._ends["names"],
+                  "text_offsets": self.n_docs + 1, "text": self._ends["text"],
+                  "span_starts": self.n_docs, "span_ends": self.n_docs,
+                  "fwd_offsets": self.n_docs + 1, "fwd_terms": total, "fwd_tfs": total}
+        counts.update((name, len(value)) for name, value in in_memory.items())
+
+        # offsets depend on the header size, so size the header with placeholder
+        # offsets and version first (both are fixed width)
+        header = {"version": "0" * 64, "k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+                  "n_docs": self.n_docs, "analyzer": self.analyzer.config, "sections": {}}
+        if shard is not None:
+            header["shard"] = list(shard)
+        if avgdl is not None:
+            header["avgdl"] = avgdl
+        for name, dtype in _LAYOUT:
+            header["sections"][name] = [10 ** 15, dtype, counts[name]]
+        start = _align(len(MAGIC) + _LEN.size + len(json.dumps(header).encode()))
+        pos = start
+        for name, dtype in _LAYOUT:
+            header["sections"][name] = [pos, dtype, counts[name]]
+            pos = _align(pos + _nbytes(dtype, counts[name]))
+
+        # write to a temp file and rename so running API workers never see a partial index
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w+b") as out:
+                out.write(_header_bytes(header, start))
+                for name, _ in _LAYOUT:
+                    out.seek(header["sections"][name][0])
+                    if name in in_memory:
+                        out.write(in_memory[name].tobytes() if isinstance(in_memory[name], np.ndarray)
+                                  else in_memory[name])
+                    elif name in self._files:
+                        self._files[name].seek(0)
+                        shutil.copyfileobj(self._files[name], out, _CHUNK)
+                out.truncate(pos)
+            header["version"] = _section_digest(tmp_path, header)
+            with open(tmp_path, "r+b") as out:
+                out.write(_header_bytes(header, start))
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return header["version"]
+
+    def _merge_runs(self, offsets: np.ndarray) -> np.ndarray:
+        """Scatter the term-sorted runs into CSR order, then compress them into the
+        ``post_docs``/``post_tfs`` temp files; returns the byte offset of each term."""
+        total = int(offsets[-1])
+        post_offsets = np.zeros(len(offsets), dtype="<i8")
+        if not total:
+            return post_offsets
+        post_docs, post_tfs = (
+            np.memmap(os.path.join(self._tmpdir, f"{name}.raw"), dtype="<i4", mode="w+", shape=(total,))
+            for name in ("post_docs", "post_tfs"))
+        # next free slot of every term; runs cover ascending doc ranges, so
+        # appending run after run keeps each postings list sorted by doc id
+        cursor = offsets[:-1].copy()
+        for run_path, n in self._runs:
+            terms, docs, tfs = np.fromfile(run_path, dtype="<i4").reshape(3, n)
+            counts = np.bincount(terms, minlength=len(cursor))
+            group_start = np.cumsum(counts) - counts
+            slots = cursor[terms] + (np.arange(n) - group_start[terms])
+            post_docs[slots] = docs
+            post_tfs[slots] = tfs
+            cursor += counts
+        # gaps restart with every term, so whole terms can be encoded independently
+        lo_term = 0
+        while lo_term < len(offsets) - 1:
+            hi_term = max(lo_term + 1, int(np.searchsorted(offsets, offsets[lo_term] + ENCODE_SIZE,
+                                                           side="right")) - 1)
+            lo, hi = int(offsets[lo_term]), int(offsets[hi_term])
+            doc_bytes, term_bytes = encode_docs(post_docs[lo:hi], offsets[lo_term:hi_term + 1] - lo)
+            post_offsets[lo_term + 1:hi_term + 1] = post_offsets[lo_term] + term_bytes[1:]
+            doc_bytes.tofile(self._files["post_docs"])
+            encode_tfs(post_tfs[lo:hi]).tofile(self._files["post_tfs"])
+            lo_term = hi_term
+        del post_docs, post_tfs
+        return post_offsets
+
+
+def _nbytes(dtype: str, count: int) -> int:
+    return count if dtype == "bytes" else count * np.dtype(dtype).itemsize
+
+
+def _header_bytes(header: dict, start: int) -> bytes:
+    head = json.dumps(header).encode()
+    head += b" " * (start - len(MAGIC) - _LEN.size - len(head))
+    return MAGIC + _LEN.pack(len(head)) + head
+
+
+def _header_digest(header: dict):
+    """sha256 of the header fields that change results without changing a section."""
+    digest = hashlib.sha256()
+    if "analyzer" in header:
+        # same terms and postings analyzed differently still answer queries differently
+        digest.update(json.dumps(header["analyzer"], sort_keys=True).encode())
+    if "avgdl" in header:
+        digest.update(repr(float(header["avgdl"])).encode())
+    return digest
+
+
+def _buffer_digest(buf, header: dict) -> str:
+    """Version hash of an index held in ``buf`` (bytes-like): header fields, then every section.
+
+    The one definition of the version: writers hash their temp file with it and
+    ``validate(deep=True)`` re-hashes the mapping, so the two cannot drift apart.
+    """
+    digest = _header_digest(header)
+    view = memoryview(buf)
+    try:
+        for name, (offset, dtype, count) in header["sections"].items():
+            n = _nbytes(dtype, count)
+            digest.update(name.encode() + _LEN.pack(n))
+            digest.update(view[offset:offset + n])
+    finally:
+        view.release()
+    return digest.hexdigest()
+
+
+def _section_digest(path: str, header: dict) -> str:
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _buffer_digest(mm, header)
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a BM25 index (re-run scripts/ingest.py)")
+        (size,) = _LEN.unpack(fh.read(_LEN.size))
+        return json.loads(fh.read(size))
+
+
+def read_terms(path: str) -> List[str]:
+    """The term dictionary of an index file, read without mapping the file."""
+    header = read_header(path)
+    offset, _, count = header["sections"]["terms"]
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        terms = fh.read(count).decode("utf-8")
+    return terms.split("\n") if terms else []
+
+
+class MappedIndex:
+    """Read-only view of an index file: BM25 postings plus the document store."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            # the mapping stays valid after ingest replaces (unlinks) the file
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(fh.fileno())
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a BM25 index (re-run scripts/ingest.py)")
+        (size,) = _LEN.unpack_from(self._mm, len(MAGIC))
+        start = len(MAGIC) + _LEN.size
+        self.header = json.loads(self._mm[start:start + size])
+        self.version: str = self.header["version"]
+        self._sections = self.header["sections"]
+
+        arrays = {name: self._array(name) for name in
+                  ("idf", "offsets", "post_docs", "post_tfs", "doc_len",
+                   "name_offsets", "text_offsets")}
+        self._name_offsets = arrays.pop("name_offsets")
+        self._text_offsets = arrays.pop("text_offsets")
+        if self.packed:
+            arrays["packed"] = PackedPostings(arrays["offsets"], arrays.pop("post_docs"),
+                                              self._array("post_offsets"), arrays.pop("post_tfs"))
+            arrays["post_docs"] = arrays["post_tfs"] = None
+        terms = self._bytes("terms").decode("utf-8")
+        self.terms: List[str] = terms.split("\n") if terms else []
+        vocab: Dict[str, int] = {t: i for i, t in enumerate(self.terms)}
+        self.index = InvertedIndex(vocab, k1=self.header["k1"], b=self.header["b"],
+                                   epsilon=self.header["epsilon"], avgdl=self.header.get("avgdl"),
+                                   **arrays)
+        self.analyzer = Analyzer.from_config(self.header.get("analyzer"))
+        self.vocabulary = Vocabulary(self.terms, vocab, self.analyzer)
+
+    def validate(self, deep: bool = False) -> None:
+        """Raise ``ValueError`` if the sections are inconsistent (``deep``: also re-hash the content)."""
+        size = self.stat.st_size
+        for name, (offset, dtype, count) in self._sections.items():
+            if offset + _nbytes(dtype, count) > size:
+                raise ValueError(f"index section {name!r} runs past the end of the file")
+        index = self.index
+        n_terms, n_docs = len(self.terms), index.corpus_size
+        if len(index.offsets) != n_terms + 1 or len(index.idf) != n_terms:
+            raise ValueError("index term arrays disagree with the vocabulary")
+        if self.packed:
+            packed = index.packed
+            byte_offsets = packed.byte_offsets
+            if len(byte_offsets) != n_terms + 1 or (n_terms and (
+                    byte_offsets[0] != 0 or byte_offsets[-1] != len(packed.doc_bytes)
+                    or index.offsets[-1] != len(packed.tf_codes) or (np.diff(byte_offsets) < 0).any())):
+                raise ValueError("index postings byte offsets are inconsistent")
+            # decoded once here, not kept: queries decode the lists they touch
+            post_docs, post_tfs = packed.decode()
+        else:
+            post_docs, post_tfs = index.post_docs, index.post_tfs
+        n_postings = len(post_docs)
+        if (n_terms and (index.offsets[0] != 0 or index.offsets[-1] != n_postings)) \
+                or len(post_tfs) != n_postings:
+            raise ValueError("index postings offsets are inconsistent")
+        if len(self._name_offsets) != n_docs + 1 or len(self._text_offsets) != n_docs + 1:
+            raise ValueError("index document store disagrees with the postings")
+        if n_postings and not 0 <= int(post_docs.min()) <= int(post_docs.max()) < n_docs:
+            raise ValueError("index postings reference unknown documents")
+        if deep:
+            # over the mapping, not the path: the file may have been replaced by now
+            if _buffer_digest(self._mm, self.header) != self.version:
+                raise ValueError("index content does not match its version hash")
+
+    @property
+    def packed(self) -> bool:
+        """Whether postings are compressed (files from before that store int32 arrays)."""
+        return "post_offsets" in self._sections
+
+    @property
+    def postings_bytes(self) -> int:
+        """On-disk size of the postings sections (doc ids, tfs and their offsets)."""
+        return sum(_nbytes(dtype, count) for name, (_, dtype, count) in self._sections.items()
+                   if name in ("offsets", "post_offsets", "post_docs", "post_tfs"))
+
+    def prefetch(self) -> None:
+        """Ask the OS to read the whole file into the page cache ahead of the first queries."""
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self._mm.madvise(mmap.MADV_WILLNEED)
+
+    def _array(self, name: str) -> np.ndarray:
+        offset, dtype, count = self._sections[name]
+        return np.frombuffer(self._mm, dtype=np.dtype(dtype), count=count, offset=offset)
+
+    def _bytes(self, name: str, lo: int = 0, hi: Optional[int] = None) -> bytes:
+        offset, _, count = self._sections[name]
+        hi = count if hi is None else hi
+        return self._mm[offset + lo:offset + hi]
+
+    def __len__(self) -> int:
+        return self.index.corpus_size
+
+    def name(self, doc_id: int) -> str:
+        lo, hi = self._name_offsets[doc_id:doc_id + 2].tolist()
+        return self._bytes("names", lo, hi).decode("utf-8")
+
+    def text(self, doc_id: int) -> str:
+        lo, hi = self._text_offsets[doc_id:doc_id + 2].tolist()
+        return self._bytes("text", lo, hi).decode("utf-8")
+
+    def doc(self, doc_id: int) -> Tuple[str, str]:
+        return self.name(doc_id), self.text(doc_id)
+
+    def span(self, doc_id: int) -> Tuple[int, int]:
+        """Character span of the passage within its source file's text."""
+        return int(self._array("span_starts")[doc_id]), int(self._array("span_ends")[doc_id])
+
+    @property
+    def has_forward(self) -> bool:
+        return "fwd_offsets" in self._sections
+
+    def doc_terms(self, doc_id: int) -> List[Tuple[str, int]]:
+        """``(term, tf)`` pairs of a document in first-occurrence order."""
+        if not self.has_forward:
+            raise ValueError("index was written without a forward index")
+        lo, hi = self._array("fwd_offsets")[doc_id:doc_id + 2].tolist()
+        terms = self.terms
+        return [(terms[t], tf) for t, tf in zip(self._array("fwd_terms")[lo:hi].tolist(),
+                                                self._array("fwd_tfs")[lo:hi].tolist())]
@@ -0,0 +1,72 @@
+"""Benchmark the text analyzer: ingest and query throughput in MB/s.
+
+Runs every analyzer configuration over the files under DOCS_DIR (as ingest
+does, one text at a time) and reports throughput and the resulting
+vocabulary size. Query-time analysis (``Vocabulary.ids`` against the frozen
+vocabulary of that configuration) is measured on short queries drawn from
+the same text.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from rag.analyzer import Analyzer, Vocabulary, light_stem  # noqa: E402
+from scripts.ingest import iter_docs  # noqa: E402
+
+CONFIGS = [("whitespace (old)", {"split": "whitespace", "stopwords": False, "stem": "none"}),
+           ("word", {"split": "word", "stopwords": False, "stem": "none"}),
+           ("word+stem", {"split": "word", "stopwords": False, "stem": "light"}),
+           ("word+stop+stem", {"split": "word", "stopwords": True, "stem": "light"})]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3, help="best of N passes")
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    texts = [text for _, text in iter_docs()]
+    if not texts:
+        parser.error("no documents: put .md or .txt files under DOCS_DIR")
+    mb = sum(len(text.encode("utf-8")) for text in texts) / 1e6
+    rng = random.Random(args.seed)
+    words = [w for text in texts for w in text.split()]
+    queries = [" ".join(rng.sample(words, min(len(words), rng.randint(3, 10))))
+               for _ in range(args.queries)]
+    query_mb = sum(len(q.encode("utf-8")) for q in queries) / 1e6
+    print(f"{len(texts)} texts, {mb:.1f} MB; {len(queries)} queries, {query_mb:.2f} MB")
+
+    for name, config in CONFIGS:
+        analyzer = Analyzer(**config)
+        best = float("inf")
+        for _ in range(args.rounds):
+            light_stem.cache_clear()  # each pass starts cold, like a fresh ingest worker
+            started = time.perf_counter()
+            vocab: Counter = Counter()
+            for text in texts:
+                vocab.update(analyzer.terms(text))
+            best = min(best, time.perf_counter() - started)
+        terms = list(vocab)
+        vocabulary = Vocabulary(terms, {t: i for i, t in enumerate(terms)}, analyzer)
+        query_best = float("inf")
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            for q in queries:
+                vocabulary.ids(q)
+            query_best = min(query_best, time.perf_counter() - started)
+        print(f"{name:<17} ingest {mb / best:7.1f} MB/s   vocabulary {len(terms):8d} terms   "
+              f"query {query_mb / query_best:6.1f} MB/s "
+              f"({query_best / len(queries) * 1e6:5.2f} µs/query)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark the dense ANN index: recall@k against exact search, and latency.
+
+Queries are drawn from the indexed passages themselves (a few of their
+terms), encoded once, then searched exactly (every vector) and through the
+IVF lists at several ``nprobe`` values. Recall@k is the share of the exact
+top ``k`` that the approximate search also returns.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from rag.dense import DenseIndex  # noqa: E402
+from rag.retrieve import ARTEFACT, DENSE_ARTEFACT  # noqa: E402
+from rag.store import MappedIndex  # noqa: E402
+
+
+def timed(fn, vectors, *args):
+    """Results of ``fn(vec, *args)`` for every vector and the per-query latencies (ms)."""
+    results, latencies = [], []
+    for vec in vectors:
+        t = time.perf_counter()
+        results.append(fn(vec, *args))
+        latencies.append((time.perf_counter() - t) * 1000)
+    return results, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500, help="sampled queries to run")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not os.path.exists(DENSE_ARTEFACT):
+        parser.error("no dense index: run scripts/ingest.py --dense first")
+
+    store = MappedIndex(ARTEFACT)
+    dense = DenseIndex(DENSE_ARTEFACT, store.index)
+    if dense.bm25_version != store.version:
+        parser.error("dense index is stale: run scripts/ingest.py --dense again")
+    rng = random.Random(args.seed)
+    vectors = []
+    while len(vectors) < args.queries:
+        tokens = store.vocabulary.lookup(store.doc(rng.randrange(len(store)))[1])
+        vec = dense.encode(rng.sample(tokens, min(len(tokens), rng.randint(2, 6))))
+        if vec is not None:
+            vectors.append(vec)
+
+    print(f"{len(dense)} vectors, dim {dense.components.shape[1]}, {len(dense.centroids)} lists; "
+          f"{len(vectors)} queries, k={args.k}")
+    exact, latencies = timed(dense.exact, vectors, args.k)
+    print(f"{'exact':<10} recall@{args.k} 1.000   p50 {statistics.median(latencies):7.3f} ms   "
+          f"max {max(latencies):7.3f} ms")
+    for nprobe in sorted(set(args.nprobe)):
+        approx, latencies = timed(dense.search, vectors, args.k, nprobe)
+        found = sum(len({d for d, _ in a} & {d for d, _ in e}) for a, e in zip(approx, exact))
+        recall = found / max(1, sum(len(e) for e in exact))
+        print(f"nprobe={nprobe:<3} recall@{args.k} {recall:.3f}   "
+              f"p50 {statistics.median(latencies):7.3f} ms   max {max(latencies):7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
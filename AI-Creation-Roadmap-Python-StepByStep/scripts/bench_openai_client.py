@@ -0,0 +1,156 @@
+"""Benchmark openai_chat against a local mock completions server.
+
+Compares the old pattern (a new httpx.AsyncClient per call) with the shared
+pooled client opened by the app lifespan, with the guarded call (adaptive
+limit, circuit breaker, retry budget) and with the upstream dispatcher,
+and prints p50/p99 latency, throughput and failures for each at the given
+concurrency. ``--limit`` makes the mock answer 429 above that many concurrent
+requests, like a rate-limited upstream.
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from typing import Awaitable, Callable, List, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+# ensure project root on sys.path for `app` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+
+def mock_app(delay: float, limit: int = 0) -> FastAPI:
+    mock = FastAPI()
+    in_flight = 0
+
+    @mock.post("/v1/chat/completions")
+    async def completions(body: dict):
+        nonlocal in_flight
+        if limit and in_flight >= limit:
+            return JSONResponse({"error": "rate limited"}, status_code=429)
+        in_flight += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            in_flight -= 1
+        return {"choices": [{"message": {"role": "assistant", "content": "ok"}}]}
+
+    return mock
+
+
+def _serve(port: int, delay: float, limit: int) -> None:
+    uvicorn.run(mock_app(delay, limit), host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def start_mock(delay: float, limit: int = 0) -> str:
+    """Serve the mock in its own process so it doesn't compete with the client for the GIL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    multiprocessing.Process(target=_serve, args=(port, delay, limit), daemon=True).start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def run(call: Callable[[], Awaitable[str]], total: int, concurrency: int) -> Tuple[List[float], int]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failed = 0
+
+    async def one():
+        nonlocal failed
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies, failed
+
+
+def report(name: str, latencies: List[float], failed: int, elapsed: float) -> None:
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2] * 1000
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+    ok = len(ordered) - failed
+    print(f"{name:<16} p50 {p50:8.1f} ms   p99 {p99:8.1f} ms   {ok / elapsed:8.0f} ok/s   "
+          f"{failed:5d} failed")
+
+
+async def bench(args) -> None:
+    from app import main
+    from app.dispatcher import Dispatcher
+
+    async def client_per_call() -> str:
+        # the pre-lifespan implementation of openai_chat
+        async with httpx.AsyncClient(timeout=30) as client:
+            r = await client.post(f"{main.OPENAI_API_BASE}/chat/completions", json={"messages": []},
+                                  headers={"Authorization": "Bearer bench"})
+            r.raise_for_status()
+            return r.json()["choices"][0]["message"]["content"]
+
+    async def shared_client() -> str:
+        return await main.openai_chat("system", "user")
+
+    async def guarded() -> str:
+        return await main.guarded_chat("system", "user")
+
+    async def dispatched() -> str:
+        return await dispatcher.submit("system", "user")
+
+    async with main.lifespan(main.app):
+        dispatcher = Dispatcher(main.guarded_chat, args.window / 1000,
+                                concurrency=args.limit or args.concurrency)
+        for name, call in (("client per call", client_per_call), ("shared client", shared_client),
+                           ("guarded", guarded), ("dispatcher", dispatched)):
+            await run(call, args.concurrency, args.concurrency)  # warm-up
+            start = time.perf_counter()
+            latencies, failed = await run(call, args.requests, args.concurrency)
+            report(name, latencies, failed, time.perf_counter() - start)
+        stats = dispatcher.stats()
+        await dispatcher.close()
+        print(f"dispatcher: avg batch {stats['avg_batch']}, peak upstream concurrency "
+              f"{stats['peak_in_flight']}, avg queue wait {stats['wait']['avg_s'] * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.02, help="mock completion latency (s)")
+    parser.add_argument("--limit", type=int, default=0,
+                        help="mock answers 429 above this many concurrent requests (0 = never)")
+    parser.add_argument("--window", type=float, default=5, help="dispatcher window (ms)")
+    args = parser.parse_args(argv)
+    # configure the app before it is imported
+    os.environ["OPENAI_API_BASE"] = start_mock(args.delay, args.limit)
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ.setdefault("OPENAI_MAX_CONNECTIONS", str(args.concurrency))
+    os.environ.setdefault("OPENAI_MAX_KEEPALIVE", str(args.concurrency))
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"mock latency {args.delay * 1000:.0f} ms, limit {args.limit or 'none'} "
+          f"(plain HTTP: no TLS handshake in 'before')")
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark the compressed postings: bytes per posting and decode throughput.
+
+Reports the on-disk postings size of the current index against the int32
+layout it replaced, the throughput of a full vectorized decode, the cost of
+decoding single terms as queries do, and postings-backend query latency on
+the compressed index versus the same postings held decoded in memory.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import numpy as np
+
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from rag.bm25 import InvertedIndex  # noqa: E402
+from rag.retrieve import ARTEFACT  # noqa: E402
+from rag.store import MappedIndex  # noqa: E402
+
+
+def best_of(rounds: int, fn) -> float:
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not os.path.exists(ARTEFACT):
+        parser.error("no index: run scripts/ingest.py first")
+    store = MappedIndex(ARTEFACT)
+    if not store.packed:
+        parser.error("index uses the uncompressed layout: run scripts/ingest.py --compact")
+    index, packed = store.index, store.index.packed
+    n_postings = int(index.offsets[-1])
+    # int32 doc ids + int32 tfs + int64 offsets per term, as before compression
+    raw_bytes = 8 * n_postings + index.offsets.nbytes
+    print(f"{len(store.terms)} terms, {n_postings} postings")
+    print(f"postings  {store.postings_bytes / n_postings:6.2f} bytes/posting "
+          f"({store.postings_bytes} bytes; int32 layout {raw_bytes / n_postings:.2f}, "
+          f"{raw_bytes / store.postings_bytes:.1f}x larger)")
+    print(f"  doc ids {packed.doc_bytes.nbytes / n_postings:6.2f} bytes/posting, tfs "
+          f"{packed.tf_codes.nbytes / n_postings:.2f}")
+
+    seconds = best_of(args.rounds, packed.decode)
+    print(f"full decode  {n_postings / seconds / 1e6:7.1f} M postings/s "
+          f"({packed.doc_bytes.nbytes / seconds / 1e6:.0f} MB/s of doc ids)")
+
+    rng = random.Random(args.seed)
+    # query terms sampled by document frequency, like the terms of real queries
+    df = np.diff(index.offsets)
+    tids = rng.choices(range(len(df)), weights=df.tolist(), k=args.queries)
+    seconds = best_of(args.rounds, lambda: [packed.term(t) for t in tids])
+    decoded = int(df[tids].sum())
+    print(f"term decode  {seconds / len(tids) * 1e6:7.2f} µs/term "
+          f"({decoded / seconds / 1e6:.1f} M postings/s, avg {decoded / len(tids):.0f} postings)")
+
+    docs, tfs = packed.decode()
+    raw = InvertedIndex(index.vocab, index.idf, index.offsets, docs, tfs, index.doc_len,
+                        k1=index.k1, b=index.b, epsilon=index.epsilon)
+    queries = [[store.terms[t] for t in rng.choices(range(len(df)), weights=df.tolist(),
+                                                      k=rng.randint(2, 5))]
+               for _ in range(args.queries)]
+    for name, scorer in (("compressed", index), ("in memory", raw)):
+        latencies = []
+        for tokens in queries:
+            started = time.perf_counter()
+            scorer.top_k(tokens, 4)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"query ({name:<10}) p50 {statistics.median(latencies):7.3f} ms   "
+              f"max {max(latencies):7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
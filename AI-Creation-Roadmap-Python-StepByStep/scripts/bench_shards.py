@@ -0,0 +1,113 @@
+"""Benchmark sharded retrieval: scatter-gather latency against the largest shard.
+
+Re-shards the current index (single file or shard set) into temporary shard
+sets of each requested size, from its stored terms (no file is read), then
+runs the same sampled queries against one in-process index and against every
+shard set through its worker processes. Reports the gather latency next to
+the time the largest shard's worker spent, and checks that the merged
+scores equal the single index's (global IDF and average length).
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from contextlib import ExitStack
+
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from rag.retrieve import ARTEFACT, SHARDS_ARTEFACT  # noqa: E402
+from rag.shards import (ShardedIndex, commit_shards, read_shard_set,  # noqa: E402
+                        shard_files, shard_of, shard_path)
+from rag.store import IndexWriter, MappedIndex  # noqa: E402
+
+
+def ms(values):
+    values = sorted(values)
+    return (f"p50 {statistics.median(values) * 1000:7.3f} ms   "
+            f"p99 {values[int(len(values) * 0.99)] * 1000:7.3f} ms")
+
+
+def write(sources, path, n_shards=None):
+    """Copy every passage of ``sources`` into one index at ``path`` or a set of ``n_shards``."""
+    analyzer = sources[0].analyzer
+    if n_shards is None:
+        paths = [path]
+    else:
+        paths = [shard_path(path, n, "bench") for n in range(n_shards)]
+    with ExitStack() as stack:
+        writers = [stack.enter_context(IndexWriter(p, analyzer=analyzer)) for p in paths]
+        for store in sources:
+            for doc_id in range(len(store)):
+                name, text = store.doc(doc_id)
+                writer = writers[shard_of(name.rpartition("#")[0], len(writers))]
+                writer.add(name, text, store.doc_terms(doc_id), store.span(doc_id))
+        if n_shards is None:
+            writers[0].commit()
+        else:
+            commit_shards(writers, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if os.path.exists(SHARDS_ARTEFACT):
+        sources = [MappedIndex(p) for p in shard_files(SHARDS_ARTEFACT, read_shard_set(SHARDS_ARTEFACT))]
+    elif os.path.exists(ARTEFACT):
+        sources = [MappedIndex(ARTEFACT)]
+    else:
+        parser.error("no index: run scripts/ingest.py first")
+    if not all(store.has_forward for store in sources):
+        parser.error("index has no forward index: run scripts/ingest.py --full")
+
+    rng = random.Random(args.seed)
+    queries = []
+    while len(queries) < args.queries:
+        store = rng.choice(sources)
+        terms = [t for t, _ in store.doc_terms(rng.randrange(len(store)))]
+        if terms:
+            queries.append(rng.sample(terms, min(len(terms), rng.randint(1, 5))))
+
+    with tempfile.TemporaryDirectory(prefix="bench-shards-") as tmp:
+        write(sources, os.path.join(tmp, "single.bin"))
+        single = MappedIndex(os.path.join(tmp, "single.bin"))
+        latencies, expected = [], []
+        for tokens in queries:
+            started = time.perf_counter()
+            expected.append([score for _, score in single.index.top_k(tokens, args.k)])
+            latencies.append(time.perf_counter() - started)
+        print(f"{len(single)} passages, {len(queries)} queries, k={args.k}, {os.cpu_count()} CPUs")
+        print(f"{'in-process':<10} {len(single):6d} docs   {ms(latencies)}")
+
+        for n in sorted(set(args.shards)):
+            set_path = os.path.join(tmp, f"shards{n}.json")
+            write(sources, set_path, n)
+            sharded = ShardedIndex(set_path)
+            try:
+                sharded.warm(args.k)
+                largest = max(range(n), key=lambda i: sharded.header["shards"][i]["n_docs"])
+                gathers, worst, diff = [], [], 0.0
+                for tokens, scores in zip(queries, expected):
+                    before = sharded.stats()["shards"][largest]["total_s"]
+                    started = time.perf_counter()
+                    merged = sharded.top_k_many([tokens], args.k)[0]
+                    gathers.append(time.perf_counter() - started)
+                    worst.append(sharded.stats()["shards"][largest]["total_s"] - before)
+                    diff = max([diff] + [abs(a - b) for a, b in zip(scores, (s for _, s in merged))])
+            finally:
+                sharded.close()
+            print(f"shards={n:<3} {sharded.header['shards'][largest]['n_docs']:6d} docs   "
+                  f"{ms(gathers)}   largest shard {ms(worst)}   max score diff {diff:.2g}")
+
+
+if __name__ == "__main__":
+    main()
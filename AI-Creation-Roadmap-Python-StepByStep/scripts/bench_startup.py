@@ -0,0 +1,81 @@
+"""Benchmark the cold start of one API worker.
+
+Starts ``uvicorn app.main:app`` in a fresh process several times and reports,
+from process spawn: time until ``/health`` answers (imports + lifespan), time
+until ``/ready`` answers 200 (index loaded, validated and warmed), and the
+latency of the first and second retrieval requests after that. The warm-up
+breakdown reported by ``/ready`` is printed for the last run.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+import httpx
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client: httpx.Client, url: str, started: float, timeout: float) -> float:
+    """Seconds from ``started`` until ``url`` answers 200."""
+    while True:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+        time.sleep(0.005)
+
+
+def one_run(query: str, timeout: float) -> Dict[str, float]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=PROJECT_ROOT)
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            result = {"health_s": wait_for(client, f"{base}/health", started, timeout),
+                      "ready_s": wait_for(client, f"{base}/ready", started, timeout)}
+            for name in ("first_query_s", "second_query_s"):
+                t = time.perf_counter()
+                client.post(f"{base}/retrieve/batch", json={"queries": [query]}).raise_for_status()
+                result[name] = time.perf_counter() - t
+                query += " again"  # a different query, so the second one is not a cache hit
+            result["warm_up"] = client.get(f"{base}/ready").json()["startup"]
+            return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--query", default="what is this project about")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args(argv)
+    if not os.path.exists(os.path.join(PROJECT_ROOT, "rag", "bm25_index.bin")):
+        parser.error("no index to warm up: run scripts/ingest.py first")
+    runs: List[Dict[str, float]] = [one_run(args.query, args.timeout) for _ in range(args.runs)]
+    for name in ("health_s", "ready_s", "first_query_s", "second_query_s"):
+        values = [run[name] * 1000 for run in runs]
+        print(f"{name[:-2]:<14} median {statistics.median(values):8.1f} ms   "
+              f"max {max(values):8.1f} ms")
+    print("warm-up (last run):", runs[-1]["warm_up"])
+
+
+if __name__ == "__main__":
+    main()
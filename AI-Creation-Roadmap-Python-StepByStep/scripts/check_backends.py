@@ -0,0 +1,56 @@
+"""Check that every BM25 scoring backend agrees with the postings backend.
+
+Runs sample queries (by default: a few terms drawn from the index vocabulary)
+through each backend and compares scores to float tolerance and rankings.
+"""
+import os
+import sys
+import random
+import argparse
+
+import numpy as np
+
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from rag.retrieve import ARTEFACT, BACKENDS  # noqa: E402
+from rag.store import MappedIndex  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200, help="random queries to run")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    index = MappedIndex(ARTEFACT).index
+    rng = random.Random(args.seed)
+    terms = list(index.vocab)
+    queries = [rng.sample(terms, min(len(terms), rng.randint(1, 5))) for _ in range(args.queries)]
+
+    reference = BACKENDS["postings"](index)
+    failures = 0
+    for name, make in BACKENDS.items():
+        if name == "postings":
+            continue
+        scorer = make(index)
+        for tokens in queries:
+            expected = np.zeros(index.corpus_size)
+            for doc_id, score in reference.scores(tokens).items():
+                expected[doc_id] = score
+            if not np.allclose(scorer.scores(tokens), expected, rtol=1e-9, atol=1e-12):
+                failures += 1
+                print(f"[{name}] scores differ for {tokens}")
+            elif ([d for d, _ in scorer.top_k(tokens, args.k)]
+                  != [d for d, _ in reference.top_k(tokens, args.k)]):
+                failures += 1
+                print(f"[{name}] top-{args.k} differs for {tokens}")
+        print(f"[{name}] {len(queries)} queries checked against postings")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
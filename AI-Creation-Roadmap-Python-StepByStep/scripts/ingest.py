@@ -1,52 +1,363 @@
 import os
+import sys
 import glob
+import json
 import uuid
-from typing import List, Tuple
+import hashlib
+import argparse
+from collections import Counter
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from rank_bm25 import BM25Okapi
 
-load_dotenv()
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
 
-DOCS_DIR = os.getenv("DOCS_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "docs"))
+from rag.analyzer import STEMMERS, Analyzer  # noqa: E402
+from rag.chunking import MODES, chunk_spans  # noqa: E402
+from rag.dense import DIM, build_dense, read_dense_header  # noqa: E402
+from rag.shards import (commit_shards, new_build, read_shard_set, remove_shards,  # noqa: E402
+                        shard_files, shard_of, shard_path)
+from rag.store import IndexWriter, MappedIndex  # noqa: E402
 
-# naive whitespace tokenizer
-def _tokenize(text: str) -> List[str]:
-    return [t.lower() for t in text.split() if t.strip()]
+load_dotenv()
 
+DOCS_DIR = os.getenv("DOCS_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "docs"))
+ARTEFACT = os.path.join(os.path.dirname(__file__), "..", "rag", "bm25_index.bin")
+# files read and tokenized together; bounds ingest memory along with IndexWriter's runs
+BATCH_SIZE = 512
+# path → size/mtime/sha256 of every indexed file, for incremental runs
+MANIFEST = os.path.join(os.path.dirname(__file__), "..", "rag", "bm25_manifest.json")
+# passage chunking defaults (see rag/chunking.py); each passage is one BM25 document
+CHUNK_MODE = os.getenv("CHUNK_MODE", "heading")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+# term analysis (see rag/analyzer.py); stored in the index and reused for queries
+ANALYZER_STOPWORDS = os.getenv("ANALYZER_STOPWORDS", "0") == "1"
+ANALYZER_STEM = os.getenv("ANALYZER_STEM", "light")
+# optional dense (LSA + IVF) index next to the BM25 one, see rag/dense.py
+DENSE_ARTEFACT = os.path.join(os.path.dirname(__file__), "..", "rag", "dense_index.bin")
+DENSE_INDEX = os.getenv("DENSE_INDEX", "0") == "1"
+DENSE_DIM = int(os.getenv("DENSE_DIM", str(DIM)))
+DENSE_LISTS = int(os.getenv("DENSE_LISTS", "0"))
+# N > 1 splits the index into N shards (see rag/shards.py), listed in SHARDS_ARTEFACT
+# instead of ARTEFACT; the API then queries each in its own worker process
+SHARDS_ARTEFACT = os.path.join(os.path.dirname(__file__), "..", "rag", "bm25_shards.json")
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "1"))
 
-def load_docs() -> List[Tuple[str, str]]:
+def doc_files() -> List[str]:
     files = glob.glob(os.path.join(DOCS_DIR, "**", "*.md"), recursive=True)
     files += glob.glob(os.path.join(DOCS_DIR, "**", "*.txt"), recursive=True)
-    docs: List[Tuple[str, str]] = []
-    for f in files:
+    # sorted so full and incremental runs lay documents out the same way
+    return sorted(files)
+
+
+def _read(path: str) -> Tuple[bytes, str]:
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    # same text as open(path, encoding="utf-8", errors="ignore") in text mode
+    text = raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+    return raw, text
+
+
+def _probe(path: str, entry: Optional[dict]) -> Optional[Tuple[os.stat_result, str, Optional[str]]]:
+    """(stat, sha256, text) of ``path``; text is None when ``entry`` still matches size/mtime."""
+    try:
+        st = os.stat(path)
+        if entry is not None and (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return st, entry["sha256"], None
+        raw, text = _read(path)
+        return st, hashlib.sha256(raw).hexdigest(), text
+    except Exception as e:
+        print(f"Failed reading {path}: {e}")
+        return None
+
+
+def _unchanged(path: str, entry: Optional[dict]) -> bool:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return entry is not None and (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+
+
+def iter_docs() -> Iterator[Tuple[str, str]]:
+    """(path, text) of every doc, one file in memory at a time."""
+    for f in doc_files():
         try:
-            with open(f, "r", encoding="utf-8", errors="ignore") as fh:
-                text = fh.read()
-                docs.append((f, text))
+            yield f, _read(f)[1]
         except Exception as e:
             print(f"Failed reading {f}: {e}")
-    return docs
 
 
-def build_bm25(corpus: List[Tuple[str, str]]):
-    tokenized = [_tokenize(text) for _, text in corpus]
-    return BM25Okapi(tokenized)
+Passage = Tuple[int, int, List[Tuple[str, int]]]  # (start, end, (term, tf) pairs)
+
+
+def _passages(text: str, chunking: Dict[str, object], analyzer: Analyzer) -> List[Passage]:
+    return [(start, end, list(Counter(analyzer.terms(text[start:end])).items()))
+            for start, end in chunk_spans(text, **chunking)]
+
+
+def split_passages(texts: List[str], chunking: Dict[str, object], analyzer: Analyzer,
+                   pool: Optional[ProcessPoolExecutor] = None, workers: int = 1) -> List[List[Passage]]:
+    """Chunk and analyze each text, on ``pool`` when given."""
+    split = partial(_passages, chunking=chunking, analyzer=analyzer)
+    if pool is None or len(texts) < 2:
+        return [split(text) for text in texts]
+    # map keeps input order, so the result is identical to a serial run
+    return list(pool.map(split, texts, chunksize=-(-len(texts) // (workers * 4))))
 
 
-def main():
-    corpus = load_docs()
-    if not corpus:
+def open_previous(shards: int) -> Tuple[Optional[str], List[MappedIndex]]:
+    """(version, index files) of the last build if it has ``shards`` shards, else (None, [])."""
+    try:
+        if shards == 1 and os.path.exists(ARTEFACT):
+            store = MappedIndex(ARTEFACT)
+            return store.version, [store]
+        if shards > 1 and os.path.exists(SHARDS_ARTEFACT):
+            header = read_shard_set(SHARDS_ARTEFACT)
+            if len(header["shards"]) == shards:
+                return header["version"], [MappedIndex(path) for path in
+                                           shard_files(SHARDS_ARTEFACT, header)]
+    except (OSError, ValueError):
+        pass  # older artefact format or a missing shard → full rebuild
+    return None, []
+
+
+def load_manifest(version: Optional[str], previous: List[MappedIndex], chunking: Dict[str, object],
+                  analyzer: Analyzer) -> Dict[str, dict]:
+    """File entries of the last run, or {} if they don't describe ``previous``
+    (the index or its shards, at ``version``) chunked and analyzed the same way."""
+    if version is None or not all(store.has_forward for store in previous):
+        return {}
+    if any(store.analyzer.config != analyzer.config for store in previous):
+        return {}  # its stored terms can't be reused
+    try:
+        with open(MANIFEST, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != version or manifest.get("chunking") != chunking:
+        return {}
+    return manifest["files"]
+
+
+def save_manifest(version: str, files: Dict[str, dict], chunking: Dict[str, object]) -> None:
+    tmp_path = f"{MANIFEST}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"version": version, "chunking": chunking, "files": files}, fh,
+                  indent=1, sort_keys=True)
+    os.replace(tmp_path, MANIFEST)
+
+
+def update_dense(dim: int, n_lists: int, force: bool = False) -> None:
+    """(Re)build the dense index if it is missing or was built from another BM25 index."""
+    store = MappedIndex(ARTEFACT)
+    if not force and os.path.exists(DENSE_ARTEFACT):
+        try:
+            header = read_dense_header(DENSE_ARTEFACT)
+        except ValueError:
+            header = None  # older format → rebuild
+        if header is not None and header["bm25_version"] == store.version \
+                and header["requested"] == {"dim": dim, "n_lists": n_lists}:
+            print(f"Dense index up to date → {DENSE_ARTEFACT}")
+            return
+    version = build_dense(store.index, store.version, DENSE_ARTEFACT, dim, n_lists)
+    header = read_dense_header(DENSE_ARTEFACT)
+    print(f"Dense index: {header['n_docs']} vectors of {header['dim']} dims in "
+          f"{header['n_lists']} lists ({version[:12]}) → {DENSE_ARTEFACT}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or update the BM25 index from DOCS_DIR.")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the manifest and re-tokenize every file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for tokenizing (and 4x threads for file reads); "
+                             "1 runs serially (default: CPU count)")
+    parser.add_argument("--chunk", choices=MODES, default=CHUNK_MODE,
+                        help="split files into passages by heading, paragraph or token window")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="max tokens per passage (longer sections are window-split)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                        help="tokens shared by consecutive windows")
+    parser.add_argument("--stopwords", action=argparse.BooleanOptionalAction,
+                        default=ANALYZER_STOPWORDS, help="drop common English function words")
+    parser.add_argument("--stem", choices=STEMMERS, default=ANALYZER_STEM,
+                        help="light: strip plural endings (queries → query)")
+    parser.add_argument("--shards", type=int, default=INDEX_SHARDS,
+                        help="split the index into N shards by file, each queried in its own "
+                             "process (1 = a single index file)")
+    parser.add_argument("--compact", action="store_true",
+                        help="only rewrite the index from its stored terms in the current format, "
+                             "dropping passages of deleted files (no file is read)")
+    parser.add_argument("--dense", action="store_true", default=DENSE_INDEX,
+                        help="also build the dense (LSA + IVF) index for mode='dense' retrieval")
+    parser.add_argument("--dense-dim", type=int, default=DENSE_DIM,
+                        help="dense vector dimensions (capped by the corpus size)")
+    parser.add_argument("--dense-lists", type=int, default=DENSE_LISTS,
+                        help="IVF lists (0 = about sqrt(passages))")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.chunk_tokens < 1 or not 0 <= args.chunk_overlap < args.chunk_tokens:
+        parser.error("need --chunk-tokens >= 1 and 0 <= --chunk-overlap < --chunk-tokens")
+    if args.dense_dim < 1 or args.dense_lists < 0:
+        parser.error("need --dense-dim >= 1 and --dense-lists >= 0")
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.shards > 1 and (args.dense or args.compact):
+        parser.error("--dense and --compact apply to the single-file index (--shards 1); "
+                     "sharded builds always rewrite every shard")
+    chunking = {"mode": args.chunk, "max_tokens": args.chunk_tokens, "overlap": args.chunk_overlap}
+    if args.compact:
+        done = compact()
+    else:
+        done = ingest(args, chunking, Analyzer(stopwords=args.stopwords, stem=args.stem))
+    if done and args.dense:
+        update_dense(args.dense_dim, args.dense_lists, force=args.full)
+
+
+def compact() -> bool:
+    """Rewrite the index from its forward index: current (compressed) layout, fresh
+    term ids, and no passages of files that are gone from DOCS_DIR."""
+    if not os.path.exists(ARTEFACT):
+        print("No index to compact. Run scripts/ingest.py first.")
+        return False
+    previous = MappedIndex(ARTEFACT)
+    if not previous.has_forward:
+        print("Index has no forward index to rebuild from. Run scripts/ingest.py --full.")
+        return False
+    try:
+        with open(MANIFEST, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is not None and manifest.get("version") != previous.version:
+        manifest = None
+    present = set(doc_files())
+    if not present:
         print("No docs found. Put .md or .txt files under data/docs.")
-        return
-    index = build_bm25(corpus)
-
-    # Save index and docs to a simple pickle artefact for demo purposes
-    import pickle
-    artefact_path = os.path.join(os.path.dirname(__file__), "..", "rag", "bm25_index.pkl")
-    with open(artefact_path, "wb") as fh:
-        pickle.dump({"corpus": corpus, "index": index}, fh)
-    print(f"Indexed {len(corpus)} docs → {artefact_path}")
+        return False
+    before, dropped = previous.stat.st_size, 0
+    header = previous.header
+    with IndexWriter(ARTEFACT, k1=header["k1"], b=header["b"], epsilon=header["epsilon"],
+                     analyzer=previous.analyzer) as writer:
+        for doc_id in range(len(previous)):
+            name, text = previous.doc(doc_id)
+            if name.rpartition("#")[0] not in present:
+                dropped += 1
+                continue
+            writer.add(name, text, previous.doc_terms(doc_id), previous.span(doc_id))
+        if not writer.n_docs:
+            print("Every indexed file is gone from DOCS_DIR; nothing to keep.")
+            return False
+        previous = None
+        version = writer.commit()
+    if manifest is not None:
+        files = {path: entry for path, entry in manifest["files"].items() if path in present}
+        save_manifest(version, files, manifest["chunking"])
+    after = os.stat(ARTEFACT).st_size
+    print(f"Compacted {writer.n_docs} passages ({dropped} of deleted files dropped): "
+          f"{before} → {after} bytes → {ARTEFACT}")
+    return True
+
+
+def ingest(args: argparse.Namespace, chunking: Dict[str, object], analyzer: Analyzer) -> bool:
+    """Bring the BM25 index up to date; False when there are no documents to index."""
+    # the previous build only counts if it has the same number of shards: a
+    # changed --shards moves files between shards, so it re-tokenizes everything
+    old_version, previous = open_previous(args.shards) if not args.full else (None, [])
+    old_files = load_manifest(old_version, previous, chunking, analyzer)
+    # source path → (index file, ids of its passages "path#n")
+    old_ids: Dict[str, Tuple[MappedIndex, List[int]]] = {}
+    for store in previous if old_files else ():
+        for doc_id in range(len(store)):
+            old_ids.setdefault(store.name(doc_id).rpartition("#")[0], (store, []))[1].append(doc_id)
+    target = ARTEFACT if args.shards == 1 else SHARDS_ARTEFACT
+
+    paths = doc_files()
+    known = [old_files.get(path) for path in paths]
+    if old_files and len(paths) == len(old_files) and all(map(_unchanged, paths, known)):
+        print(f"Index up to date ({len(paths)} files; 0 added, 0 updated, 0 removed) → {target}")
+        return True
+
+    files: Dict[str, dict] = {}
+    added = updated = 0
+    # file reads and hashing are I/O bound → threads; tokenizing is CPU bound → processes
+    parallel = args.workers > 1
+    # shard files get fresh names, so the set being served stays intact until replaced
+    build = new_build()
+    outputs = [ARTEFACT] if args.shards == 1 else \
+        [shard_path(SHARDS_ARTEFACT, n, build) for n in range(args.shards)]
+    with ExitStack() as stack:
+        writers = [stack.enter_context(IndexWriter(path, analyzer=analyzer)) for path in outputs]
+        io_pool = stack.enter_context(ThreadPoolExecutor(max_workers=min(32, args.workers * 4)))
+        cpu_pool = stack.enter_context(ProcessPoolExecutor(max_workers=args.workers) if parallel
+                                       else nullcontext())
+        for lo in range(0, len(paths), BATCH_SIZE):
+            batch = list(zip(paths[lo:lo + BATCH_SIZE], known[lo:lo + BATCH_SIZE]))
+            probed = list(io_pool.map(_probe, *zip(*batch))) if parallel else \
+                [_probe(path, entry) for path, entry in batch]
+            # unchanged size/mtime, or touched but identical content → reuse the indexed copy
+            reuse = [result is not None and entry is not None
+                     and (result[2] is None or entry["sha256"] == result[1])
+                     for (_, entry), result in zip(batch, probed)]
+            fresh = iter(split_passages([result[2] for result, r in zip(probed, reuse)
+                                         if result is not None and not r],
+                                        chunking, analyzer, cpu_pool, args.workers))
+            for (path, entry), result, r in zip(batch, probed, reuse):
+                if result is None:
+                    continue
+                st, digest, text = result
+                # relative, so the same corpus under another DOCS_DIR shards the same way
+                writer = writers[shard_of(os.path.relpath(path, DOCS_DIR).replace(os.sep, "/"),
+                                          len(writers))]
+                if r:
+                    store, doc_ids = old_ids.get(path, (None, ()))
+                    for doc_id in doc_ids:
+                        writer.add(*store.doc(doc_id), store.doc_terms(doc_id), store.span(doc_id))
+                else:
+                    for n, (start, end, terms) in enumerate(next(fresh)):
+                        writer.add(f"{path}#{n}", text[start:end], terms, (start, end))
+                    if path in old_files:
+                        updated += 1
+                    else:
+                        added += 1
+                files[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        removed = len(old_files.keys() - files.keys())
+
+        n_docs = sum(writer.n_docs for writer in writers)
+        if not n_docs:
+            print("No docs found. Put .md or .txt files under data/docs.")
+            return False
+        counts = f"{added} added, {updated} updated, {removed} removed"
+        if old_files and not (added or updated or removed):
+            # only touched files: keep the index, refresh their size/mtime
+            save_manifest(old_version, files, chunking)
+            print(f"Index up to date ({len(files)} files; {counts}) → {target}")
+            return True
+        # drop our mappings of the old files before replacing them (required on Windows)
+        previous = old_ids = store = None
+        if len(writers) == 1:
+            version = writers[0].commit()
+            remove_shards(SHARDS_ARTEFACT)
+        else:
+            # every shard is rewritten: any change moves the corpus-wide IDF
+            version = commit_shards(writers, SHARDS_ARTEFACT)
+            try:
+                os.remove(ARTEFACT)
+            except OSError:
+                pass  # no single-file index, or still mapped by a running API worker (Windows)
+    save_manifest(version, files, chunking)
+    shards = f" in {len(writers)} shards" if len(writers) > 1 else ""
+    print(f"Indexed {n_docs} passages{shards} from {len(files)} files ({counts}) → {target}")
+    return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# ensure project root on sys.path for `rag` import
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+import pytest  # noqa: E402
+
+from rag.cache import QueryCache  # noqa: E402
+
+
+@pytest.fixture
+def retrieval(tmp_path, monkeypatch):
+    """``rag.retrieve`` serving index files under ``tmp_path``, with nothing loaded or cached."""
+    from rag import retrieve
+
+    monkeypatch.setattr(retrieve, "ARTEFACT", str(tmp_path / "bm25_index.bin"))
+    monkeypatch.setattr(retrieve, "DENSE_ARTEFACT", str(tmp_path / "dense_index.bin"))
+    monkeypatch.setattr(retrieve, "SHARDS_ARTEFACT", str(tmp_path / "bm25_shards.json"))
+    for name in ("_stat", "_loaded", "_dense_stat", "_dense", "_shards_stat", "_sharded", "_shared"):
+        monkeypatch.setattr(retrieve, name, None)
+    monkeypatch.setattr(retrieve, "_cache", QueryCache(1024))
+    return retrieve
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """``scripts/ingest.py`` indexing ``tmp_path/docs`` into artefacts under ``tmp_path/rag``."""
+    from scripts import ingest as script
+
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "rag").mkdir()
+    monkeypatch.setattr(script, "DOCS_DIR", str(tmp_path / "docs"))
+    for name, filename in (("ARTEFACT", "bm25_index.bin"), ("MANIFEST", "bm25_manifest.json"),
+                           ("DENSE_ARTEFACT", "dense_index.bin"),
+                           ("SHARDS_ARTEFACT", "bm25_shards.json")):
+        monkeypatch.setattr(script, name, str(tmp_path / "rag" / filename))
+    return script
@@ -0,0 +1,95 @@
+"""InvertedIndex (and its numpy backend and on-disk form) against rank_bm25.BM25Okapi."""
+from collections import Counter
+
+import numpy as np
+import pytest
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+from rag.bm25 import InvertedIndex, NumpyScorer  # noqa: E402
+from rag.store import IndexWriter, MappedIndex  # noqa: E402
+
+# "the" and "a" appear in more than half of the documents: negative IDF, floored to epsilon
+CORPUS = [
+    "the quick brown fox jumps over the lazy dog",
+    "the lazy cat sleeps all day",
+    "a quick brown dog runs in the park",
+    "the fox and the hound are friends",
+    "a cat and a dog share the house",
+    "the weather is sunny today",
+    "a brown bear eats honey in the forest",
+    "the park is full of dogs and cats",
+]
+TOKENIZED = [doc.split() for doc in CORPUS]
+QUERIES = [
+    ["quick", "fox"],
+    ["the"],                    # only a floored (epsilon) term
+    ["the", "a", "lazy"],
+    ["brown", "brown", "dog"],  # repeated query terms count twice
+    ["honey"],                  # one match: the rest of the top k is zero-score padding
+    ["unknown"],                # no match at all: every hit is padding
+]
+
+
+def expected_top_k(scores, k):
+    """BM25Okapi ranking: by score, ties (and zero-score padding) to the lower doc id."""
+    order = np.lexsort((np.arange(len(scores)), -scores))[:k]
+    return order.tolist(), scores[order]
+
+
+@pytest.fixture(scope="module")
+def okapi():
+    return rank_bm25.BM25Okapi(TOKENIZED)
+
+
+@pytest.fixture(scope="module")
+def mapped(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("index") / "bm25_index.bin")
+    with IndexWriter(path) as writer:
+        for n, tokens in enumerate(TOKENIZED):
+            writer.add(f"doc{n}", CORPUS[n], list(Counter(tokens).items()))
+        writer.commit()
+    return MappedIndex(path)
+
+
+def scorers(mapped):
+    index = InvertedIndex.from_tokenized(TOKENIZED)
+    return {"postings": index, "numpy": NumpyScorer(index), "mapped": mapped.index,
+            "mapped-numpy": NumpyScorer(mapped.index)}
+
+
+def test_negative_idf_is_floored(okapi):
+    index = InvertedIndex.from_tokenized(TOKENIZED)
+    assert okapi.idf["the"] == pytest.approx(okapi.epsilon * okapi.average_idf)
+    np.testing.assert_array_equal([index.idf[index.vocab[t]] for t in okapi.idf],
+                                  list(okapi.idf.values()))
+
+
+@pytest.mark.parametrize("backend", ["postings", "numpy", "mapped", "mapped-numpy"])
+@pytest.mark.parametrize("query", QUERIES, ids=" ".join)
+def test_scores_and_top_k_match_okapi(okapi, mapped, backend, query):
+    scorer = scorers(mapped)[backend]
+    expected = okapi.get_scores(query)
+    scores = scorer.scores(query)
+    if isinstance(scores, dict):
+        scores = np.array([scores.get(i, 0.0) for i in range(len(CORPUS))])
+    np.testing.assert_allclose(scores, expected, rtol=1e-12, atol=0)
+    for k in (1, 3, len(CORPUS)):
+        ids, top_scores = expected_top_k(expected, k)
+        hits = scorer.top_k(query, k)
+        assert [i for i, _ in hits] == ids
+        np.testing.assert_allclose([s for _, s in hits], top_scores, rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("backend", ["postings", "numpy", "mapped"])
+def test_top_k_many_matches_top_k(mapped, backend):
+    scorer = scorers(mapped)[backend]
+    assert scorer.top_k_many(QUERIES, 3) == [scorer.top_k(query, 3) for query in QUERIES]
+
+
+def test_zero_score_padding(okapi):
+    index = InvertedIndex.from_tokenized(TOKENIZED)
+    hits = index.top_k(["honey"], 3)
+    assert hits[0] == (6, pytest.approx(okapi.get_scores(["honey"])[6]))
+    assert hits[1:] == [(0, 0.0), (1, 0.0)]
+    assert index.top_k(["unknown"], 2) == [(0, 0.0), (1, 0.0)]
@@ -0,0 +1,93 @@
+"""QueryCache (LRU, TTL, counters) and the shared Redis tier failing closed."""
+import importlib.util
+import types
+
+import pytest
+
+from rag.cache import QueryCache, RedisCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("rag.cache.time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_lru_evicts_least_recently_used():
+    cache = QueryCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    cache.put("a", 10)  # overwriting refreshes, never evicts
+    cache.put("d", 4)
+    assert cache.get("c") is None and cache.get("a") == 10
+    assert cache.stats() == {"size": 2, "hits": 4, "misses": 2, "evictions": 2}
+
+
+def test_ttl_expiry(clock):
+    cache = QueryCache(maxsize=8, ttl=10)
+    cache.put("a", 1)
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    cache.put("b", 2)
+    clock.now += 0.1  # "a" expires now: reads don't extend a TTL
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 1 and cache.get("b") == 2
+    clock.now += 10
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 0, "hits": 2, "misses": 2, "evictions": 0}
+
+
+def test_no_ttl_and_disabled_cache(clock):
+    cache = QueryCache(maxsize=1)
+    cache.put("a", [("doc#0", "text")])
+    clock.now += 10 ** 9
+    assert cache.get("a") == [("doc#0", "text")]
+    off = QueryCache(maxsize=0)
+    off.put("a", 1)
+    assert off.get("a") is None and len(off) == 0
+    cache.clear()
+    assert cache.get("a") is None and cache.stats()["size"] == 0
+
+
+@pytest.mark.skipif(importlib.util.find_spec("redis") is not None, reason="redis is installed")
+def test_shared_tier_needs_the_redis_package():
+    with pytest.raises(RuntimeError, match="redis package"):
+        RedisCache("redis://127.0.0.1:1/0")
+
+
+def test_shared_tier_fails_closed():
+    pytest.importorskip("redis")
+    # nothing listens on port 1: every call fails, none raises
+    shared = RedisCache("redis://127.0.0.1:1/0")
+    key = ("version", "bm25", ("cache",), 4)
+    shared.put(key, [["doc#0", "text"]])
+    assert shared.get(key) is None
+    assert shared.get(key, "default") == "default"
+    assert shared.stats() == {"hits": 0, "misses": 2, "errors": 3}
+
+
+def test_retrieval_survives_a_failing_shared_tier(retrieval, monkeypatch):
+    pytest.importorskip("redis")
+    from rag.store import IndexWriter
+
+    with IndexWriter(retrieval.ARTEFACT) as writer:
+        writer.add("a.md#0", "query cache", [("query", 1), ("cache", 1)])
+        writer.add("b.md#0", "shard", [("shard", 1)])
+        writer.commit()
+    monkeypatch.setattr(retrieval, "_shared", RedisCache("redis://127.0.0.1:1/0"))
+    assert retrieval.top_k("cache", 1) == [("a.md#0", "query cache")]
+    assert retrieval.top_k("cache", 1) == [("a.md#0", "query cache")]  # local tier
+    assert retrieval.cache_stats()["shared"]["errors"] == 2
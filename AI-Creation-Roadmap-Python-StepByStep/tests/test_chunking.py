@@ -0,0 +1,90 @@
+"""chunk_spans: window overlap and boundaries, heading/paragraph splits, spans in the index."""
+import os
+
+import pytest
+
+from rag.chunking import chunk_spans
+from rag.store import MappedIndex
+
+
+def words(n: int) -> str:
+    return " ".join(f"t{i}" for i in range(n))
+
+
+def tokens(text, spans):
+    return [text[start:end].split() for start, end in spans]
+
+
+@pytest.mark.parametrize("n, max_tokens, overlap", [
+    (10, 4, 1), (10, 4, 2), (10, 4, 0), (4, 4, 1), (5, 4, 3), (1, 4, 2), (100, 7, 6)])
+def test_windows_overlap_and_cover_every_token(n, max_tokens, overlap):
+    text = words(n)
+    chunks = tokens(text, chunk_spans(text, "window", max_tokens, overlap))
+    assert all(1 <= len(chunk) <= max_tokens for chunk in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert prev[-overlap:] == cur[:overlap] if overlap else prev[-1] != cur[0]
+        assert int(cur[0][1:]) == int(prev[0][1:]) + max_tokens - overlap
+    # the last window ends on the last token, and no window lies inside the one before
+    assert chunks[0][0] == "t0" and chunks[-1][-1] == f"t{n - 1}"
+    assert all(int(cur[-1][1:]) > int(prev[-1][1:]) for prev, cur in zip(chunks, chunks[1:]))
+
+
+def test_window_boundary_at_the_last_chunk():
+    text = words(8)
+    # exactly max_tokens: one window, not one plus an overlap-only tail
+    assert tokens(text, chunk_spans(text, "window", 8, 3)) == [text.split()]
+    # one token over: a second window, still max_tokens long where possible
+    text = words(9)
+    assert tokens(text, chunk_spans(text, "window", 8, 3)) == [
+        [f"t{i}" for i in range(8)], [f"t{i}" for i in range(5, 9)]]
+
+
+@pytest.mark.parametrize("mode", ["heading", "paragraph", "window"])
+def test_empty_and_short_text(mode):
+    assert chunk_spans("", mode) == []
+    assert chunk_spans(" \n\t\n  ", mode) == []
+    text = "\n  just a few words  \n"
+    assert [text[s:e] for s, e in chunk_spans(text, mode)] == ["just a few words"]
+
+
+def test_heading_and_paragraph_splits():
+    text = "intro line\n# One\nfirst section\n\nsecond paragraph\n## Two\n" + words(10) + "\n"
+    by_heading = [text[s:e] for s, e in chunk_spans(text, "heading", max_tokens=6, overlap=1)]
+    assert by_heading[:2] == ["intro line", "# One\nfirst section\n\nsecond paragraph"]
+    # the long section is window-split, heading included
+    assert by_heading[2].startswith("## Two") and len(by_heading[2].split()) == 6
+    assert all(len(chunk.split()) <= 6 for chunk in by_heading) and len(by_heading) == 5
+    by_paragraph = [text[s:e] for s, e in chunk_spans(text, "paragraph", max_tokens=50)]
+    assert by_paragraph == ["intro line\n# One\nfirst section",
+                            "second paragraph\n## Two\n" + words(10)]
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError, match="chunk mode"):
+        chunk_spans("text", "sentence")
+    for max_tokens, overlap in ((0, 0), (4, 4), (4, -1)):
+        with pytest.raises(ValueError):
+            chunk_spans("text", "window", max_tokens, overlap)
+
+
+def test_indexed_spans_map_back_to_the_source(ingest):
+    sources = {
+        "notes.md": "# Ünïcode\nnaïve café — résumé " + words(30) + "\n\n# Next\nshort tail\n",
+        "plain.txt": "para one " + words(12) + "\n\n\npara two\n",
+        "crlf.md": "# Windows\r\nline endings\r\n\r\n# Second\r\nmore text\r\n",
+    }
+    for name, text in sources.items():
+        with open(os.path.join(ingest.DOCS_DIR, name), "w", encoding="utf-8", newline="") as fh:
+            fh.write(text)
+    ingest.main(["--workers", "1", "--chunk-tokens", "8", "--chunk-overlap", "2"])
+    store = MappedIndex(ingest.ARTEFACT)
+    seen = set()
+    for doc_id in range(len(store)):
+        name, text = store.doc(doc_id)
+        path, _, n = name.rpartition("#")
+        source = sources[os.path.basename(path)].replace("\r\n", "\n")  # as ingest reads it
+        start, end = store.span(doc_id)
+        assert source[start:end] == text
+        assert (start, end) == chunk_spans(source, "heading", 8, 2)[int(n)]
+        seen.add(os.path.basename(path))
+    assert seen == set(sources)
@@ -0,0 +1,107 @@
+"""Dispatcher batching window, concurrency cap, token bucket and close()."""
+import asyncio
+import time
+
+import pytest
+
+from app.dispatcher import Dispatcher, TokenBucket
+
+
+def recorder(delay: float = 0.0):
+    calls = []
+
+    async def call(n):
+        calls.append(n)
+        await asyncio.sleep(delay)
+        if n == "fail":
+            raise ValueError("bad request")
+        return n * 2
+
+    return call, calls
+
+
+def test_calls_within_the_window_form_one_batch():
+    async def main():
+        call, calls = recorder()
+        dispatcher = Dispatcher(call, window=0.05, max_batch=64)
+        first = [asyncio.ensure_future(dispatcher.submit(n)) for n in range(5)]
+        await asyncio.sleep(0.01)
+        assert calls == [] and dispatcher.stats()["pending"] == 5  # still inside the window
+        assert await asyncio.gather(*first) == [0, 2, 4, 6, 8]
+        assert await dispatcher.submit(5) == 10  # a new window, a new batch
+        assert dispatcher.batches == 2 and dispatcher.completed == 6
+
+    asyncio.run(main())
+
+
+def test_max_batch_flushes_early():
+    async def main():
+        call, _ = recorder()
+        dispatcher = Dispatcher(call, window=60.0, max_batch=4)
+        assert await asyncio.gather(*[dispatcher.submit(n) for n in range(8)]) == \
+            [0, 2, 4, 6, 8, 10, 12, 14]
+        assert dispatcher.batches == 2
+
+    asyncio.run(main())
+
+
+def test_concurrency_cap_and_errors_fan_out():
+    async def main():
+        call, calls = recorder(delay=0.02)
+        dispatcher = Dispatcher(call, window=0.001, concurrency=3)
+        results = await asyncio.gather(*[dispatcher.submit(n) for n in range(10)],
+                                       dispatcher.submit("fail"), return_exceptions=True)
+        assert results[:10] == [n * 2 for n in range(10)]
+        assert isinstance(results[10], ValueError)
+        assert len(calls) == 11 and dispatcher.batches == 1
+        assert dispatcher.peak_in_flight == 3 and dispatcher.in_flight == 0
+        assert dispatcher.completed == 10 and dispatcher.failed == 1
+
+    asyncio.run(main())
+
+
+def test_token_bucket_limits_the_rate():
+    async def main():
+        bucket = TokenBucket(rate=100, burst=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        assert time.monotonic() - started < 0.02  # the burst is free
+        for _ in range(5):
+            await bucket.acquire()
+        assert time.monotonic() - started >= 0.045  # then 100 per second
+        unlimited = TokenBucket(rate=0)
+        await asyncio.gather(*[unlimited.acquire() for _ in range(1000)])
+
+    asyncio.run(main())
+
+
+def test_rate_applies_through_the_dispatcher():
+    async def main():
+        call, _ = recorder()
+        dispatcher = Dispatcher(call, window=0.001, rate=200, burst=1)
+        started = time.monotonic()
+        await asyncio.gather(*[dispatcher.submit(n) for n in range(5)])
+        assert time.monotonic() - started >= 0.018  # 4 waits of 5 ms after the first token
+
+    asyncio.run(main())
+
+
+def test_close_releases_pending_and_running_calls():
+    async def main():
+        call, calls = recorder(delay=60.0)
+        dispatcher = Dispatcher(call, window=60.0, max_batch=2)
+        running = [asyncio.ensure_future(dispatcher.submit(n)) for n in range(2)]
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(dispatcher.submit(2))  # waits for the window
+        await asyncio.sleep(0.01)
+        assert calls == [0, 1] and dispatcher.stats()["pending"] == 1
+        await asyncio.wait_for(dispatcher.close(), 1.0)
+        # nobody is left waiting: queued calls are cancelled, in-flight calls stopped
+        for task in running + [queued]:
+            with pytest.raises(asyncio.CancelledError):
+                await asyncio.wait_for(task, 1.0)
+        assert calls == [0, 1] and dispatcher.stats()["pending"] == 0
+        assert not dispatcher._tasks and dispatcher.in_flight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""BoundedExecutor: at most workers + queue_depth jobs, the rest rejected."""
+import asyncio
+import threading
+
+import pytest
+
+from app.executor import BoundedExecutor, Saturated
+
+
+def test_rejects_when_full_and_bounds_in_flight():
+    async def main():
+        executor = BoundedExecutor(workers=2, queue_depth=1)
+        gate = threading.Event()
+        running = []
+
+        def job(n):
+            running.append(n)
+            gate.wait(5)
+            return n
+
+        jobs = [asyncio.ensure_future(executor.run(job, n)) for n in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.in_flight == 3 and sorted(running) == [0, 1]  # job 2 is queued
+        with pytest.raises(Saturated):
+            await executor.run(job, 3)
+        assert executor.rejected == 1
+        gate.set()
+        assert await asyncio.gather(*jobs) == [0, 1, 2]
+        await asyncio.sleep(0.01)  # slots are released from the done callbacks
+        assert executor.in_flight == 0
+        assert await executor.run(job, 4) == 4  # capacity is back
+        stats = executor.stats()
+        assert stats["rejected"] == 1 and stats["run"]["count"] == 4 and stats["wait"]["count"] == 4
+        executor.shutdown()
+
+    asyncio.run(main())
+
+
+def test_errors_release_the_slot():
+    async def main():
+        executor = BoundedExecutor(workers=1, queue_depth=0)
+
+        def fail():
+            raise ValueError("boom")
+
+        for _ in range(3):
+            with pytest.raises(ValueError, match="boom"):
+                await executor.run(fail)
+            await asyncio.sleep(0.01)
+        assert executor.in_flight == 0 and executor.rejected == 0
+        executor.shutdown()
+
+    asyncio.run(main())
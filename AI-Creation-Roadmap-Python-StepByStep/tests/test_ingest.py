@@ -0,0 +1,112 @@
+"""Incremental ingest must produce the same index as a full rebuild."""
+import json
+import os
+import random
+import re
+from functools import partial
+
+DOCS = {
+    "a.md": "# Cache\nRecent results are kept per worker.\n\n# Shared\nRedis holds a shared tier.\n",
+    "b.md": "# Index\nThe inverted index maps terms to postings.\n",
+    "c.txt": "Shards split the corpus by file.\n",
+    "d.md": "# Dense\nLSA vectors and IVF lists.\n\n# Hybrid\nBoth rankings are fused.\n",
+}
+
+
+def write(ingest, name, text, mtime_ns=None):
+    path = os.path.join(ingest.DOCS_DIR, name)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def touch(ingest, name):
+    path = os.path.join(ingest.DOCS_DIR, name)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def run(ingest, capsys, *argv):
+    """(added, updated, removed) reported by one ingest.py run."""
+    ingest.main(["--workers", "1", *argv])
+    out = capsys.readouterr().out
+    counts = re.search(r"(\d+) added, (\d+) updated, (\d+) removed", out)
+    assert counts, out
+    return tuple(int(n) for n in counts.groups())
+
+
+def index_bytes(ingest):
+    with open(ingest.ARTEFACT, "rb") as fh:
+        return fh.read()
+
+
+def assert_same_as_full(ingest, capsys):
+    incremental = index_bytes(ingest)
+    with open(ingest.MANIFEST, encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    run(ingest, capsys, "--full")
+    assert index_bytes(ingest) == incremental
+    with open(ingest.MANIFEST, encoding="utf-8") as fh:
+        assert json.load(fh) == manifest
+
+
+def test_incremental_runs_match_full(ingest, capsys):
+    for name, text in DOCS.items():
+        write(ingest, name, text)
+    assert run(ingest, capsys) == (4, 0, 0)
+    assert run(ingest, capsys) == (0, 0, 0)  # nothing changed
+
+    # modify b (same size, so only mtime and content tell), delete c, add e, touch d
+    st = os.stat(os.path.join(ingest.DOCS_DIR, "b.md"))
+    write(ingest, "b.md", DOCS["b.md"].replace("maps", "ties"), st.st_mtime_ns + 10 ** 9)
+    os.remove(os.path.join(ingest.DOCS_DIR, "c.txt"))
+    write(ingest, "e.txt", "Postings are compressed with varint gaps.\n")
+    touch(ingest, "d.md")
+    assert run(ingest, capsys) == (1, 1, 1)
+    assert_same_as_full(ingest, capsys)
+
+
+def test_touch_only_keeps_the_index(ingest, capsys):
+    for name, text in DOCS.items():
+        write(ingest, name, text)
+    run(ingest, capsys)
+    before = index_bytes(ingest)
+    stat = os.stat(ingest.ARTEFACT)
+    touch(ingest, "a.md")
+    touch(ingest, "d.md")
+    assert run(ingest, capsys) == (0, 0, 0)
+    # the index file is not rewritten; the manifest records the new mtimes
+    assert os.stat(ingest.ARTEFACT).st_ino == stat.st_ino and index_bytes(ingest) == before
+    with open(ingest.MANIFEST, encoding="utf-8") as fh:
+        files = json.load(fh)["files"]
+    path = os.path.join(ingest.DOCS_DIR, "a.md")
+    assert files[path]["mtime_ns"] == os.stat(path).st_mtime_ns
+    # so the next run takes the size/mtime fast path without hashing
+    assert run(ingest, capsys) == (0, 0, 0)
+    assert_same_as_full(ingest, capsys)
+
+
+def test_changed_settings_reindex_everything(ingest, capsys):
+    for name, text in DOCS.items():
+        write(ingest, name, text)
+    run(ingest, capsys)
+    # a manifest of other chunking settings can't be reused
+    assert run(ingest, capsys, "--chunk", "paragraph") == (4, 0, 0)
+    assert run(ingest, capsys, "--chunk", "paragraph") == (0, 0, 0)
+
+
+def test_workers_and_spilled_runs_do_not_change_the_index(ingest, capsys, monkeypatch):
+    rng = random.Random(1)
+    words = [f"term{n}" for n in range(200)]
+    for n in range(40):
+        sections = [f"# Part {p}\n" + " ".join(rng.choices(words, k=rng.randint(5, 80)))
+                    for p in range(rng.randint(1, 4))]
+        write(ingest, f"doc{n:02d}.md", "\n\n".join(sections) + "\n")
+    run(ingest, capsys, "--full")
+    serial = index_bytes(ingest)
+    # tokenized in worker processes, file reads on threads, postings spilled every 50
+    monkeypatch.setattr(ingest, "IndexWriter", partial(ingest.IndexWriter, run_size=50))
+    ingest.main(["--workers", "3", "--full"])
+    assert "40 added" in capsys.readouterr().out
+    assert index_bytes(ingest) == serial
@@ -0,0 +1,35 @@
+"""Registry.render must emit HELP/TYPE under the same name as the samples."""
+from app.metrics import Callback, Counter, Gauge, Histogram, Registry
+
+
+def families(text: str):
+    """{name in TYPE line: (kind, sample names)}; every sample must follow its family."""
+    out, current = {}, None
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, current, kind = line.split(" ")
+            out[current] = (kind, set())
+        elif line.startswith("# HELP "):
+            assert line.split(" ")[2] not in out  # HELP comes before its TYPE
+        else:
+            out[current][1].add(line.split("{")[0].split(" ")[0])
+    return out
+
+
+def test_sample_names_match_type_lines():
+    registry = Registry()
+    registry.register(Counter("http_errors", "5xx responses", ["route"])).inc("/chat")
+    registry.register(Gauge("in_flight", "requests in flight")).set(2)
+    registry.register(Histogram("latency_seconds", "latency", buckets=(0.1,))).labels().observe(0.05)
+    registry.register(Callback("counter", "cache_hits", "hits", lambda: 3))
+    registry.register(Callback("gauge", "index_docs", "docs", lambda: {("main",): 7}, ["index"]))
+    registry.register(Callback("gauge", "nothing", "skipped", lambda: None))
+
+    assert families(registry.render()) == {
+        "http_errors_total": ("counter", {"http_errors_total"}),
+        "in_flight": ("gauge", {"in_flight"}),
+        "latency_seconds": ("histogram", {"latency_seconds_bucket", "latency_seconds_sum",
+                                          "latency_seconds_count"}),
+        "cache_hits_total": ("counter", {"cache_hits_total"}),
+        "index_docs": ("gauge", {"index_docs"}),
+    }
@@ -0,0 +1,107 @@
+"""Compressed postings round-trip exactly (doc ids) or within the documented error (tfs)."""
+import os
+
+import numpy as np
+import pytest
+
+from rag.postings import TF_TABLE, PackedPostings, decode_varints, encode_docs, encode_tfs
+from rag.store import MappedIndex
+
+DOCS = {
+    "alpha.md": "# Caching\nThe query cache keeps recent results.\n\n"
+                "# Eviction\nLeast recently used entries go first.\n",
+    "beta.md": "# Postings\nDoc ids are stored as varint gaps.\n\n"
+               "# Frequencies\nTerm frequencies are quantized.\n",
+    "gamma.txt": "Shards split the index by file and score queries in parallel.\n",
+}
+
+
+def pack(lists):
+    """PackedPostings of per-term (doc ids, tfs) lists."""
+    offsets = np.concatenate([[0], np.cumsum([len(docs) for docs, _ in lists])]).astype(np.int64)
+    docs = np.concatenate([docs for docs, _ in lists] + [[]]).astype(np.int64)
+    tfs = np.concatenate([tfs for _, tfs in lists] + [[]]).astype(np.int64)
+    doc_bytes, byte_offsets = encode_docs(docs, offsets)
+    return PackedPostings(offsets, doc_bytes, byte_offsets, encode_tfs(tfs)), docs, tfs
+
+
+def test_doc_ids_round_trip():
+    rng = np.random.default_rng(0)
+    lists = [
+        ([0], [1]),                                      # single posting at doc 0
+        ([7], [3]),                                      # single posting, absolute first id
+        ([], []),                                        # term without postings
+        ([1, 2, 3, 4], [1, 1, 2, 1]),                    # one-byte gaps
+        ([0, 127, 128, 16_511, 16_512], [1] * 5),        # 1/2/3-byte varint boundaries
+        ([5, 2 ** 21 + 5, 2 ** 28 + 9, 2 ** 31 - 1], [2, 1, 1, 4]),  # 4 and 5-byte gaps
+        (np.sort(rng.choice(2 ** 20, 500, replace=False)), rng.integers(1, 40, 500)),
+        ([2 ** 31 - 2], [9]),                            # large first id after a long list
+    ]
+    packed, docs, tfs = pack(lists)
+    for tid, (expected, _) in enumerate(lists):
+        got, _ = packed.term(tid)
+        np.testing.assert_array_equal(got, np.asarray(expected, dtype=np.int64))
+    all_docs, all_tfs = packed.decode()
+    np.testing.assert_array_equal(all_docs, docs)
+    np.testing.assert_array_equal(all_tfs, tfs)
+    # one byte per gap below 128: the first id and every neighbouring doc
+    assert packed.byte_offsets[4] - packed.byte_offsets[3] == 4
+
+
+def test_varint_sizes_and_truncation():
+    for value, size in ((0, 1), (127, 1), (128, 2), (2 ** 14 - 1, 2), (2 ** 14, 3),
+                        (2 ** 21, 4), (2 ** 28 - 1, 4), (2 ** 28, 5)):
+        buf, _ = encode_docs(np.array([value]), np.array([0, 1]))
+        assert len(buf) == size
+        assert decode_varints(buf).tolist() == [value]
+    with pytest.raises(ValueError, match="truncated"):
+        decode_varints(encode_docs(np.array([300]), np.array([0, 1]))[0][:1])
+
+
+def test_tfs_exact_up_to_128_then_within_documented_error():
+    small = np.arange(0, 129)
+    np.testing.assert_array_equal(TF_TABLE[encode_tfs(small)], small)
+    large = np.arange(129, int(TF_TABLE[-1]) + 1)
+    decoded = TF_TABLE[encode_tfs(large)]
+    assert (np.abs(decoded - large) / large).max() <= 0.023
+    assert TF_TABLE[-1] > 31_000 and len(TF_TABLE) == 256
+    # larger counts saturate at the last code instead of wrapping
+    assert TF_TABLE[encode_tfs(np.array([10 ** 6]))].tolist() == [TF_TABLE[-1]]
+
+
+def write_docs(ingest, docs):
+    for name, text in docs.items():
+        with open(os.path.join(ingest.DOCS_DIR, name), "w", encoding="utf-8") as fh:
+            fh.write(text)
+
+
+def index_bytes(ingest):
+    with open(ingest.ARTEFACT, "rb") as fh:
+        return fh.read()
+
+
+def test_compact_drops_deleted_files_and_matches_full(ingest, capsys):
+    write_docs(ingest, DOCS)
+    ingest.main(["--workers", "1"])
+    before = MappedIndex(ingest.ARTEFACT)
+    n_beta = sum(before.name(i).rpartition("#")[0].endswith("beta.md") for i in range(len(before)))
+    n_docs = len(before)
+    del before
+    assert n_beta == 2
+
+    os.remove(os.path.join(ingest.DOCS_DIR, "beta.md"))
+    ingest.main(["--compact"])
+    assert "2 of deleted files dropped" in capsys.readouterr().out
+    store = MappedIndex(ingest.ARTEFACT)
+    assert len(store) == n_docs - n_beta
+    assert not any("beta.md" in store.name(i) for i in range(len(store)))
+    assert "varint" not in store.index.vocab  # fresh term ids: terms of beta.md only are gone
+    store.validate(deep=True)
+    del store
+
+    # the manifest follows the compacted index: nothing left to do incrementally
+    ingest.main(["--workers", "1"])
+    assert "0 added, 0 updated, 0 removed" in capsys.readouterr().out
+    compacted = index_bytes(ingest)
+    ingest.main(["--workers", "1", "--full"])
+    assert index_bytes(ingest) == compacted
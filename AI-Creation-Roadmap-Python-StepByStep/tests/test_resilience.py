@@ -0,0 +1,99 @@
+"""UpstreamGuard: the breaker never stuck half-open, and only overload trips it."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.resilience import AIMDLimiter, CircuitBreaker, RetryBudget, UpstreamGuard, UpstreamUnavailable
+
+
+def half_open_guard(max_wait: float) -> UpstreamGuard:
+    breaker = CircuitBreaker(threshold=0.5, window=2, min_calls=1, open_seconds=0.0)
+    breaker.record(True)  # opens; open_seconds=0 makes it half-open right away
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=1, max_wait=max_wait)
+    limiter.in_flight = 1  # every slot taken: admit() waits in acquire()
+    return UpstreamGuard(limiter, breaker, RetryBudget())
+
+
+async def admit_once(guard: UpstreamGuard) -> None:
+    async with guard.admit():
+        pass
+
+
+def test_probe_released_when_acquire_is_cancelled():
+    async def main():
+        guard = half_open_guard(max_wait=60.0)
+        task = asyncio.create_task(admit_once(guard))
+        await asyncio.sleep(0.01)
+        assert guard.breaker.state == "half_open" and guard.breaker._probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not guard.breaker._probing
+        assert guard.breaker.allow()  # the next call may probe
+
+    asyncio.run(main())
+
+
+def test_probe_released_when_acquire_times_out():
+    async def main():
+        guard = half_open_guard(max_wait=0.01)
+        with pytest.raises(UpstreamUnavailable):
+            await admit_once(guard)
+        assert guard.breaker.allow()
+
+    asyncio.run(main())
+
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://upstream/chat/completions")
+    return httpx.HTTPStatusError(f"{code}", request=request, response=httpx.Response(code, request=request))
+
+
+def failing_guard() -> UpstreamGuard:
+    breaker = CircuitBreaker(threshold=0.5, window=10, min_calls=4, open_seconds=60.0)
+    return UpstreamGuard(AIMDLimiter(initial=4), breaker, RetryBudget(), backoff_min=0.0)
+
+
+@pytest.mark.parametrize("code", [400, 401, 403, 404])
+def test_client_errors_surface_and_keep_the_circuit_closed(code):
+    async def main():
+        guard = failing_guard()
+        calls = 0
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            raise status_error(code)
+
+        for _ in range(10):
+            with pytest.raises(httpx.HTTPStatusError):
+                await guard.call(upstream)
+        assert calls == 10  # never retried
+        assert guard.breaker.state == "closed" and guard.breaker.failure_rate == 0.0
+        assert guard.limiter.decreases == 0
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("error", [status_error(429), status_error(503), httpx.ConnectTimeout("timed out")])
+def test_overload_errors_are_unavailable_and_trip_the_circuit(error):
+    async def main():
+        guard = failing_guard()
+        calls = 0
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            raise error
+
+        for _ in range(2):
+            with pytest.raises(UpstreamUnavailable):
+                await guard.call(upstream)
+        assert calls == 4  # each call retried once
+        assert guard.breaker.state == "open"
+        with pytest.raises(UpstreamUnavailable, match="circuit open"):
+            await guard.call(upstream)
+        assert calls == 4
+
+    asyncio.run(main())
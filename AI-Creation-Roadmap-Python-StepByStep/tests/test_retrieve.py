@@ -0,0 +1,147 @@
+"""Hybrid retrieval (fusion, candidate pool) and result caching across index rebuilds."""
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from rag.analyzer import Analyzer
+from rag.dense import build_dense
+from rag.store import IndexWriter
+
+TEXTS = [
+    "cache eviction drops the least recently used entry",
+    "redis keeps a shared cache for every worker",
+    "the cache key holds the index version and the query terms",
+    "bm25 scores documents by term frequency and inverse document frequency",
+    "postings lists are compressed with varint gaps",
+    "the inverted index maps every term to its postings",
+    "dense vectors come from a truncated svd of the term matrix",
+    "ivf lists cluster the vectors with spherical k-means",
+    "hybrid retrieval fuses bm25 and dense rankings",
+    "reciprocal rank fusion adds one over k plus rank",
+    "shards split the index by source file",
+    "workers score queries against their own shard",
+]
+QUERIES = ["cache index", "bm25 rank", "vectors of the term matrix", "shard workers"]
+
+
+def build(retrieval, dim=8):
+    """Write the BM25 index of TEXTS and a one-list dense index (exact search) of ``dim``."""
+    analyzer = Analyzer()
+    with IndexWriter(retrieval.ARTEFACT, analyzer=analyzer) as writer:
+        for n, text in enumerate(TEXTS):
+            writer.add(f"doc{n:02d}.md#0", text, list(Counter(analyzer.terms(text)).items()))
+        writer.commit()
+    rebuild_dense(retrieval, dim)
+    return retrieval.load_index()
+
+
+def rebuild_dense(retrieval, dim):
+    store, _ = retrieval.load_index()
+    build_dense(store.index, store.version, retrieval.DENSE_ARTEFACT, dim, n_lists=1)
+
+
+def branches(retrieval, store, scorer, tokens, n):
+    """(BM25 ids with a positive score, dense ids), each best first, top ``n``."""
+    lexical = [i for i, score in scorer.top_k(tokens, n) if score > 0]
+    dense = retrieval.load_dense(store)
+    return lexical, [i for i, _ in dense.exact(dense.encode(tokens), n)]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_rrf_fuses_ranks(retrieval, monkeypatch, query):
+    monkeypatch.setattr(retrieval, "HYBRID_FUSION", "rrf")
+    store, scorer = build(retrieval)
+    tokens = store.vocabulary.lookup(query)
+    lexical, dense = branches(retrieval, store, scorer, tokens, 5)
+    fused = Counter()
+    for ranking in (lexical, dense):
+        for rank, i in enumerate(ranking, 1):
+            fused[i] += 1.0 / (retrieval.HYBRID_RRF_K + rank)
+    expected = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:3]
+    ranked = retrieval._hybrid(store, scorer, tokens, 3, 5)
+    assert [i for i, _ in ranked] == [i for i, _ in expected]
+    np.testing.assert_allclose([s for _, s in ranked], [s for _, s in expected], rtol=1e-12)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_weighted_fuses_minmax_scores(retrieval, monkeypatch, query):
+    monkeypatch.setattr(retrieval, "HYBRID_FUSION", "weighted")
+    monkeypatch.setattr(retrieval, "HYBRID_DENSE_WEIGHT", 0.3)
+    store, scorer = build(retrieval)
+    tokens = store.vocabulary.lookup(query)
+    lexical, dense_ids = branches(retrieval, store, scorer, tokens, 5)
+    union = sorted(set(lexical) | set(dense_ids))
+    dense = retrieval.load_dense(store)
+    cosine = [float(dense.vectors[i] @ dense.encode(tokens)) for i in union]
+    bm25 = [store.index.scores(tokens).get(i, 0.0) for i in union]
+
+    def minmax(values):
+        lo, hi = min(values), max(values)
+        return [(v - lo) / (hi - lo) if hi > lo else 0.0 for v in values]
+
+    fused = [0.3 * c + 0.7 * b for c, b in zip(minmax(cosine), minmax(bm25))]
+    expected = sorted(zip(union, fused), key=lambda item: (-item[1], item[0]))[:3]
+    ranked = retrieval._hybrid(store, scorer, tokens, 3, 5)
+    assert [i for i, _ in ranked] == [i for i, _ in expected]
+    np.testing.assert_allclose([s for _, s in ranked], [s for _, s in expected], rtol=1e-6)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_weight_zero_and_one_are_the_single_branches(retrieval, monkeypatch, query):
+    monkeypatch.setattr(retrieval, "HYBRID_FUSION", "weighted")
+    store, scorer = build(retrieval)
+    tokens = store.vocabulary.lookup(query)
+    lexical, dense = branches(retrieval, store, scorer, tokens, len(TEXTS))
+    k = min(2, len(lexical))  # only documents that contain a query term
+    monkeypatch.setattr(retrieval, "HYBRID_DENSE_WEIGHT", 0.0)
+    assert [i for i, _ in retrieval._hybrid(store, scorer, tokens, k, 4)] == lexical[:k]
+    monkeypatch.setattr(retrieval, "HYBRID_DENSE_WEIGHT", 1.0)
+    assert [i for i, _ in retrieval._hybrid(store, scorer, tokens, 3, 4)] == dense[:3]
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_candidates_limit_the_pool(retrieval, monkeypatch, fusion):
+    monkeypatch.setattr(retrieval, "HYBRID_FUSION", fusion)
+    store, scorer = build(retrieval)
+    tokens = store.vocabulary.lookup("the index of every cache")
+    pools = []
+    for candidates in (1, 3, len(TEXTS)):
+        lexical, dense = branches(retrieval, store, scorer, tokens, candidates)
+        pool = set(lexical) | set(dense)
+        ranked = retrieval._hybrid(store, scorer, tokens, 1 if candidates == 1 else 3, candidates)
+        assert {i for i, _ in ranked} <= pool
+        pools.append(pool)
+    assert len(pools[0]) <= 2 < len(pools[1]) < len(pools[2])
+    # the pool never holds fewer than k of each branch
+    lexical, dense = branches(retrieval, store, scorer, tokens, 3)
+    ranked = retrieval._hybrid(store, scorer, tokens, 3, 1)
+    assert len(ranked) == 3 and {i for i, _ in ranked} <= set(lexical) | set(dense)
+
+
+@pytest.mark.parametrize("mode", ["dense", "hybrid"])
+def test_rebuilt_dense_index_is_not_served_from_cache(retrieval, mode):
+    build(retrieval, dim=2)
+    before = retrieval.top_k_many(QUERIES, 3, mode)
+    assert retrieval.top_k_many(QUERIES, 3, mode) == before  # served from the cache
+    old_version = retrieval.index_version()
+
+    rebuild_dense(retrieval, dim=8)  # same BM25 index, new dense settings
+    after = retrieval.top_k_many(QUERIES, 3, mode)
+    assert after != before
+    assert [retrieval.top_k(q, 3, mode) for q in QUERIES] == after
+    # the answer cache of the API syncs on this version
+    assert retrieval.index_version() != old_version
+    assert retrieval.index_version().startswith(retrieval.load_index()[0].version)
+
+    retrieval._cache.clear()
+    assert retrieval.top_k_many(QUERIES, 3, mode) == after
+
+
+def test_bm25_results_survive_a_dense_rebuild(retrieval):
+    build(retrieval, dim=2)
+    before = retrieval.top_k_many(QUERIES, 3, "bm25")
+    hits = retrieval._cache.hits
+    rebuild_dense(retrieval, dim=8)
+    assert retrieval.top_k_many(QUERIES, 3, "bm25") == before
+    assert retrieval._cache.hits == hits + len(QUERIES)
@@ -0,0 +1,57 @@
+"""SemanticCache must reuse answers for rephrasings only, never for other questions."""
+import pytest
+
+from app.semantic_cache import SemanticCache, embed
+
+# pairs whose embeddings are above the old 0.9 threshold but ask different things
+DIFFERENT = [
+    ("what is the default port of the api server", "what is the default port of the db server"),
+    ("is redis required for the cache", "is redis not required for the cache"),
+    ("is redis required for the cache", "isn't redis required for the cache"),
+    ("how do I build the index", "how do I rebuild the index"),
+]
+SAME = [
+    ("What's the default port of the API server?", "what is the default port of the api server"),
+    ("is redis required for the cache", "Is Redis required for the cache?"),
+    ("how do I build the index", "How do I  build the index??"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT)
+def test_different_questions_miss(cached, asked):
+    cache = SemanticCache(maxsize=8, threshold=0.0)
+    cache.put(cached, "answer")
+    assert cache.get(asked) is None
+    assert cache.misses == 1
+
+
+@pytest.mark.parametrize("cached, asked", SAME)
+def test_rephrasings_hit(cached, asked):
+    cache = SemanticCache(maxsize=8)
+    cache.put(cached, "answer")
+    assert cache.get(asked) == "answer"
+    assert cache.hits == 1
+
+
+def test_negation_is_below_default_threshold():
+    sim = float(embed("is redis required for the cache") @ embed("is redis not required for the cache"))
+    assert sim < SemanticCache().threshold
+
+
+def test_best_matching_entry_wins_and_lru_evicts():
+    cache = SemanticCache(maxsize=2, threshold=0.0)
+    cache.put("is redis required for the cache", "yes")
+    cache.put("is redis not required for the cache", "no")
+    assert cache.get("Is Redis NOT required for the cache?") == "no"
+    assert cache.get("is redis required for the cache") == "yes"
+    cache.put("what is the default port", "8000")  # evicts the "not" entry (least recent)
+    assert cache.get("is redis not required for the cache") is None
+    assert cache.get("what is the default port") == "8000"
+    assert cache.evictions == 1
+
+
+def test_expired_entry_misses():
+    cache = SemanticCache(maxsize=2, ttl=1e-9)
+    cache.put("what is the default port", "8000")
+    assert cache.get("what is the default port") is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,74 @@
+"""Sharded retrieval must rank like the single index, equal scores included."""
+from collections import Counter
+
+import pytest
+
+from rag.analyzer import Analyzer
+from rag.retrieve import _ordered
+from rag.shards import ShardedIndex, commit_shards, shard_of, shard_path
+from rag.store import IndexWriter, MappedIndex
+
+# every passage of a file is identical, so each query ties across files (and shards)
+FILES = {f"{topic}{n}.md": f"notes on {topic} number {n % 2}"
+         for topic in ("cache", "index", "shard") for n in range(4)}
+QUERIES = [["cache"], ["note", "number"], ["index", "shard"], ["0"]]
+
+
+def write(path, n_shards=None):
+    analyzer = Analyzer()
+    paths = [path] if n_shards is None else [shard_path(path, n, "test") for n in range(n_shards)]
+    writers = [IndexWriter(p, analyzer=analyzer) for p in paths]
+    try:
+        for source, text in FILES.items():
+            writer = writers[shard_of(source, len(writers))]
+            writer.add(f"{source}#0", text, list(Counter(analyzer.terms(text)).items()))
+        if n_shards is None:
+            writers[0].commit()
+        else:
+            commit_shards(writers, path)
+    finally:
+        for writer in writers:
+            writer.__exit__(None, None, None)
+
+
+def test_merge_orders_ties_by_name_not_shard():
+    ranked = [[(0, 2.0, ("b#0", "")), (1, 1.0, ("d#0", ""))],
+              [(0, 2.0, ("a#0", "")), (1, 1.0, ("c#0", ""))]]
+    for shards in (ranked, ranked[::-1]):
+        assert ShardedIndex.merge(shards, 3) == [(("a#0", ""), 2.0), (("b#0", ""), 2.0),
+                                                 (("c#0", ""), 1.0)]
+
+
+@pytest.mark.parametrize("n_shards", [2, 3])
+def test_sharded_matches_single_index(tmp_path, n_shards):
+    write(str(tmp_path / "single.bin"))
+    single = MappedIndex(str(tmp_path / "single.bin"))
+    write(str(tmp_path / "shards.json"), n_shards)
+    sharded = ShardedIndex(str(tmp_path / "shards.json"))
+    try:
+        k = len(FILES)  # no tie straddles the k-th place
+        merged = sharded.top_k_many(QUERIES, k)
+        for tokens, hits in zip(QUERIES, merged):
+            expected = _ordered([(single.doc(i), score) for i, score in single.index.top_k(tokens, k)])
+            assert [doc for doc, _ in hits] == expected
+    finally:
+        sharded.close()
+
+
+def test_queries_are_looked_up_in_the_shards_vocabulary(tmp_path, retrieval, monkeypatch):
+    write(str(tmp_path / "single.bin"))
+    write(retrieval.SHARDS_ARTEFACT, 3)
+    sharded = retrieval.load_shards()
+    try:
+        # the union of the shards' term lists: the single index's vocabulary
+        single = MappedIndex(str(tmp_path / "single.bin"))
+        assert sorted(sharded.vocabulary.terms) == sorted(single.terms)
+        sent = []
+        scatter = sharded.scatter
+        monkeypatch.setattr(sharded, "scatter", lambda queries, k: sent.extend(queries) or
+                            scatter(queries, k))
+        hits = retrieval.top_k("Notes on CACHES, zzyzx?", 2)
+        assert sent == [["note", "on", "cache"]]  # analyzed like the index, unknown words dropped
+        assert [name for name, _ in hits] == ["cache0.md#0", "cache1.md#0"]
+    finally:
+        sharded.close()
@@ -0,0 +1,69 @@
+"""SingleFlight: one execution per key for concurrent callers, shared results and errors."""
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream(key):
+            calls.append(key)
+            await asyncio.sleep(0.02)
+            return f"answer {key}"
+
+        results = await asyncio.gather(*[flight.do(key, lambda key=key: upstream(key))
+                                          for key in ["a"] * 5 + ["b"] * 3])
+        assert results == ["answer a"] * 5 + ["answer b"] * 3
+        assert sorted(calls) == ["a", "b"]
+        assert flight.stats() == {"calls": 8, "executions": 2, "coalesced": 6, "in_flight": 0,
+                                  "coalescing_ratio": 0.75}
+        # finished keys are forgotten: a later call runs again
+        assert await flight.do("a", lambda: upstream("a")) == "answer a"
+        assert calls.count("a") == 2
+
+    asyncio.run(main())
+
+
+def test_error_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*[flight.do("q", failing) for _ in range(4)],
+                                       return_exceptions=True)
+        assert calls == 1
+        assert all(isinstance(r, RuntimeError) and str(r) == "upstream down" for r in results)
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def main():
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("q", slow))
+        second = asyncio.ensure_future(flight.do("q", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await second == "done"
+        assert flight.executions == 1
+
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""IndexWriter output (spilled runs included) and MappedIndex.validate(deep=True)."""
+import random
+
+import pytest
+
+from rag.analyzer import Analyzer
+from rag.store import IndexWriter, MappedIndex
+
+TEXTS = ["the cats sat on the mat", "dogs bark at the cats", "a mat for the dogs"]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "index.bin")
+    analyzer = Analyzer(stem="light")
+    with IndexWriter(path, analyzer=analyzer) as writer:
+        for n, text in enumerate(TEXTS):
+            terms = {}
+            for term in analyzer.terms(text):
+                terms[term] = terms.get(term, 0) + 1
+            writer.add(f"doc{n}", text, list(terms.items()))
+        writer.commit()
+    return path
+
+
+def patch(path, old: bytes, new: bytes, at: int = 0) -> None:
+    with open(path, "r+b") as fh:
+        data = fh.read()
+        pos = data.index(old, at)
+        fh.seek(pos)
+        fh.write(new)
+
+
+def test_deep_validate_accepts_written_index(path):
+    MappedIndex(path).validate(deep=True)
+
+
+def test_deep_validate_covers_the_analyzer(path):
+    # same length, still valid JSON: only the stored analyzer config changes
+    patch(path, b'"light"', b'"none" ')
+    store = MappedIndex(path)
+    assert store.analyzer.config["stem"] == "none"
+    store.validate(deep=False)
+    with pytest.raises(ValueError, match="version hash"):
+        store.validate(deep=True)
+
+
+def test_deep_validate_covers_the_sections(path):
+    store = MappedIndex(path)
+    start = min(offset for offset, _, _ in store.header["sections"].values())
+    del store
+    patch(path, b"bark", b"bork", at=start)
+    with pytest.raises(ValueError, match="version hash"):
+        MappedIndex(path).validate(deep=True)
+
+
+def write_corpus(path, docs, **kwargs):
+    with IndexWriter(path, **kwargs) as writer:
+        for n, text in enumerate(docs):
+            terms = {}
+            for term in text.split():
+                terms[term] = terms.get(term, 0) + 1
+            writer.add(f"doc{n}", text, list(terms.items()))
+        return writer.commit(), len(writer._runs)
+
+
+def test_spilled_runs_merge_to_the_single_run_index(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    words = [f"w{n}" for n in range(60)]
+    docs = [" ".join(rng.choices(words, k=rng.randint(1, 30))) for _ in range(80)]
+    single, runs = write_corpus(str(tmp_path / "single.bin"), docs)
+    assert runs == 1
+    # a run every few postings, and the merged runs compressed a few terms at a time
+    monkeypatch.setattr("rag.store.ENCODE_SIZE", 50)
+    spilled, runs = write_corpus(str(tmp_path / "spilled.bin"), docs, run_size=7)
+    assert runs > 20
+    assert spilled == single
+    with open(tmp_path / "single.bin", "rb") as a, open(tmp_path / "spilled.bin", "rb") as b:
+        assert a.read() == b.read()
+    merged = MappedIndex(str(tmp_path / "spilled.bin"))
+    merged.validate(deep=True)
+    assert [merged.doc_terms(n) for n in range(len(docs))] == \
+        [MappedIndex(str(tmp_path / "single.bin")).doc_terms(n) for n in range(len(docs))]
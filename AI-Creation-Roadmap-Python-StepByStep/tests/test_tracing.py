@@ -0,0 +1,24 @@
+"""The file exporter flushes its spans and closes its file on shutdown."""
+import json
+
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+
+from app import tracing  # noqa: E402
+
+
+def test_file_exporter_is_flushed_and_closed(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    opened = []
+    monkeypatch.setattr(tracing, "open", lambda *a, **kw: opened.append(open(*a, **kw)) or opened[-1],
+                        raising=False)
+    provider = tracing.setup_tracing("file", 1.0, "test", file_path=str(path))
+    # the global provider can be set only once per process: use this one directly
+    with provider.get_tracer("test").start_as_current_span("request") as span:
+        span.set_attribute("rag.k", 4)
+    assert len(opened) == 1 and not opened[0].closed
+    provider.shutdown()
+    assert opened[0].closed
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(s["name"], s["attributes"]) for s in spans] == [("request", {"rag.k": 4})]